@@ -1,5 +1,8 @@
 VERSION = "0.2"
 
+import time
+IMPORT_START = time.time()
+
 # Python import
 from XPLMDefs import *
 from XPLMDisplay import *
@@ -7,22 +10,35 @@ from XPLMGraphics import *
 from XPLMMenus import *
 from XPLMNavigation import *
 from XPLMDataAccess import *
+from XPLMProcessing import *
 from XPWidgets import *
 from XPStandardWidgets import *
 from XPLMUtilities import *
 
-from metar import Metar
-
+from metar.Station import load_stations, station_file_name
+from navdata.Airports import read_airports, airports_ahead
+from navdata.Airways import load_airway_graph, route_string
+from navdata import Snapshot
+from navdata.Cache import airac_cycle, source_key
+from navdata.Fixes import load_fix_index
+from navdata.Navaids import IlsIndex
+from navdata.Search import PrefixIndex, FuzzyIndex
+from navdata.Procedures import ProcedureCache, procedures_for_runway, KIND_SID, KIND_STAR, KIND_APPROACH
+from navdata.Geo import distance_nm
+from weather.History import MetarHistory
+from weather.Http import ConnectionPool, HTTP_ERRORS
+from weather.Noaa import NoaaStations, NOAA_STATION_URL
+from weather.Policy import FetchPolicy
+from weather import Providers
+from weather.Providers import DirectoryProvider, ArchiveProvider
+from weather.Summary import metar_lines
+
+import datetime
 import logging
-import operator
+import logging.handlers
 import os
-import platform
-import urllib
-import shutil
-import time
-import sys
-from argparse import ArgumentParser
-from operator import attrgetter
+import threading
+import Queue
 
 FILE_INF = "cycle_info.txt"
 FILE_AWY = "earth_awy.dat"
@@ -31,49 +47,211 @@ FILE_NAV = "earth_nav.dat"
 
 # menu
 SHOW_AIRPORT = 1
+TOGGLE_PANEL = 2
+TOGGLE_FOLLOW = 3
+
+# auto follow
+FOLLOW_INTERVAL = 1.0		# seconds between flight loop checks
+FOLLOW_MIN_DISTANCE = 2.0	# nm moved before the nearest airport is looked up again
+FOLLOW_MAX_AGE = 300.0		# seconds before the weather of the same airport is refreshed
+WORKER_POLL_INTERVAL = 0.25	# seconds between checks for a finished airport refresh
+
+# weather
+METAR_MAX_AGE = 240.0		# seconds a fetched METAR is served from the cache
+PREFETCH_COUNT = 8			# airports ahead of the aircraft to warm the cache for
+PREFETCH_CONCURRENCY = 3	# parallel METAR downloads while prefetching
+PREFETCH_DISTANCE = 150.0	# nm
+PREFETCH_ANGLE = 30.0		# degrees either side of the track
+PREFETCH_DEADLINE = 30.0	# seconds a prefetch may take, later reports are dropped
+WEATHER_TIMEOUT = 10.0		# seconds to connect to or hear from the weather server
+WEATHER_DEADLINE = 15.0		# seconds one report may take, retries included
+WEATHER_RETRIES = 2			# further attempts after a timeout or a server error
+WEATHER_MIRROR_URL = None	# station file URL with %s for the ICAO, asked when NOAA is slow
+WEATHER_HEDGE_AFTER = 2.0	# seconds without an answer before the mirror is asked as well
+WEATHER_CONCURRENCY = 24	# most parallel METAR downloads, a smaller batch gets a thread per station
+WEATHER_IDLE_CONNECTIONS = 8	# keep-alive connections kept open per server
+WEATHER_PROVIDER = "noaa"	# "noaa", "directory" (<ICAO>.TXT files) or "archive" (cycle files)
+WEATHER_REPLAY_TIME = None	# "YYYY/MM/DD HH:MM" UTC to replay from the archive, None for the newest
+METAR_HISTORY = True		# keep every report seen for debriefs, see weather/History.py
+METAR_PARSE_CACHE = 500		# parsed reports kept by their code, 0 parses every report again
+
+# navdata
+PROCEDURE_CACHE_SIZE = 20	# airports whose parsed PROC file is kept
+USE_NAVDATA_STORE = False	# query a SQLite import of the navdata instead of the text files
+
+# search
+SEARCH_MAX_CHARS = 24		# ICAO code or the start of an airport name
+SUGGESTION_COUNT = 5		# airports offered while typing
+FUZZY_MIN_CHARS = 3			# typed characters before names are matched despite typos
+
+# warm start
+SNAPSHOT_VERSION = 1
+SNAPSHOT_METAR_AGE = 3600.0	# seconds an observation is kept across a restart
+
+# logging
+LOG_MAX_BYTES = 1024 * 1024	# size at which the log file is rotated
+LOG_BACKUPS = 3				# rotated log files kept
+LOG_QUEUE_SIZE = 1000		# records waiting for the writer before new ones are dropped
+LOG_REPEAT_LIMIT = 5		# identical messages written per window, the rest are counted
+LOG_REPEAT_WINDOW = 60.0	# seconds
+LOG_REPEAT_KEYS = 1000		# distinct messages counted before the counts start over
+LOG_STOP_TIMEOUT = 2.0		# seconds the writer gets to flush at shutdown
 
 # design
 MARGIN_W = 30
 MARGIN_H = 30
 WINDOW_W = 400
-WINDOW_H = 320
+WINDOW_H = 335
+PANEL_COLOR = [1.0, 1.0, 1.0]
 
 # some constants
 XPDIRS = ["Aircraft", "Airfoils"]
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRIPT_NAME = os.path.split(os.path.abspath(__file__))[1]
+CACHE_DIR = os.path.join(SCRIPT_DIR, "AirportInfo_cache")
+SEARCH_SNAPSHOT = os.path.join(CACHE_DIR, "search.snapshot")
+METAR_SNAPSHOT = os.path.join(CACHE_DIR, "metar.snapshot")
+WEATHER_DIRECTORY = os.path.join(SCRIPT_DIR, "AirportInfo_weather")
+WEATHER_ARCHIVE = os.path.join(SCRIPT_DIR, "AirportInfo_archive")
+HISTORY_PATH = os.path.join(CACHE_DIR, "metar_history")
 
 # ----------------------------------------------------------------------------
 def pjoin(*args, **kwargs):
 	return os.path.join(*args, **kwargs).replace(os.path.sep, '/')
 # ----------------------------------------------------------------------------
 
-# logger:
-log_formatter = logging.Formatter(
-	"[%(asctime)s] %(levelname)-7s:  %(message)s",
-	"%H:%M:%S"
-)
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-# log to console:
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-console_handler.setLevel(logging.INFO)
-logger.addHandler(console_handler)
-
-# log to file:
+# logger: handlers are only attached once X-Plane starts the plugin, and the
+# root logger shared with every other Python plugin is left alone.  Log calls
+# only queue the record, a writer thread does the formatting and the I/O.
+logger = logging.getLogger("AirportInfo")
 log_path = pjoin(SCRIPT_DIR, SCRIPT_NAME.replace(".py", ".log"))
-# logging.basicConfig(filename=log_path,level=logging.DEBUG)
-file_handler = logging.FileHandler(filename=log_path, mode='w')
-file_handler.setFormatter(log_formatter)
-# file_handler.setLevel(logging.DEBUG)
-logger.addHandler(file_handler)
+log_writer = None
+
+class LogQueueHandler(logging.Handler):
+
+	def __init__(self, records, repeat_limit, repeat_window):
+
+		logging.Handler.__init__(self)
+		self.records = records
+		self.repeat_limit = repeat_limit
+		self.repeat_window = repeat_window
+		self.repeats = {}
+		self.dropped = 0
+
+	def emit(self, record):
+
+		# Runs on whichever thread logs, the sim thread too, under the handler lock,
+		# so it stays cheap; only the LogWriter thread does I/O.
+		# Formatted here, the arguments may have changed by the time the writer runs,
+		# and only the same text counts as a repeat, not the same format string
+		message = record.getMessage()
+		record.msg, record.args = message, None
+		key = (record.levelno, message)
+		first, count = self.repeats.get(key, (record.created, 0))
+		if record.created - first >= self.repeat_window:
+			if count > self.repeat_limit:
+				self.put(logging.makeLogRecord({
+					"name": record.name,
+					"levelno": record.levelno,
+					"levelname": record.levelname,
+					"msg": "Suppressed %d repeats of: %s" % (count - self.repeat_limit, message)}))
+			first, count = record.created, 0
+		if len(self.repeats) > LOG_REPEAT_KEYS and key not in self.repeats:
+			self.repeats.clear()
+		self.repeats[key] = (first, count + 1)
+		if count >= self.repeat_limit:
+			return
+
+		# The traceback is only valid now, the rest is formatted by the writer
+		if record.exc_info:
+			record.exc_text = log_exception_formatter.formatException(record.exc_info)
+			record.exc_info = None
+		self.put(record)
+
+	def put(self, record):
+
+		try:
+			self.records.put_nowait(record)
+		except Queue.Full:
+			self.dropped += 1
+
+class LogWriter(threading.Thread):
+
+	def __init__(self, records, handlers):
+
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.records = records
+		self.handlers = handlers
+
+	def run(self):
+
+		while True:
+			record = self.records.get()
+			if record is None:
+				break
+			for handler in self.handlers:
+				if record.levelno >= handler.level:
+					handler.handle(record)
+
+	def stop(self):
+
+		try:
+			self.records.put(None, True, LOG_STOP_TIMEOUT)
+		except Queue.Full:
+			pass
+		self.join(LOG_STOP_TIMEOUT)
+		for handler in self.handlers:
+			handler.close()
+
+log_exception_formatter = logging.Formatter()
+
+def start_logging():
+	global log_writer
+	log_formatter = logging.Formatter(
+		"[%(asctime)s] %(levelname)-7s:  %(message)s",
+		"%H:%M:%S"
+	)
+	logger.setLevel(logging.DEBUG)
+	logger.propagate = False
+	# log to console:
+	console_handler = logging.StreamHandler()
+	console_handler.setFormatter(log_formatter)
+	console_handler.setLevel(logging.INFO)
+
+	# log to file, the previous sessions are kept as .1, .2, ...
+	file_handler = logging.handlers.RotatingFileHandler(filename=log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+	file_handler.setFormatter(log_formatter)
+	if os.path.getsize(log_path):
+		file_handler.doRollover()
+
+	records = Queue.Queue(LOG_QUEUE_SIZE)
+	logger.addHandler(LogQueueHandler(records, LOG_REPEAT_LIMIT, LOG_REPEAT_WINDOW))
+	log_writer = LogWriter(records, [console_handler, file_handler])
+	log_writer.start()
+
+def stop_logging():
+	global log_writer
+	for handler in list(logger.handlers):
+		logger.removeHandler(handler)
+		if isinstance(handler, LogQueueHandler) and handler.dropped:
+			handler.put(logging.makeLogRecord({
+				"name": logger.name,
+				"levelno": logging.WARNING,
+				"levelname": "WARNING",
+				"msg": "Dropped %d log records, the writer fell behind" % handler.dropped}))
+	if log_writer:
+		log_writer.stop()
+		log_writer = None
 # -------------------------------------------------------------------------------
 
 class PythonInterface:
 
 	def XPluginStart(self):
 
+		start_time = time.time()
+		start_logging()
+
 		self.Name = "Aiport Info v" + VERSION
 		self.Sig =  "TheoEsenwein.Python.AiportInfo"
 		self.Desc = "A plugin to get some Aiport information."
@@ -83,28 +261,109 @@ class PythonInterface:
 		self.current_airport_metar = None
 		self.current_airport_runways = None
 		self.current_aiprot_openrunway = None
+		self.current_airport_procedures = None
 		self.is_transluscent = 1
+		self.use_draw_panel = 0
 
 		self.airpot_rwy_widget_container = None
+		self.airport_panel = None
+
+		# Dataref handles are resolved once, every lookup reuses them
+		self.position = Position()
+		self.route = Route(self.position)
+
+		# Auto follow: cheap checks in the flight loop, loading in the worker
+		self.use_auto_follow = 0
+		self.follow_lat = None
+		self.follow_lon = None
+		self.follow_time = None
+		self.airport_worker = AirportInfoWorker(self.route)
+		self.airport_worker.start()
+		self.metar_prefetcher = MetarPrefetcher(self.route, PREFETCH_COUNT, PREFETCH_CONCURRENCY)
+		self.airport_search = AirportSearch()
+		self.current_suggestions = []
+
+		# A report served again by NOAA or read again from a local source is not
+		# parsed twice; the cache comes with the parser, when the first report arrives
+		Providers.use_parse_cache(METAR_PARSE_CACHE)
+
+		# Last session's METARs stand in while a station cannot be reached, decoded
+		# in the background, which would load the parser
+		thread = threading.Thread(target=self.restore_metars)
+		thread.daemon = True
+		thread.start()
+		# The search indexes come from the snapshot while it is valid, in the background
+		self.airport_search.load()
+		# With USE_NAVDATA_STORE the store is built in the background from now on
+		Airport.get_navdata_store()
+		self.follow_flightloop_cb = self.af_flightloop
+		XPLMRegisterFlightLoopCallback(self, self.follow_flightloop_cb, 0.0, 0)
 		
 		self.airport_menu_cb = self.am_handler
 		self.menu_plugin_item = XPLMAppendMenuItem(XPLMFindPluginsMenu(), "Aiport Info", 0, 1)
 		self.menu_main = XPLMCreateMenu(self, "Airport Information", XPLMFindPluginsMenu(), self.menu_plugin_item, self.airport_menu_cb, 0)
 		self.menu_toggle_window = XPLMAppendMenuItem(self.menu_main, 'Toggle Window', SHOW_AIRPORT, 1)
+		self.menu_toggle_panel = XPLMAppendMenuItem(self.menu_main, 'Toggle Panel Mode', TOGGLE_PANEL, 1)
+		self.menu_toggle_follow = XPLMAppendMenuItem(self.menu_main, 'Toggle Auto Follow', TOGGLE_FOLLOW, 1)
 
   		# Custom Command
 		self.aw_toggle = XPLMCreateCommand("Aiprotinfo/Window_toggle", "Toggle Airport Info")
 		self.aw_toggle_handler_cb = self.aw_toggleHandler
 		XPLMRegisterCommandHandler(self, self.aw_toggle, self.aw_toggle_handler_cb, 1, 0)
+
+		# One draw callback renders the whole panel in panel mode
+		self.airport_panel_draw_cb = self.ap_draw_handler
+		XPLMRegisterDrawCallback(self, self.airport_panel_draw_cb, xplm_Phase_Window, 0, 0)
+
+		# What the plugin adds to X-Plane's loading time
+		logger.info("Started in %.1f ms (module import %.1f ms)" % ((time.time() - start_time) * 1000.0, IMPORT_TIME * 1000.0))
 	  
 		return self.Name, self.Sig, self.Desc
 
 	def XPluginStop(self):
+		XPLMUnregisterDrawCallback(self, self.airport_panel_draw_cb, xplm_Phase_Window, 0, 0)
+		XPLMUnregisterFlightLoopCallback(self, self.follow_flightloop_cb, 0)
+		self.airport_worker.stop()
+		self.save_snapshot()
+		if isinstance(weather_provider, NoaaStations):
+			logger.info("METAR fetches: %s" % weather_provider.policy.stats.summary())
+		parse_cache = Providers.parse_cache()
+		if parse_cache:
+			logger.info("METAR parse cache: %d hits, %d misses" % (parse_cache.hits, parse_cache.misses))
 		if self.airport_window_created:
 			XPDestroyWidget(self, self.airport_window, 1)
 			self.airport_window_created = False
-		pass
+		stop_logging()
 	
+	def restore_metars(self):
+
+		records = Snapshot.load(METAR_SNAPSHOT, ("metar", SNAPSHOT_VERSION))
+		if not records:
+			return
+		# Decoded from the records, many times faster than parsing the reports again
+		from metar import Metar
+		try:
+			metars = [(icao, fetched, Metar.Metar.from_record(record)) for icao, fetched, record in records]
+		except ValueError:
+			logger.info("Ignoring METAR snapshot of another record version")
+			return
+		except Exception:
+			logger.exception("Cannot read the METAR snapshot")
+			return
+		metar_cache.restore(metars, SNAPSHOT_METAR_AGE)
+
+	def save_snapshot(self):
+
+		# Never keep the sim from shutting down over a cache
+		try:
+			if Route.metar_history:
+				Route.metar_history.flush()
+			Snapshot.save(METAR_SNAPSHOT, ("metar", SNAPSHOT_VERSION),
+				[(icao, fetched, metar.to_record()) for icao, fetched, metar in metar_cache.records(SNAPSHOT_METAR_AGE)])
+			self.airport_search.save()
+		except Exception:
+			logger.exception("Cannot write the warm start snapshot")
+
 	def XPluginEnable(self):
 		return 1
 
@@ -117,6 +376,62 @@ class PythonInterface:
 	def am_handler(self, inMenuRef, inItemRef):
 		if inItemRef == SHOW_AIRPORT:
 			 self.create_airport_window()		
+		if inItemRef == TOGGLE_PANEL:
+			self.use_draw_panel = 1 - self.use_draw_panel
+			if self.airport_window_created:
+				self.print_airport_info()
+		if inItemRef == TOGGLE_FOLLOW:
+			self.use_auto_follow = 1 - self.use_auto_follow
+			self.follow_time = None
+			if self.use_auto_follow:
+				XPLMSetFlightLoopCallbackInterval(self, self.follow_flightloop_cb, FOLLOW_INTERVAL, 1, 0)
+
+	def af_flightloop(self, elapsedMe, elapsedSim, counter, refcon):
+
+		# Only the newest finished refresh is shown
+		result = None
+		while True:
+			polled = self.airport_worker.poll()
+			if not polled:
+				break
+			result = polled
+		if result:
+			self.set_airport_info(*result)
+
+		if self.use_auto_follow:
+			self.follow_nearest()
+
+		if self.airport_worker.busy():
+			return WORKER_POLL_INTERVAL
+		if self.use_auto_follow:
+			return FOLLOW_INTERVAL
+		return 0
+
+	def follow_nearest(self):
+
+		now = XPLMGetElapsedTime()
+		current_lat, current_lon = self.position.current_position()
+		if self.follow_time is not None:
+			moved = distance_nm(self.follow_lat, self.follow_lon, current_lat, current_lon)
+			if moved < FOLLOW_MIN_DISTANCE and now - self.follow_time < FOLLOW_MAX_AGE:
+				return
+
+		nearest = self.route.aiportinfo_by_nearest()
+		if nearest:
+			nearest_icao, nearest_name = nearest
+			is_stale = self.follow_time is None or now - self.follow_time >= FOLLOW_MAX_AGE
+			if nearest_icao != self.current_airport_icao or is_stale:
+				self.airport_worker.request(nearest_icao, nearest_name)
+				self.follow_time = now
+				if nearest_icao != self.current_airport_icao:
+					self.prefetch_weather()
+		self.follow_lat, self.follow_lon = current_lat, current_lon
+
+	def ap_draw_handler(self, inPhase, inIsBefore, inRefcon):
+		if self.use_draw_panel and self.airport_window_created:
+			if XPIsWidgetVisible(self.airport_window):
+				self.airport_panel.draw()
+		return 1
 
 	def aw_handler(self, inMessage, inWidget, inParam1, inParam2):
 	
@@ -131,6 +446,12 @@ class PythonInterface:
 				self.set_selected_icao_name()
 				return 1
 
+		# Suggestions follow every keystroke in the ICAO field
+		if inMessage == xpMsg_TextFieldChanged:
+			if str(inParam1) == str(self.airport_icao):
+				self.show_suggestions()
+			return 0
+
 		return 0
 
 	def aw_toggleHandler(self, inCommand, inPhase, inRefcon):
@@ -180,13 +501,17 @@ class PythonInterface:
 		top_row = top_window - 22
 		self.label_icao = XPCreateWidget(left_col_1, top_row, right_col_1, top_row - row_h, 1, "ICAO", 0, self.airport_window, xpWidgetClass_Caption)
 		self.airport_icao = XPCreateWidget(left_col_2, top_row, right_col_2 , top_row - row_h, 1, "", 0, self.airport_window, xpWidgetClass_TextField)
-		XPSetWidgetProperty(self.airport_icao, xpProperty_MaxCharacters, 4)
+		XPSetWidgetProperty(self.airport_icao, xpProperty_MaxCharacters, SEARCH_MAX_CHARS)
 
 	   	self.btn_search = XPCreateWidget(left_col_3, top_row, right_col_3, top_row - row_h, 1, "Search", 0, self.airport_window, xpWidgetClass_Button)
 		XPSetWidgetDescriptor(self.airport_icao, str(self.current_airport_icao))
+		self.suggestions = XPCreateWidget(right_col_3 + padding, top_row, right_window - padding, top_row - row_h, 1, "", 0, self.airport_window, xpWidgetClass_Caption)
+		self.current_suggestions = []
 
 		# Show Result		
 		top_row -= row_h
+		# Panel mode draws the same rows itself, starting at the first info row
+		self.airport_panel = XPDrawPanel(self.airport_window, padding, top_window - top_row + row_h2 - padding, row_h2)
 		self.info_row_1 = XPCreateWidget(left_col_1, top_row, right_col_3, top_row - row_h2, 1, "", 0, self.airport_window, xpWidgetClass_Caption)
 		top_row -= row_h2
 		self.info_row_2 = XPCreateWidget(left_col_1, top_row, right_col_3, top_row - row_h2, 1, "", 0, self.airport_window, xpWidgetClass_Caption)
@@ -198,6 +523,9 @@ class PythonInterface:
 		self.info_row_5 = XPCreateWidget(left_col_1, top_row, right_col_3, top_row - row_h2, 1, "", 0, self.airport_window, xpWidgetClass_Caption)
 		top_row -= row_h2
 		self.info_row_6 = XPCreateWidget(left_col_1, top_row, right_col_3, top_row - row_h2, 1, "", 0, self.airport_window, xpWidgetClass_Caption)
+		top_row -= row_h2
+		self.info_row_7 = XPCreateWidget(left_col_1, top_row, right_col_3, top_row - row_h2, 1, "", 0, self.airport_window, xpWidgetClass_Caption)
+		self.info_rows = [self.info_row_1, self.info_row_2, self.info_row_3, self.info_row_4, self.info_row_5, self.info_row_6, self.info_row_7]
 
 
 		top_row -= row_h
@@ -214,10 +542,12 @@ class PythonInterface:
 		# Lets get some data
 		self.init_data()
 
+		# The search index is built in the background while the window is open
+		self.airport_search.load()
+
 	def init_data(self):
 		# Set the Input Box
-		Route_Finder = Route()
-		nearest_icao, nearest_name = Route_Finder.aiportinfo_by_nearest()
+		nearest_icao, nearest_name = self.route.aiportinfo_by_nearest()
 		if(nearest_name):
 			XPSetWidgetDescriptor(self.airport_icao, nearest_icao)
 
@@ -227,31 +557,53 @@ class PythonInterface:
 	def print_airport_info(self):
     		
 		self.airpot_rwy_widget_container.remove_all()
+		self.airport_panel.remove_all()
 
-		XPSetWidgetDescriptor(self.info_row_1, "Airport: " +  str(self.current_airport_name) + " (" + str(self.current_airport_icao) + ")")
+		info_lines, runway_lines = self.get_airport_lines()
+
+		if self.use_draw_panel:
+			for info_row in self.info_rows:
+				XPSetWidgetDescriptor(info_row, "")
+			# Laid out once here, the draw callback only replays the lines
+			self.airport_panel.set_lines(info_lines + [""] + runway_lines)
+			return
+
+		for no, info_row in enumerate(self.info_rows):
+			if no < len(info_lines):
+				XPSetWidgetDescriptor(info_row, info_lines[no])
+			else:
+				XPSetWidgetDescriptor(info_row, "")
+
+		for runway_line in runway_lines:
+			self.airpot_rwy_widget_container.new_caption(runway_line)
+
+	def get_airport_lines(self):
+
+		info_lines = ["Airport: " +  str(self.current_airport_name) + " (" + str(self.current_airport_icao) + ")"]
 
 		if(self.current_airport_metar):
-			XPSetWidgetDescriptor(self.info_row_2, "Qnh: {} / {}".format(self.current_airport_metar.press.string("mb"),self.current_airport_metar.press.string("in")))
-			XPSetWidgetDescriptor(self.info_row_3, "Temp. / Dewpt.: {} / {} ".format(self.current_airport_metar.temp.string("C"),self.current_airport_metar.dewpt.string("C")))		
-			XPSetWidgetDescriptor(self.info_row_4, "Wind: " + str(self.current_airport_metar.wind_dir) + " / " + self.current_airport_metar.wind())			
-			XPSetWidgetDescriptor(self.info_row_5, "Visiblilty: " + self.current_airport_metar.visibility())			
-			XPSetWidgetDescriptor(self.info_row_6, "Weather: " + self.current_airport_metar.sky_conditions())			
-		
+			# A partly parsed report may lack any of the values
+			info_lines.extend(metar_lines(self.current_airport_metar))
 
+		if(self.current_aiprot_openrunway and self.current_airport_procedures is not None):
+			kinds = [procedure.kind for procedure in self.current_airport_procedures]
+			approaches = [procedure.name for procedure in self.current_airport_procedures if procedure.kind == KIND_APPROACH]
+			info_lines.append("Rwy {}: {} SID / {} STAR / App: {}".format(self.current_aiprot_openrunway.id,
+																			kinds.count(KIND_SID),
+																			kinds.count(KIND_STAR),
+																			" ".join(approaches) or "-"))
 
 		# Get all Runways
+		runway_lines = []
 		if(self.current_airport_runways):
-			runway_strresult = ""
 			for runway_info in self.current_airport_runways:	
 				prefix = ""
-				if(self.get_runway_info(runway_info).id == self.current_aiprot_openrunway.id):
+				if(self.current_aiprot_openrunway and self.get_runway_info(runway_info).id == self.current_aiprot_openrunway.id):
 					prefix = "*"
 
-				runway_strresult = prefix + self.get_runway_str(self.get_runway_info(runway_info)) + "\n"									
+				runway_lines.append(prefix + self.get_runway_str(self.get_runway_info(runway_info)))
 
-				self.airpot_rwy_widget_container.new_caption(runway_strresult)
-
-			#XPSetWidgetDescriptor(self.rnwyInfoContent, runway_strresult)
+		return info_lines, runway_lines
 
 
 	def set_transluscent_look(self):
@@ -260,42 +612,69 @@ class PythonInterface:
 			XPSetWidgetProperty(self.label_icao, xpProperty_CaptionLit, self.is_transluscent)			
 			XPSetWidgetProperty(self.airport_icao, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.btn_search, xpProperty_CaptionLit, self.is_transluscent)
+			XPSetWidgetProperty(self.suggestions, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.info_row_1, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.info_row_2, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.info_row_3, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.info_row_4, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.info_row_5, xpProperty_CaptionLit, self.is_transluscent)
 			XPSetWidgetProperty(self.info_row_6, xpProperty_CaptionLit, self.is_transluscent)
+			XPSetWidgetProperty(self.info_row_7, xpProperty_CaptionLit, self.is_transluscent)
 
 
 	def set_selected_icao_name(self):	
 		# get the formfield
-		Route_Finder = Route()
+		Route_Finder = self.route
 		out_icao_name = []
 
-		XPGetWidgetDescriptor(self.airport_icao, out_icao_name, 20)
-		self.current_airport_icao = out_icao_name[0].upper()
+		XPGetWidgetDescriptor(self.airport_icao, out_icao_name, SEARCH_MAX_CHARS)
+		search_icao = out_icao_name[0].upper()
 
-		#self.current_airport_icao = "LSZH"
+		#search_icao = "LSZH"
 		
 		# search for the information
-		if(len(self.current_airport_icao) < 4):
-			this_airporticao, this_airportname = Route_Finder.aiportinfo_by_nearest()		
-		else:
-			this_airporticao, this_airportname = Route_Finder.aiportinfo_by_icao(self.current_airport_icao)		
-	
-		self.current_airport_icao = this_airporticao
-		self.current_airport_name = this_airportname
-
-		self.current_airport_metar = Route_Finder.airport_weather_by_icao(self.current_airport_icao)
+		found = None
+		if(len(search_icao) == 4):
+			found = Route_Finder.aiportinfo_by_icao(search_icao)
+		# Anything else typed is a prefix or a name, take the best suggestion
+		if(not found and search_icao.strip() and self.current_suggestions):
+			found = self.current_suggestions[0].icao, self.current_suggestions[0].name
+		if(not found):
+			found = Route_Finder.aiportinfo_by_nearest()
+		if(not found):
+			return
+		this_airporticao, this_airportname = found
+
+		# Weather, runways and procedures are loaded off the sim thread
+		self.airport_worker.request(this_airporticao, this_airportname)
+		XPLMSetFlightLoopCallbackInterval(self, self.follow_flightloop_cb, WORKER_POLL_INTERVAL, 1, 0)
+		self.prefetch_weather()
+
+	def show_suggestions(self):
+
+		out_text = []
+		XPGetWidgetDescriptor(self.airport_icao, out_text, SEARCH_MAX_CHARS)
+		current_lat, current_lon = self.position.current_position()
+		self.current_suggestions = self.airport_search.suggest(out_text[0], current_lat, current_lon, SUGGESTION_COUNT)
+		XPSetWidgetDescriptor(self.suggestions, " ".join([airport.icao for airport in self.current_suggestions]))
+
+	def prefetch_weather(self):
+
+		current_lat, current_lon = self.position.current_position()
+		self.metar_prefetcher.prefetch(current_lat, current_lon, self.position.current_track())
+
+	def set_airport_info(self, icao, name, metar, runways, open_runway, procedures):
+
+		self.current_airport_icao = icao
+		self.current_airport_name = name
+		self.current_airport_metar = metar
+		self.current_airport_runways = runways
+		self.current_aiprot_openrunway = open_runway
+		self.current_airport_procedures = procedures
 
-		AirportOb = Airport(self.current_airport_icao)
-		self.current_airport_runways = AirportOb.runways
-
-		if(self.current_airport_metar and self.current_airport_metar.wind_dir):
-			self.current_aiprot_openrunway = AirportOb.open_runway(self.current_airport_metar.wind_dir.value())
-
-		self.print_airport_info()
+		if self.airport_window_created:
+			XPSetWidgetDescriptor(self.airport_icao, str(icao))
+			self.print_airport_info()
 
 	def get_runway_info(self, runway_id):
 		return self.current_airport_runways[str(runway_id)]
@@ -332,7 +711,14 @@ class PythonInterface:
 				
 	def get_runway_str(self, runway):
 			
-		if(runway.ils != "0.000"):
+		if(runway.ils != "0.000" and runway.gs):
+			return "Rwy: {}({}) ILS: {}({}) GS: {:.2f} FT: {}".format(runway.id, 
+															runway.hdg,
+															runway.ils,
+															runway.ilscrs,
+															runway.gs,
+															runway.length)
+		elif(runway.ils != "0.000"):
 			return "Rwy: {}({}) ILS: {}({}) FT: {}".format(runway.id, 
 															runway.hdg,
 															runway.ils,
@@ -356,32 +742,119 @@ class XPWidgetContainer(object):
 		self.current_top = top
 		self.row_h = row_h
 		self.is_transluscent = is_transluscent
+		self.shown = 0
 
 	def new_caption(self, str_cap):
 
 		self.current_top -= self.row_h
-		widget = XPCreateWidget(self.left, self.current_top, self.right, self.current_top-self.row_h, 1, str_cap,  0, self.parent_container, xpWidgetClass_Caption)
-		XPSetWidgetProperty(widget, xpProperty_CaptionLit, self.is_transluscent)
-		self.container.append(widget)	
+		# Captions are kept for the next refresh, only rows beyond the longest list so far are created
+		if self.shown < len(self.container):
+			widget = self.container[self.shown]
+			XPSetWidgetDescriptor(widget, str_cap)
+			XPShowWidget(widget)
+		else:
+			widget = XPCreateWidget(self.left, self.current_top, self.right, self.current_top-self.row_h, 1, str_cap,  0, self.parent_container, xpWidgetClass_Caption)
+			XPSetWidgetProperty(widget, xpProperty_CaptionLit, self.is_transluscent)
+			self.container.append(widget)
+		self.shown += 1
 
 	def remove_all(self):
 		
-		if(len(self.container)>0):
-			for i in self.container:
-				XPHideWidget(i)
-				#XPDestroyWidget(i,self.parent_container, 0)
+		for widget in self.container[:self.shown]:
+			XPHideWidget(widget)
+		self.shown = 0
 
 		# Reset the height
 		self.current_top = self.top
 
+class XPDrawPanel(object):
+
+	def __init__(self, parent_container, left, top, row_h):
+
+		self.parent_container = parent_container
+		self.left = left
+		self.top = top
+		self.row_h = row_h
+		self.lines = []
+
+	def set_lines(self, lines):
+
+		# Offsets are relative to the window, so dragging it needs no relayout
+		self.lines = []
+		for no, line in enumerate(lines):
+			self.lines.append((self.left, self.top + no * self.row_h, line))
+
+	def remove_all(self):
+
+		self.lines = []
+
+	def draw(self):
+
+		left, top, right, bottom = [], [], [], []
+		XPGetWidgetGeometry(self.parent_container, left, top, right, bottom)
+
+		for x_offset, y_offset, line in self.lines:
+			XPLMDrawString(PANEL_COLOR, left[0] + x_offset, top[0] - y_offset, line, 0, xplmFont_Basic)
+
+class Position(object):
+
+	def __init__(self):
+
+		self.latitude_ref = XPLMFindDataRef("sim/flightmodel/position/latitude")
+		self.longitude_ref = XPLMFindDataRef("sim/flightmodel/position/longitude")
+		self.track_ref = XPLMFindDataRef("sim/flightmodel/position/hpath")
+		self.navaid_refs = {}
+		self.read_time = None
+		self.lat = None
+		self.lon = None
+		self.track = None
+
+	def read_position(self):
+
+		# All position datarefs are read together and at most once per sim frame
+		now = XPLMGetElapsedTime()
+		if now != self.read_time:
+			self.lat = XPLMGetDataf(self.latitude_ref)
+			self.lon = XPLMGetDataf(self.longitude_ref)
+			self.track = XPLMGetDataf(self.track_ref)
+			self.read_time = now
+
+	def current_position(self):
+
+		self.read_position()
+		return self.lat, self.lon
+
+	def current_track(self):
+
+		self.read_position()
+		return self.track
+
+	def navaid_ref_by_icao(self, icao):
+
+		if icao not in self.navaid_refs:
+			self.navaid_refs[icao] = XPLMFindNavAid(None, icao, None, None, None, xplm_Nav_Airport)
+
+		return self.navaid_refs[icao]
+
 class Route(object):
 
+	# The airway graph and fix index are built once per session, shared by all routes
+	airway_graph = None
+	airway_graph_lock = threading.Lock()
+	fix_index = None
+	fix_index_lock = threading.Lock()
+	metar_history = None
+	metar_history_lock = threading.Lock()
+
+	def __init__(self, position):
+
+		self.position = position
+
 	def call_lan_lot(self):
 		
-		lat = [XPLMGetDataf(XPLMFindDataRef("sim/flightmodel/position/latitude"))]
-		lon = [XPLMGetDataf(XPLMFindDataRef("sim/flightmodel/position/longitude"))]
+		current_lat, current_lon = self.position.current_position()
 
-		return lat, lon
+		return [current_lat], [current_lon]
 
 	def airport_id_name_by_ref(self, ref):
 
@@ -399,7 +872,7 @@ class Route(object):
 
 		aiport = XPLMGetNavAidInfo(ref, None, lat, lon, None, None, None, None, None, None)
 
-		return lon, lat
+		return lat, lon
 
 	def airport_info_by_local(self):
 
@@ -418,14 +891,14 @@ class Route(object):
 
 	def aiport_latlon_by_icao(self, icao):
 		
-		ref = XPLMFindNavAid(None, icao, None, None, None, xplm_Nav_Airport)
+		ref = self.position.navaid_ref_by_icao(icao)
 		airport_lat, airport_lon  = self.airport_latlon_by_ref(ref)
 
 		return airport_lat[0], airport_lon[0]
 
 	def aiportinfo_by_icao(self, name):
 
-		ref = XPLMFindNavAid(None, name, None, None, None, xplm_Nav_Airport)
+		ref = self.position.navaid_ref_by_icao(name)
 
 		id, airport_names = self.airport_id_name_by_ref(ref)
 
@@ -436,17 +909,383 @@ class Route(object):
 
 	def aiportinfo_by_nearest(self):
 		
-		airport_ids, airport_names  = Route.airport_info_by_local(self)		
+		nearest = Route.airport_info_by_local(self)
 
-		if(len(airport_ids) > 0):
-			return airport_ids, airport_names
+		# Also polled by auto follow, so no airport in range is not an error
+		if(nearest and len(nearest[0]) > 0):
+			return nearest
 		else:
 			return None
 
 	def airport_weather_by_icao(self, icao):
+		metar = metar_cache.get(icao)
+		if metar:
+			return metar
+
 		AWWeather = Weather(icao)
-		return AWWeather.data
+		if AWWeather.data:
+			self.store_weather(icao, AWWeather.data)
+			return AWWeather.data
+		# An old report beats none while the server is unreachable
+		return metar_cache.last(icao)
+
+	def airport_weather_by_icaos(self, icaos, concurrency=WEATHER_CONCURRENCY, deadline=None):
+
+		# Departure, destination and alternates are fetched side by side
+		weather = {}
+		missing = []
+		for icao in icaos:
+			metar = metar_cache.get(icao)
+			if metar:
+				weather[icao] = metar
+			else:
+				missing.append(icao)
+		if missing:
+			errors = {}
+			fetched = weather_provider.fetch_many(missing, concurrency, deadline, errors)
+			for icao, metar in fetched.items():
+				self.store_weather(icao, metar)
+			for icao, error in errors.items():
+				logger.warning("Cannot fetch the METAR of %s: %s" % (icao, error))
+			weather.update(fetched)
+		return weather
+
+	def store_weather(self, icao, metar):
+
+		metar_cache.put(icao, metar)
+		history = self.get_metar_history()
+		if history:
+			try:
+				history.append_metar(icao, metar)
+			except EnvironmentError as error:
+				logger.warning("Cannot archive the METAR of %s: %s" % (icao, error))
+
+	@staticmethod
+	def get_metar_history():
+		if not METAR_HISTORY:
+			return None
+		with Route.metar_history_lock:
+			if Route.metar_history is None:
+				Route.metar_history = MetarHistory(HISTORY_PATH)
+		return Route.metar_history
+
+	def get_airway_graph(self):
+		with Route.airway_graph_lock:
+			if Route.airway_graph is None:
+				directories = Airport.is_env_ok()
+				if not directories:
+					return None
+				cycle_info_path = os.path.join(os.path.dirname(directories[4]), FILE_INF)
+				Route.airway_graph = load_airway_graph(
+					os.path.join(os.path.dirname(directories[3]), FILE_AWY),
+					directories[3],
+					directories[2],
+					airac_cycle(cycle_info_path),
+					os.path.join(CACHE_DIR, FILE_AWY + ".graph"))
+		return Route.airway_graph
+
+	def get_fix_index(self):
+		with Route.fix_index_lock:
+			if Route.fix_index is None:
+				directories = Airport.is_env_ok()
+				if not directories:
+					return None
+				cycle_info_path = os.path.join(os.path.dirname(directories[4]), FILE_INF)
+				Route.fix_index = load_fix_index(
+					directories[3],
+					directories[2],
+					airac_cycle(cycle_info_path),
+					os.path.join(CACHE_DIR, FILE_FIX + ".names"))
+		return Route.fix_index
+
+	def fix_by_name(self, ident):
+
+		# Idents repeat worldwide, the one nearest to the aircraft is meant
+		current_lat, current_lon = self.position.current_position()
+		store = Airport.get_navdata_store()
+		if store:
+			return store.nearest_point(ident, current_lat, current_lon)
+		fix_index = self.get_fix_index()
+		if not fix_index:
+			return None
+		return fix_index.nearest(ident, current_lat, current_lon)
+
+	def route_endpoint(self, graph, ident):
+
+		# Airports are joined to the airways by DCT, fixes on an airway are nodes
+		ref = self.position.navaid_ref_by_icao(ident)
+		if ref != XPLM_NAV_NOT_FOUND:
+			# The lookup also matches fragments of IDs, only an exact one is the airport
+			airport_id, airport_name = self.airport_id_name_by_ref(ref)
+			if airport_id and airport_id[0].upper() == ident.upper():
+				airport_lat, airport_lon = self.airport_latlon_by_ref(ref)
+				return airport_lat[0], airport_lon[0], None
+
+		fix = self.fix_by_name(ident)
+		if not fix:
+			return None
+		nodes = graph.nearest_nodes(fix.lat, fix.lon, 1)
+		if nodes and graph.idents[nodes[0]] == ident and distance_nm(fix.lat, fix.lon, graph.lats[nodes[0]], graph.lons[nodes[0]]) < 0.1:
+			return fix.lat, fix.lon, nodes
+		return fix.lat, fix.lon, None
+
+	def find_route(self, from_ident, to_ident):
+
+		graph = self.get_airway_graph()
+		if not graph:
+			return None
+		origin = self.route_endpoint(graph, from_ident)
+		destination = self.route_endpoint(graph, to_ident)
+		if not origin or not destination:
+			return None
+
+		legs = graph.find_route(origin[0], origin[1], destination[0], destination[1], origin[2], destination[2])
+		if not legs:
+			return None
+		# A fix endpoint is already the first or last airway node
+		if origin[2]:
+			legs = legs[1:]
+			legs[0] = legs[0]._replace(airway=None)
+		else:
+			legs[0] = legs[0]._replace(ident=from_ident)
+		if destination[2]:
+			legs = legs[:-1]
+		else:
+			legs[-1] = legs[-1]._replace(ident=to_ident)
+		return legs
+
+	def route_str(self, from_ident, to_ident):
+
+		legs = self.find_route(from_ident, to_ident)
+		if not legs:
+			return None
+		return route_string(legs)
+
+	def airport_details_by_icao(self, icao):
+
+		metar = self.airport_weather_by_icao(icao)
+
+		AirportOb = Airport(icao)
+		open_runway = None
+		procedures = None
+		if(metar and metar.wind_dir):
+			open_runway = AirportOb.open_runway(metar.wind_dir.value())
+		if(open_runway):
+			procedures = AirportOb.read_procedures(open_runway.id)
+
+		return metar, AirportOb.runways, open_runway, procedures
+
+class AirportInfoWorker(threading.Thread):
+
+	def __init__(self, route):
+
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.route = route
+		self.jobs = Queue.Queue()
+		self.results = Queue.Queue()
+
+	def request(self, icao, name):
+
+		self.jobs.put((icao, name))
+
+	def poll(self):
+
+		# Never blocks, this is called from the flight loop
+		try:
+			return self.results.get_nowait()
+		except Queue.Empty:
+			return None
+
+	def stop(self):
+
+		self.jobs.put((None, None))
+
+	def busy(self):
+
+		# A result posted after the last poll() counts as well, or the flight loop
+		# would stop polling with it still queued
+		return self.jobs.unfinished_tasks > 0 or not self.results.empty()
+
+	def run(self):
+
+		while True:
+			icao, name = self.jobs.get()
+			if icao is None:
+				break
+			# Only XPLM-free work (network, navdata files) runs on this thread
+			try:
+				self.results.put((icao, name) + self.route.airport_details_by_icao(icao))
+			except Exception:
+				logger.exception("Cannot refresh airport %s" % icao)
+			finally:
+				self.jobs.task_done()
 			
+class MetarPrefetcher(object):
+
+	def __init__(self, route, count, concurrency):
+
+		self.route = route
+		self.count = count
+		self.concurrency = concurrency
+		self.busy = threading.Lock()
+
+	def prefetch(self, lat, lon, track):
+
+		# A prefetch that is still running is not queued up behind
+		if not self.busy.acquire(False):
+			return
+		thread = threading.Thread(target=self.run, args=(lat, lon, track))
+		thread.daemon = True
+		thread.start()
+
+	def run(self, lat, lon, track):
+
+		try:
+			store = Airport.get_navdata_store()
+			if store:
+				airports = store.airports_within(lat, lon, PREFETCH_DISTANCE)
+			else:
+				airports = Airport.get_airport_records()
+			ahead = airports_ahead(airports, lat, lon, track, self.count, PREFETCH_DISTANCE, PREFETCH_ANGLE)
+			self.route.airport_weather_by_icaos(ahead, self.concurrency, PREFETCH_DEADLINE)
+		except Exception:
+			logger.exception("METAR prefetch failed")
+		finally:
+			self.busy.release()
+
+class AirportSearch(object):
+
+	def __init__(self):
+
+		self.prefix_index = None
+		self.fuzzy_index = None
+		self.snapshot_key = None
+		self.loading = threading.Lock()
+
+	def load(self):
+
+		# Built off the sim thread, a load already running is not started twice
+		if self.prefix_index is not None or not self.loading.acquire(False):
+			return
+		thread = threading.Thread(target=self.run)
+		thread.daemon = True
+		thread.start()
+
+	def run(self):
+
+		try:
+			directories = Airport.is_env_ok()
+			if not directories:
+				# Logged by is_env_ok(), the next suggestion tries again
+				return
+			airports_file_path = directories[4]
+			cycle = airac_cycle(os.path.join(os.path.dirname(airports_file_path), FILE_INF))
+			sources = [airports_file_path]
+			if os.path.exists(station_file_name):
+				sources.append(station_file_name)
+			key = ("search", SNAPSHOT_VERSION, source_key(cycle, *sources))
+
+			# The snapshot is only trusted for the same cycle and unchanged files
+			snapshot = Snapshot.load(SEARCH_SNAPSHOT, key)
+			if snapshot:
+				prefix_index = PrefixIndex.from_data(snapshot[0])
+				fuzzy_index = FuzzyIndex.from_data(snapshot[1], prefix_index.airports)
+				Airport.set_airport_records(prefix_index.airports)
+			else:
+				airports = Airport.get_airport_records()
+				stations = load_stations() if len(sources) > 1 else {}
+				if not stations:
+					logger.warning("No station file, cities are not searched")
+				prefix_index = PrefixIndex(airports)
+				fuzzy_index = FuzzyIndex(airports, stations)
+			self.snapshot_key = None if snapshot else key
+			self.fuzzy_index = fuzzy_index
+			self.prefix_index = prefix_index
+		except Exception:
+			logger.exception("Cannot build the airport search index")
+		finally:
+			self.loading.release()
+
+	def suggest(self, text, lat, lon, count):
+
+		# No suggestions until the index is ready
+		if self.prefix_index is None:
+			self.load()
+			return []
+		found = self.prefix_index.complete(text, lat, lon, count)
+		# Too few names start with the text, it may be a city or misspelt
+		if len(found) < count and len(text.strip()) >= FUZZY_MIN_CHARS and self.fuzzy_index is not None:
+			for airport in self.fuzzy_index.search(text, count):
+				if len(found) < count and airport not in found:
+					found.append(airport)
+		return found
+
+	def save(self):
+
+		# Only an index built this session needs writing
+		if self.prefix_index is not None and self.snapshot_key is not None:
+			Snapshot.save(SEARCH_SNAPSHOT, self.snapshot_key, (self.prefix_index.to_data(), self.fuzzy_index.to_data()))
+
+class MetarCache(object):
+
+	def __init__(self, max_age):
+
+		self.max_age = max_age
+		self.reports = {}
+		self.lock = threading.Lock()
+
+	def get(self, icao):
+
+		with self.lock:
+			entry = self.reports.get(icao)
+		if entry and time.time() - entry[0] < self.max_age:
+			return entry[1]
+		return None
+
+	def put(self, icao, metar):
+
+		with self.lock:
+			self.reports[icao] = (time.time(), metar)
+
+	def last(self, icao):
+
+		# However old it is
+		with self.lock:
+			entry = self.reports.get(icao)
+		return entry[1] if entry else None
+
+	def records(self, max_age):
+
+		now = time.time()
+		with self.lock:
+			return [(icao, fetched, metar) for icao, (fetched, metar) in self.reports.items() if now - fetched < max_age]
+
+	def restore(self, records, max_age):
+
+		# Judged by the observation time, the fetch time says nothing about the weather
+		now = datetime.datetime.utcnow()
+		with self.lock:
+			for icao, fetched, metar in records:
+				if metar.time and (now - metar.time).total_seconds() < max_age and icao not in self.reports:
+					self.reports[icao] = (fetched, metar)
+
+metar_cache = MetarCache(METAR_MAX_AGE)
+
+def create_weather_provider():
+	if WEATHER_PROVIDER == "directory":
+		return DirectoryProvider(WEATHER_DIRECTORY)
+	if WEATHER_PROVIDER == "archive":
+		return ArchiveProvider(WEATHER_ARCHIVE, WEATHER_REPLAY_TIME)
+	# Connections are kept open, unchanged reports are not parsed again
+	urls = [NOAA_STATION_URL]
+	if WEATHER_MIRROR_URL:
+		urls.append(WEATHER_MIRROR_URL)
+	policy = FetchPolicy(WEATHER_DEADLINE, WEATHER_RETRIES, hedge_after=WEATHER_HEDGE_AFTER)
+	return NoaaStations(ConnectionPool(WEATHER_TIMEOUT, WEATHER_IDLE_CONNECTIONS), urls, policy)
+
+weather_provider = create_weather_provider()
+
 class Weather(object):
 
 	def __init__(self, icao):
@@ -456,36 +1295,39 @@ class Weather(object):
 		self.observations = None
 		self.data = None
 
-		self.get_noaa_weather()
-		self.convert_meta()
-
-	def get_noaa_weather(self):
-		
-		try:	
-			link = "http://tgftp.nws.noaa.gov/data/observations/metar/stations/" + self.icao.upper() + ".TXT"
-			f = urllib.urlopen(link)
-
-			if(f.getcode() == 200):
-				self.metarcode = f.readlines()[1]
-
-			pass
-		except:
-			print "There was a error"
-			pass
-
-	def convert_meta(self):
-		if(self.metarcode):
-			self.data = Metar.Metar(self.metarcode)
+		self.get_weather()
+
+	def get_weather(self):
+
+		from metar.Metar import ParserError
+		try:
+			self.data = weather_provider.fetch(self.icao)
+		except HTTP_ERRORS + (EnvironmentError,) as error:
+			logger.warning("Cannot fetch the METAR of %s: %s" % (self.icao, error))
+			return
+		except ParserError as error:
+			logger.warning("Cannot read the METAR of %s: %s" % (self.icao, error))
+			return
+		except Exception:
+			# An odd report (UnitsError, ValueError, ...) must not end the refresh
+			logger.exception("Cannot decode the METAR of %s" % self.icao)
+			return
+		if(self.data):
+			self.metarcode = self.data.code
+			if self.data.unparsed():
+				logger.info("Unknown groups in the METAR of %s: %s" % (self.icao,
+					", ".join("'%s' at %d" % (group, position) for position, group in self.data.unparsed())))
 
 class Runway(object):
 	
-	def __init__(self, id, hdg, ils, ilscrs, length):
+	def __init__(self, id, hdg, ils, ilscrs, length, gs=None):
 
 		self.id = id
 		self.hdg = hdg
 		self.ils = ils
 		self.ilscrs = ilscrs
 		self.length = length
+		self.gs = gs
 
 class Airport(object):
 	# some constants
@@ -493,6 +1335,15 @@ class Airport(object):
 	SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 	SCRIPT_NAME = os.path.split(os.path.abspath(__file__))[1]
 
+	# earth_nav.dat is indexed once per session, shared by all airports
+	ils_index = None
+	ils_index_lock = threading.Lock()
+	procedure_cache = ProcedureCache(PROCEDURE_CACHE_SIZE)
+	navdata_store = None
+	navdata_store_started = False
+	navdata_store_lock = threading.Lock()
+	airport_records = None
+	airport_records_lock = threading.Lock()
 
 	def __init__(self, icao_code):
 
@@ -502,8 +1353,16 @@ class Airport(object):
 		self.runways = None
 
 		self.read_runway_information()
+		self.read_ils_information()
 
 	def read_runway_information(self):
+		store = self.get_navdata_store()
+		if store:
+			self.runways = {}
+			for rwy_id, rwy_hdg, rwy_length, rwy_ils, rwy_ilscrs in store.runways(self.icao):
+				self.runways[rwy_id] = Runway(rwy_id,rwy_hdg,rwy_ils,rwy_ilscrs,rwy_length)
+			return
+
 		runways = {}
 		with open(self.airports_file_path, 'r') as f:
 			lines = f.readlines()
@@ -530,6 +1389,85 @@ class Airport(object):
 
 		self.runways = runways
 
+	def read_ils_information(self):
+		ils_index = self.get_navdata_store() or self.get_ils_index()
+
+		for runway in self.runways.values():
+			ils = ils_index.ils(self.icao, runway.id)
+			if ils:
+				runway.ils = ils.freq
+				runway.ilscrs = str(ils.course)
+				runway.gs = ils.gs_angle
+
+	def get_ils_index(self):
+		with Airport.ils_index_lock:
+			if Airport.ils_index is None:
+				cycle_info_path = os.path.join(os.path.dirname(self.airports_file_path), FILE_INF)
+				Airport.ils_index = IlsIndex(
+					self.directories[2],
+					airac_cycle(cycle_info_path),
+					os.path.join(CACHE_DIR, FILE_NAV + ".ils"))
+		return Airport.ils_index
+
+	@staticmethod
+	def get_navdata_store():
+		"""
+		Return the store once it is ready, None before.  The first call builds
+		it on a thread of its own, that takes seconds for a new AIRAC cycle;
+		meanwhile the text files and their indexes serve.
+		"""
+		if not USE_NAVDATA_STORE:
+			return None
+		with Airport.navdata_store_lock:
+			if Airport.navdata_store is None and not Airport.navdata_store_started:
+				Airport.navdata_store_started = True
+				thread = threading.Thread(target=Airport.build_navdata_store)
+				thread.daemon = True
+				thread.start()
+		return Airport.navdata_store
+
+	@staticmethod
+	def build_navdata_store():
+		# A failed build is not tried again this session, the text files serve
+		try:
+			from navdata.Store import open_store
+			directories = Airport.is_env_ok()
+			if not directories:
+				return
+			store = open_store(
+				os.path.join(CACHE_DIR, "navdata.db"),
+				directories[4],
+				directories[2],
+				directories[3],
+				os.path.join(os.path.dirname(directories[4]), FILE_INF))
+			with Airport.navdata_store_lock:
+				Airport.navdata_store = store
+		except Exception:
+			logger.exception("Cannot build the navdata store")
+
+	@staticmethod
+	def get_airport_records():
+		with Airport.airport_records_lock:
+			if Airport.airport_records is None:
+				directories = Airport.is_env_ok()
+				if not directories:
+					# Logged by is_env_ok(), nothing is prefetched or searched
+					return []
+				Airport.airport_records = read_airports(directories[4])
+		return Airport.airport_records
+
+	@staticmethod
+	def set_airport_records(airports):
+		with Airport.airport_records_lock:
+			if Airport.airport_records is None:
+				Airport.airport_records = airports
+
+	def read_procedures(self, runway_id):
+		cycle_info_path = os.path.join(os.path.dirname(self.airports_file_path), FILE_INF)
+		procedures = Airport.procedure_cache.get(self.directories[0], self.icao, airac_cycle(cycle_info_path))
+
+		return procedures_for_runway(procedures, runway_id)
+
 	def sort_by_runway_length(self):
 		
 		new_runways = []
@@ -553,7 +1491,8 @@ class Airport(object):
 		return None
 
 	
-	def is_env_ok(self):
+	@staticmethod
+	def is_env_ok():
 		# Check, if we are in X-Plane's root dir:
 		for d in XPDIRS:
 			if not os.path.isdir(os.path.join(os.getcwd(), d)):
@@ -630,4 +1569,6 @@ class Airport(object):
 			navaids_file_path,
 			fixes_file_path,
 			airports_file_path]
-		return directories
\ No newline at end of file
+		return directories
+
+IMPORT_TIME = time.time() - IMPORT_START
@@ -17,16 +17,46 @@ class UnitsError(Exception):
 
 FRACTION_RE = re.compile(r"^((?P<int>\d+)\s*)?(?P<num>\d)/(?P<den>\d+)$")
   
+## records store values in one canonical unit per class, plus the unit reported
+
+def _from_canonical( cls, canonical_units, value, units ):
+  """Return an instance of `cls` in `units` holding `value` given in `canonical_units`."""
+  result = cls.__new__(cls)
+  result._units = canonical_units
+  result._value = value
+  if units != canonical_units:
+    # Reports carry no finer values, rounding drops the conversion noise
+    result._value = round(result.value(units), 6)
+    result._units = units
+  return result
+
+## unit names are looked up, not upper-cased and searched for on every call
+
+def _unit_names( legal_units ):
+  names = {}
+  for units in legal_units:
+    names[units] = names[units.lower()] = units
+  return names
+
+def _legal_units( unit_names, units, kind ):
+  """Return `units` in upper case, raising UnitsError if it is not a unit of `kind`."""
+  legal = unit_names.get(units) or unit_names.get(units.upper())
+  if not legal:
+    raise UnitsError("unrecognized "+kind+" unit: '"+units+"'")
+  return legal
+
+GTLT_TEXT = { ">": "greater than ", "<": "less than ", None: "" }
+
 ## classes representing dimensioned values in METAR reports
     
 class temperature(object):
   """A class representing a temperature value."""
   legal_units = [ "F", "C", "K" ]
+  unit_names = _unit_names(legal_units)
+  formats = { "C": "%.1f C", "F": "%.1f F", "K": "%.1f K" }
   
   def __init__( self, value, units="C" ):
-    if not units.upper() in temperature.legal_units:
-      raise UnitsError("unrecognized temperature unit: '"+units+"'")
-    self._units = units.upper()
+    self._units = temperature.unit_names.get(units) or _legal_units(temperature.unit_names, units, "temperature")
     try:
       self._value = float(value)
     except ValueError:
@@ -43,9 +73,7 @@ class temperature(object):
     if units == None:
       return self._value
     else:
-      if not units.upper() in temperature.legal_units:
-        raise UnitsError("unrecognized temperature unit: '"+units+"'")
-      units = units.upper()
+      units = temperature.unit_names.get(units) or _legal_units(temperature.unit_names, units, "temperature")
     if self._units == "C":
       celsius_value = self._value
     elif self._units == "F":
@@ -64,26 +92,26 @@ class temperature(object):
     if units == None:
       units = self._units
     else:
-      if not units.upper() in temperature.legal_units:
-        raise UnitsError("unrecognized temperature unit: '"+units+"'")
-      units = units.upper()
-    val = self.value(units)
-    if units == "C":
-      return "%.1f C" % val
-    elif units == "F":
-      return "%.1f F" % val
-    elif units == "K":
-      return "%.1f K" % val
+      units = temperature.unit_names.get(units) or _legal_units(temperature.unit_names, units, "temperature")
+    return temperature.formats[units] % self.value(units)
+
+  def to_record( self ):
+    """Return (value in C, reported units)."""
+    return (self.value("C"), self._units)
+
+  @classmethod
+  def from_record( cls, record ):
+    return _from_canonical(cls, "C", record[0], record[1])
 
 class pressure(object):
   """A class representing a barometric pressure value."""
   legal_units = [ "MB", "HPA", "IN" ]
+  unit_names = _unit_names(legal_units)
+  formats = { "MB": "%.1f mb", "HPA": "%.1f hPa", "IN": "%.2f inches" }
   
   def __init__( self, value, units="MB" ):
-    if not units.upper() in pressure.legal_units:
-      raise UnitsError("unrecognized pressure unit: '"+units+"'")
     self._value = float(value)
-    self._units = units.upper()
+    self._units = pressure.unit_names.get(units) or _legal_units(pressure.unit_names, units, "pressure")
 
   def __str__(self):
     return self.string()
@@ -93,9 +121,7 @@ class pressure(object):
     if units == None:
       return self._value
     else:
-      if not units.upper() in pressure.legal_units:
-        raise UnitsError("unrecognized pressure unit: '"+units+"'")
-      units = units.upper()
+      units = pressure.unit_names.get(units) or _legal_units(pressure.unit_names, units, "pressure")
     if units == self._units:
       return self._value
     if self._units == "IN":
@@ -114,29 +140,29 @@ class pressure(object):
     if not units:
       units = self._units
     else:
-      if not units.upper() in pressure.legal_units:
-        raise UnitsError("unrecognized pressure unit: '"+units+"'")
-      units = units.upper()
-    val = self.value(units)
-    if units == "MB":
-      return "%.1f mb" % val
-    elif units == "HPA":
-      return "%.1f hPa" % val
-    elif units == "IN":
-      return "%.2f inches" % val
+      units = pressure.unit_names.get(units) or _legal_units(pressure.unit_names, units, "pressure")
+    return pressure.formats[units] % self.value(units)
+
+  def to_record( self ):
+    """Return (value in MB, reported units)."""
+    return (self.value("MB"), self._units)
+
+  @classmethod
+  def from_record( cls, record ):
+    return _from_canonical(cls, "MB", record[0], record[1])
 
 class speed(object):
   """A class representing a wind speed value."""
   legal_units = [ "KT", "MPS", "KMH", "MPH" ]
+  unit_names = _unit_names(legal_units)
+  formats = { "KMH": "%.0f km/h", "KT": "%.0f knots", "MPH": "%.0f mph", "MPS": "%.0f mps" }
   legal_gtlt = [ ">", "<" ]
   
   def __init__( self, value, units=None, gtlt=None ):
     if not units:
       self._units = "MPS"
     else:
-      if not units.upper() in speed.legal_units:
-        raise UnitsError("unrecognized speed unit: '"+units+"'")
-      self._units = units.upper()
+      self._units = speed.unit_names.get(units) or _legal_units(speed.unit_names, units, "speed")
     if gtlt and not gtlt in speed.legal_gtlt:
       raise ValueError("unrecognized greater-than/less-than symbol: '"+gtlt+"'")
     self._gtlt = gtlt
@@ -150,9 +176,7 @@ class speed(object):
     if not units:
       return self._value
     else:
-      if not units.upper() in speed.legal_units:
-        raise UnitsError("unrecognized speed unit: '"+units+"'")
-      units = units.upper()
+      units = speed.unit_names.get(units) or _legal_units(speed.unit_names, units, "speed")
     if units == self._units:
       return self._value
     if self._units == "KMH":
@@ -177,37 +201,33 @@ class speed(object):
     if not units:
       units = self._units
     else:
-      if not units.upper() in speed.legal_units:
-        raise UnitsError("unrecognized speed unit: '"+units+"'")
-      units = units.upper()
-    val = self.value(units)
-    if units == "KMH":
-      text = "%.0f km/h" % val
-    elif units == "KT":
-      text = "%.0f knots" % val
-    elif units == "MPH":
-      text = "%.0f mph" % val
-    elif units == "MPS":
-      text = "%.0f mps" % val
-    if self._gtlt == ">":
-      text = "greater than "+text
-    elif self._gtlt == "<":
-      text = "less than "+text
-    return text
+      units = speed.unit_names.get(units) or _legal_units(speed.unit_names, units, "speed")
+    return GTLT_TEXT[self._gtlt] + speed.formats[units] % self.value(units)
+
+  def to_record( self ):
+    """Return (value in KT, reported units, greater/less than)."""
+    return (self.value("KT"), self._units, self._gtlt)
+
+  @classmethod
+  def from_record( cls, record ):
+    value = _from_canonical(cls, "KT", record[0], record[1])
+    value._gtlt = record[2]
+    return value
 
 
 class distance(object):
   """A class representing a distance value."""
   legal_units = [ "SM", "MI", "M", "KM", "FT" ]
+  unit_names = _unit_names(legal_units)
+  unit_text = { "SM": " miles", "MI": " miles", "M": " meters", "KM": " km", "FT": " feet" }
+  formats = dict((units, ("%.1f" if units == "KM" else "%.0f") + text) for units, text in unit_text.items())
   legal_gtlt = [ ">", "<" ]
   
   def __init__( self, value, units=None, gtlt=None ):
     if not units:
       self._units = "M"
     else:
-      if not units.upper() in distance.legal_units:
-        raise UnitsError("unrecognized distance unit: '"+units+"'")
-      self._units = units.upper()
+      self._units = distance.unit_names.get(units) or _legal_units(distance.unit_names, units, "distance")
     
     try:
       if value.startswith('M'):
@@ -244,9 +264,7 @@ class distance(object):
     if not units:
       return self._value
     else:
-      if not units.upper() in distance.legal_units:
-        raise UnitsError("unrecognized distance unit: '"+units+"'")
-      units = units.upper()
+      units = distance.unit_names.get(units) or _legal_units(distance.unit_names, units, "distance")
     if units == self._units:
       return self._value
     if self._units == "SM" or self._units == "MI":
@@ -271,33 +289,27 @@ class distance(object):
     if not units:
       units = self._units
     else:
-      if not units.upper() in distance.legal_units:
-        raise UnitsError("unrecognized distance unit: '"+units+"'")
-      units = units.upper()
+      units = distance.unit_names.get(units) or _legal_units(distance.unit_names, units, "distance")
     if self._num and self._den and units == self._units:
       val = int(self._value - self._num/self._den)
       if val:
         text = "%d %d/%d" % (val, self._num, self._den)
       else:
         text = "%d/%d" % (self._num, self._den)
+      text += distance.unit_text[units]
     else:
-      if units == "KM":
-        text = "%.1f" % self.value(units)
-      else:
-        text = "%.0f" % self.value(units)
-    if units == "SM" or units == "MI":
-      text += " miles"
-    elif units == "M":
-      text += " meters"
-    elif units == "KM":
-      text += " km"
-    elif units == "FT":
-      text += " feet"
-    if self._gtlt == ">":
-      text = "greater than "+text
-    elif self._gtlt == "<":
-      text = "less than "+text
-    return text
+      text = distance.formats[units] % self.value(units)
+    return GTLT_TEXT[self._gtlt] + text
+
+  def to_record( self ):
+    """Return (value in M, reported units, greater/less than, fraction numerator, denominator)."""
+    return (self.value("M"), self._units, self._gtlt, self._num, self._den)
+
+  @classmethod
+  def from_record( cls, record ):
+    value = _from_canonical(cls, "M", record[0], record[1])
+    value._gtlt, value._num, value._den = record[2:5]
+    return value
 
 
 class direction(object):
@@ -343,19 +355,29 @@ class direction(object):
             break
     return self._compass
 
+  def to_record( self ):
+    """Return (degrees, compass name if reported as one)."""
+    return (self._degrees, self._compass)
+
+  @classmethod
+  def from_record( cls, record ):
+    value = cls.__new__(cls)
+    value._degrees, value._compass = record[0], record[1]
+    return value
+
 
 class precipitation(object):
   """A class representing a precipitation value."""
   legal_units = [ "IN", "CM" ]
+  unit_names = _unit_names(legal_units)
+  formats = { "IN": "%.2fin", "CM": "%.2fcm" }
   legal_gtlt = [ ">", "<" ]
   
   def __init__( self, value, units=None, gtlt=None ):
     if not units:
       self._units = "IN"
     else:
-      if not units.upper() in precipitation.legal_units:
-        raise UnitsError("unrecognized precipitation unit: '"+units+"'")
-      self._units = units.upper()
+      self._units = precipitation.unit_names.get(units) or _legal_units(precipitation.unit_names, units, "precipitation")
     
     try:
       if value.startswith('M'):
@@ -379,13 +401,11 @@ class precipitation(object):
     if not units:
       return self._value
     else:
-      if not units.upper() in precipitation.legal_units:
-        raise UnitsError("unrecognized precipitation unit: '"+units+"'")
-      units = units.upper()
+      units = precipitation.unit_names.get(units) or _legal_units(precipitation.unit_names, units, "precipitation")
     if units == self._units:
       return self._value
     if self._units == "CM":
-      i_value = self._value*2.54
+      i_value = self._value/2.54
     else:
       i_value = self._value
     if units == "CM":
@@ -398,19 +418,18 @@ class precipitation(object):
     if not units:
       units = self._units
     else:
-      if not units.upper() in precipitation.legal_units:
-        raise UnitsError("unrecognized precipitation unit: '"+units+"'")
-      units = units.upper()
-    text = "%.2f" % self.value(units)
-    if units == "CM":
-      text += "cm"
-    else:
-      text += "in"
-    if self._gtlt == ">":
-      text = "greater than "+text
-    elif self._gtlt == "<":
-      text = "less than "+text
-    return text
+      units = precipitation.unit_names.get(units) or _legal_units(precipitation.unit_names, units, "precipitation")
+    return GTLT_TEXT[self._gtlt] + precipitation.formats[units] % self.value(units)
+
+  def to_record( self ):
+    """Return (value in IN, reported units, greater/less than)."""
+    return (self.value("IN"), self._units, self._gtlt)
+
+  @classmethod
+  def from_record( cls, record ):
+    value = _from_canonical(cls, "IN", record[0], record[1])
+    value._gtlt = record[2]
+    return value
 
 
 class position(object):
@@ -49,6 +49,9 @@ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
 
 import re
 import datetime
+import marshal
+import threading
+from collections import OrderedDict
 from metar.Datatypes import *
 
 ## Exceptions
@@ -57,122 +60,160 @@ class ParserError(Exception):
   """Exception raised when an unparseable group is found in body of the report."""
   pass
 
+class ParserBudgetError(ParserError):
+  """Exception raised when a report is longer or costs more than its parse_budget allows."""
+  pass
+
+## limits on the work one report may cost
+
+class parse_budget(object):
+  """
+  Reports are refused beyond `max_length` characters or `max_groups`
+  groups, and given up after `max_work` pattern match attempts.  Real
+  reports stay far below the defaults; garbage fails fast.
+  """
+
+  def __init__( self, max_length=1000, max_groups=150, max_work=3000 ):
+    self.max_length = max_length
+    self.max_groups = max_groups
+    self.max_work = max_work
+
+default_budget = parse_budget()
+
+## regular expressions are compiled when the first report is parsed
+
+class lazy_pattern(object):
+  """A regular expression that is compiled on first use."""
+
+  def __init__( self, pattern, flags=0 ):
+    self.pattern = pattern
+    self.flags = flags
+
+  def __getattr__( self, name ):
+    # Only called for attributes not set yet, so each method is looked up once
+    value = getattr(re.compile(self.pattern, self.flags), name)
+    setattr(self, name, value)
+    return value
+
 ## regular expressions to decode various groups of the METAR code
 
-MISSING_RE = re.compile(r"^[M/]+$")
+MISSING_RE = lazy_pattern(r"^[M/]+$")
 
-TYPE_RE =     re.compile(r"^(?P<type>METAR|SPECI)\s+")
-STATION_RE =  re.compile(r"^(?P<station>[A-Z][A-Z0-9]{3})\s+")
-TIME_RE = re.compile(r"""^(?P<day>\d\d)
+TYPE_RE =     lazy_pattern(r"^(?P<type>METAR|SPECI)\s+")
+STATION_RE =  lazy_pattern(r"^(?P<station>[A-Z][A-Z0-9]{3})\s+")
+TIME_RE = lazy_pattern(r"""^(?P<day>\d\d)
                           (?P<hour>\d\d)
                           (?P<min>\d\d)Z?\s+""",
                           re.VERBOSE)
-MODIFIER_RE = re.compile(r"^(?P<mod>AUTO|FINO|NIL|TEST|CORR?|RTD|CC[A-G])\s+")
-WIND_RE = re.compile(r"""^(?P<dir>[\dO]{3}|[0O]|///|MMM|VRB)
+MODIFIER_RE = lazy_pattern(r"^(?P<mod>AUTO|FINO|NIL|TEST|CORR?|RTD|CC[A-G])\s+")
+WIND_RE = lazy_pattern(r"""^(?P<dir>[\dO]{3}|[0O]|///|MMM|VRB)
                           (?P<speed>P?[\dO]{2,3}|[/M]{2,3})
                         (G(?P<gust>P?(\d{1,3}|[/M]{1,3})))?
                           (?P<units>KTS?|LT|K|T|KMH|MPS)?
                       (\s+(?P<varfrom>\d\d\d)V
                           (?P<varto>\d\d\d))?\s+""",
                           re.VERBOSE)
-VISIBILITY_RE = re.compile(r"""^(?P<vis>(?P<dist>(M|P)?\d\d\d\d|////)
+VISIBILITY_RE = lazy_pattern(r"""^(?P<vis>(?P<dist>(M|P)?\d\d\d\d|////)
                                         (?P<dir>[NSEW][EW]? | NDV)? |
                                         (?P<distu>(M|P)?(\d+|\d\d?/\d\d?|\d+\s+\d/\d))
                                         (?P<units>SM|KM|M|U) | 
                                         CAVOK )\s+""",
                                  re.VERBOSE)
-RUNWAY_RE = re.compile(r"""^(RVRNO | 
+RUNWAY_RE = lazy_pattern(r"""^(RVRNO | 
                              R(?P<name>\d\d(RR?|LL?|C)?)/
                               (?P<low>(M|P)?\d\d\d\d)
                             (V(?P<high>(M|P)?\d\d\d\d))?
                               (?P<unit>FT)?[/NDU]*)\s+""",
                               re.VERBOSE)
-WEATHER_RE = re.compile(r"""^(?P<int>(-|\+|VC)*)
+WEATHER_RE = lazy_pattern(r"""^(?P<int>(-|\+|VC)*)
                              (?P<desc>(MI|PR|BC|DR|BL|SH|TS|FZ)+)?
                              (?P<prec>(DZ|RA|SN|SG|IC|PL|GR|GS|UP|/)*)
                              (?P<obsc>BR|FG|FU|VA|DU|SA|HZ|PY)?
                              (?P<other>PO|SQ|FC|SS|DS|NSW|/+)?
                              (?P<int2>[-+])?\s+""",
                              re.VERBOSE)
-SKY_RE= re.compile(r"""^(?P<cover>VV|CLR|SKC|SCK|NSC|NCD|BKN|SCT|FEW|[O0]VC|///)
+SKY_RE = lazy_pattern(r"""^(?P<cover>VV|CLR|SKC|SCK|NSC|NCD|BKN|SCT|FEW|[O0]VC|///)
                         (?P<height>[\dO]{2,4}|///)?
                         (?P<cloud>([A-Z][A-Z]+|///))?\s+""",
                         re.VERBOSE)
-TEMP_RE = re.compile(r"""^(?P<temp>(M|-)?\d+|//|XX|MM)/
+TEMP_RE = lazy_pattern(r"""^(?P<temp>(M|-)?\d+|//|XX|MM)/
                           (?P<dewpt>(M|-)?\d+|//|XX|MM)?\s+""",
                           re.VERBOSE)
-PRESS_RE = re.compile(r"""^(?P<unit>A|Q|QNH|SLP)?
+PRESS_RE = lazy_pattern(r"""^(?P<unit>A|Q|QNH|SLP)?
                            (?P<press>[\dO]{3,4}|////)
                            (?P<unit2>INS)?\s+""",
                            re.VERBOSE)
-RECENT_RE = re.compile(r"""^RE(?P<desc>MI|PR|BC|DR|BL|SH|TS|FZ)?
+RECENT_RE = lazy_pattern(r"""^RE(?P<desc>MI|PR|BC|DR|BL|SH|TS|FZ)?
                               (?P<prec>(DZ|RA|SN|SG|IC|PL|GR|GS|UP)*)?
                               (?P<obsc>BR|FG|FU|VA|DU|SA|HZ|PY)?
                               (?P<other>PO|SQ|FC|SS|DS)?\s+""",
                               re.VERBOSE)
-WINDSHEAR_RE = re.compile(r"^(WS\s+)?(ALL\s+RWY|RWY(?P<name>\d\d(RR?|L?|C)?))\s+")
-COLOR_RE = re.compile(r"""^(BLACK)?(BLU|GRN|WHT|RED)\+?
+WINDSHEAR_RE = lazy_pattern(r"^(WS\s+)?(ALL\s+RWY|RWY(?P<name>\d\d(RR?|L?|C)?))\s+")
+COLOR_RE = lazy_pattern(r"""^(BLACK)?(BLU|GRN|WHT|RED)\+?
                         (/?(BLACK)?(BLU|GRN|WHT|RED)\+?)*\s*""",
                         re.VERBOSE)
-RUNWAYSTATE_RE = re.compile(r"""((?P<name>\d\d) | R(?P<namenew>\d\d)(RR?|LL?|C)?/?)
+RUNWAYSTATE_RE = lazy_pattern(r"""((?P<name>\d\d) | R(?P<namenew>\d\d)(RR?|LL?|C)?/?)
                                 ((?P<special> SNOCLO|CLRD(\d\d|//)) |
                                  (?P<deposit>(\d|/))
                                  (?P<extent>(\d|/))
                                  (?P<depth>(\d\d|//))
                                  (?P<friction>(\d\d|//)))\s+""",
                              re.VERBOSE)
-TREND_RE = re.compile(r"^(?P<trend>TEMPO|BECMG|FCST|NOSIG)\s+")
+TREND_RE = lazy_pattern(r"^(?P<trend>TEMPO|BECMG|FCST|NOSIG)\s+")
 
-TRENDTIME_RE = re.compile(r"(?P<when>(FM|TL|AT))(?P<hour>\d\d)(?P<min>\d\d)\s+")
+TRENDTIME_RE = lazy_pattern(r"(?P<when>(FM|TL|AT))(?P<hour>\d\d)(?P<min>\d\d)\s+")
 
-REMARK_RE = re.compile(r"^(RMKS?|NOSPECI|NOSIG)\s+")
+REMARK_RE = lazy_pattern(r"^(RMKS?|NOSPECI|NOSIG)\s+")
 
 ## regular expressions for remark groups
 
-AUTO_RE = re.compile(r"^AO(?P<type>\d)\s+")
-SEALVL_PRESS_RE = re.compile(r"^SLP(?P<press>\d\d\d)\s+")
-PEAK_WIND_RE = re.compile(r"""^P[A-Z]\s+WND\s+
+AUTO_RE = lazy_pattern(r"^AO(?P<type>\d)\s+")
+SEALVL_PRESS_RE = lazy_pattern(r"^SLP(?P<press>\d\d\d)\s+")
+PEAK_WIND_RE = lazy_pattern(r"""^P[A-Z]\s+WND\s+
                                (?P<dir>\d\d\d)
                                (?P<speed>P?\d\d\d?)/
                                (?P<hour>\d\d)?
                                (?P<min>\d\d)\s+""",
                                re.VERBOSE)
-WIND_SHIFT_RE = re.compile(r"""^WSHFT\s+
+WIND_SHIFT_RE = lazy_pattern(r"""^WSHFT\s+
                                 (?P<hour>\d\d)?
                                 (?P<min>\d\d)
                                 (\s+(?P<front>FROPA))?\s+""",
                                 re.VERBOSE)
-PRECIP_1HR_RE = re.compile(r"^P(?P<precip>\d\d\d\d)\s+")
-PRECIP_24HR_RE = re.compile(r"""^(?P<type>6|7)
+PRECIP_1HR_RE = lazy_pattern(r"^P(?P<precip>\d\d\d\d)\s+")
+PRECIP_24HR_RE = lazy_pattern(r"""^(?P<type>6|7)
                                  (?P<precip>\d\d\d\d)\s+""",
                                  re.VERBOSE)
-PRESS_3HR_RE = re.compile(r"""^5(?P<tend>[0-8])
+PRESS_3HR_RE = lazy_pattern(r"""^5(?P<tend>[0-8])
                                 (?P<press>\d\d\d)\s+""",
                                 re.VERBOSE)
-TEMP_1HR_RE = re.compile(r"""^T(?P<tsign>0|1)
+TEMP_1HR_RE = lazy_pattern(r"""^T(?P<tsign>0|1)
                                (?P<temp>\d\d\d)
                                ((?P<dsign>0|1)
                                (?P<dewpt>\d\d\d))?\s+""",
                                re.VERBOSE)
-TEMP_6HR_RE = re.compile(r"""^(?P<type>1|2)
+TEMP_6HR_RE = lazy_pattern(r"""^(?P<type>1|2)
                               (?P<sign>0|1)
                               (?P<temp>\d\d\d)\s+""",
                               re.VERBOSE)
-TEMP_24HR_RE = re.compile(r"""^4(?P<smaxt>0|1)
+TEMP_24HR_RE = lazy_pattern(r"""^4(?P<smaxt>0|1)
                                 (?P<maxt>\d\d\d)
                                 (?P<smint>0|1)
                                 (?P<mint>\d\d\d)\s+""",
                                 re.VERBOSE)
-UNPARSED_RE = re.compile(r"(?P<group>\S+)\s+")
+UNPARSED_RE = lazy_pattern(r"(?P<group>\S+)\s+")
 
-LIGHTNING_RE = re.compile(r"""^((?P<freq>OCNL|FRQ|CONS)\s+)?
+## a direction is never followed by another direction letter, or a run like
+## "NENENE" could be split in exponentially many ways before failing
+
+LIGHTNING_RE = lazy_pattern(r"""^((?P<freq>OCNL|FRQ|CONS)\s+)?
                              LTG(?P<type>(IC|CC|CG|CA)*)
                                 ( \s+(?P<loc>( OHD | VC | DSNT\s+ | \s+AND\s+ | 
-                                 [NSEW][EW]? (-[NSEW][EW]?)* )+) )?\s+""",
+                                 [NSEW][EW]?(?![NSEW]) (-[NSEW][EW]?(?![NSEW]))* )+) )?\s+""",
                                 re.VERBOSE)
                                                   
-TS_LOC_RE = re.compile(r"""TS(\s+(?P<loc>( OHD | VC | DSNT\s+ | \s+AND\s+ | 
-                                           [NSEW][EW]? (-[NSEW][EW]?)* )+))?
+TS_LOC_RE = lazy_pattern(r"""TS(\s+(?P<loc>( OHD | VC | DSNT\s+ | \s+AND\s+ | 
+                                           [NSEW][EW]?(?![NSEW]) (-[NSEW][EW]?(?![NSEW]))* )+))?
                                           ( \s+MOV\s+(?P<dir>[NSEW][EW]?) )?\s+""",
                            re.VERBOSE)
 
@@ -296,6 +337,24 @@ def _unparsedGroup( self, d ):
     Handle otherwise unparseable main-body groups.
     """
     self._unparsed_groups.append(d['group'])
+
+def _rendered( method ):
+  """
+  Remember the text `method` returns for each choice of units or separator;
+  a report is not changed once parsed, so it is only rendered once.
+  """
+  name = method.__name__
+  def render( self, *args, **kwargs ):
+      key = (name,) + args
+      if kwargs:
+          key += tuple(sorted(kwargs.items()))
+      text = self._rendered.get(key)
+      if text is None:
+          text = self._rendered[key] = method(self, *args, **kwargs)
+      return text
+  render.__name__ = method.__name__
+  render.__doc__ = method.__doc__
+  return render
       
 ## METAR report objects
 
@@ -304,8 +363,18 @@ debug = False
 class Metar(object):
   """METAR (aviation meteorology report)"""
   
-  def __init__( self, metarcode, month=None, year=None, utcdelta=None):
-      """Parse raw METAR code."""
+  def __init__( self, metarcode, month=None, year=None, utcdelta=None, context=None, budget=None,
+                strict=True ):
+      """
+      Parse raw METAR code, dated against `context` if one is given and
+      limited by `budget` (default_budget if not).  Unless `strict`, groups
+      not understood are left for unparsed() instead of raising ParserError.
+      """
+      budget = budget or default_budget
+      if len(metarcode) > budget.max_length:
+          raise ParserBudgetError("Report of %d characters, at most %d are parsed" % (len(metarcode), budget.max_length))
+      if len(metarcode.split()) > budget.max_groups:
+          raise ParserBudgetError("Report of %d groups, at most %d are parsed" % (len(metarcode.split()), budget.max_groups))
       self.code = metarcode              # original METAR code
       self.type = 'METAR'                # METAR (routine) or SPECI (special)
       self.mod = "AUTO"                  # AUTO (automatic) or COR (corrected)
@@ -346,26 +415,37 @@ class Metar(object):
       self._trend_groups = []            # trend forecast groups
       self._remarks = []                 # remarks (list of strings)
       self._unparsed_groups = []
+      self._unparsed_positions = []      # offsets of the unparsed groups in the code
       self._unparsed_remarks = []
+      self._rendered = {}                # texts of the methods marked @_rendered
       
-      self._now = datetime.datetime.utcnow()
-      if utcdelta:
-          self._utcdelta = utcdelta
+      if context:
+          self._now = context.now
+          self._utcdelta = utcdelta or context.utcdelta
+          self._month = month or context.month
+          self._year = year or context.year
       else:
-          self._utcdelta = datetime.datetime.now() - self._now
-
-      self._month = month
-      self._year = year
+          self._now = datetime.datetime.utcnow()
+          if utcdelta:
+              self._utcdelta = utcdelta
+          else:
+              self._utcdelta = datetime.datetime.now() - self._now
+          self._month = month
+          self._year = year
       
       code = self.code+" "    # (the regexps all expect trailing spaces...)
       try:
           ngroup = len(Metar.handlers)
           igroup = 0
           ifailed = -1
+          work = 0
           while igroup < ngroup and code: 
               pattern, handler, repeatable = Metar.handlers[igroup]
               if debug: print(handler.__name__,":",code)
               m = pattern.match(code)
+              work += 1
+              if work > budget.max_work:
+                  raise ParserBudgetError("Gave up after %d match attempts at '%s'" % (work, code))
               while m:
                   ifailed = -1
                   if debug: _report_match(handler,m.group())
@@ -387,6 +467,7 @@ class Metar(object):
                   m = pattern.match(code)
                   if debug: _report_match(handler,m.group())
                   handler(self,m.groupdict())
+                  self._unparsed_positions.append(len(self.code) + 1 - len(code))
                   code = code[m.end():]
                   igroup = ifailed
                   ifailed = -2  # if it's still -2 when we run out of main-body
@@ -396,16 +477,22 @@ class Metar(object):
                   for pattern, handler in Metar.remark_handlers:
                       if debug: print(handler.__name__,":",code)
                       m = pattern.match(code)
+                      work += 1
                       if m:
                           if debug: _report_match(handler,m.group())
                           handler(self,m.groupdict())
-                          code = pattern.sub("",code,1)
+                          code = code[m.end():]
                           break
+                  # Also ends a remainder no pattern matches, which looped forever
+                  if work > budget.max_work or not m:
+                      raise ParserBudgetError("Gave up after %d match attempts at '%s'" % (work, code))
 
+      except ParserBudgetError:
+          raise
       except Exception as err:
           raise ParserError(handler.__name__+" failed while processing '"+code+"'\n"+" ".join(err.args))
           raise err
-      if self._unparsed_groups:
+      if self._unparsed_groups and strict:
           code = ' '.join(self._unparsed_groups)
           raise ParserError("Unparsed groups in body '"+code+"' while processing '"+metarcode+"'")
 
@@ -932,6 +1019,7 @@ class Metar(object):
   
   ## functions that return text representations of conditions for output
 
+  @_rendered
   def string( self ):
       """
       Return a human-readable version of the decoded report.
@@ -1007,6 +1095,7 @@ class Metar(object):
               text += " (%s)" % self.mod
       return text
 
+  @_rendered
   def wind( self, units="KT" ):
       """
       Return a textual description of the wind conditions.
@@ -1061,6 +1150,7 @@ class Metar(object):
       else:
           return self.wind_shift_time.strftime('%H:%M')
 
+  @_rendered
   def visibility( self, units=None ):
       """
       Return a textual description of the visibility.
@@ -1152,6 +1242,7 @@ class Metar(object):
               text_list.append(" ".join(text_parts))
       return "; ".join(text_list)
   
+  @_rendered
   def sky_conditions( self, sep="; " ):
       """
       Return a textual description of the sky conditions.
@@ -1188,3 +1279,248 @@ class Metar(object):
       """
       return sep.join(self._remarks)
 
+  def unparsed( self ):
+      """
+      Return [(position, group), ...] of the main-body groups not understood,
+      positions being offsets into the code.
+      """
+      return zip(self._unparsed_positions, self._unparsed_groups)
+
+  def to_record( self ):
+      """
+      Return the decoded report as a flat tuple of numbers and strings,
+      values in canonical units (see RECORD_FIELDS), for storage.
+      """
+      record = [RECORD_VERSION]
+      for name, encode, decode in _record_codecs:
+          value = getattr(self, name)
+          record.append(value if value is None or encode is None else encode(value))
+      return tuple(record)
+
+  @classmethod
+  def from_record( cls, record ):
+      """
+      Return the Metar of a record of to_record(), without parsing it again.
+      Dimensioned values are only decoded when first asked for.
+      """
+      if record[0] != RECORD_VERSION:
+          raise ValueError("METAR record version %r, expected %d" % (record[0], RECORD_VERSION))
+      report = cls.__new__(cls)
+      fields = {"_record": record, "_now": None, "_utcdelta": None, "_rendered": {}}
+      for no, name, decode in _record_eager:
+          value = record[no]
+          fields[name] = value if value is None or decode is None else decode(value)
+      time = fields["time"]
+      fields["_month"] = time and time.month
+      fields["_year"] = time and time.year
+      report.__dict__ = fields
+      return report
+
+  def __getattr__( self, name ):
+      # Only reached for attributes not set yet, i.e. fields of a record not decoded so far
+      if name not in _record_lazy or "_record" not in self.__dict__:
+          raise AttributeError(name)
+      no, decode = _record_lazy[name]
+      value = self._record[no]
+      if value is not None:
+          value = decode(value)
+      setattr(self, name, value)
+      return value
+
+  def to_json( self ):
+      """Return the record as a JSON object keyed by field name, for tooling."""
+      import json
+      fields = dict(zip(_record_names, self.to_record()[1:]))
+      fields["version"] = RECORD_VERSION
+      return json.dumps(fields, sort_keys=True)
+
+  @classmethod
+  def from_json( cls, text ):
+      import json
+      fields = json.loads(text)
+      # json returns unicode, the parser only ever produces plain strings
+      def plain( value ):
+          if isinstance(value, unicode):
+              return value.encode("utf-8")
+          if isinstance(value, list):
+              return [plain(item) for item in value]
+          return value
+      return cls.from_record([fields["version"]] + [plain(fields.get(name)) for name in _record_names])
+
+  def to_binary( self ):
+      """Return the record packed with marshal, the fastest form to load."""
+      return marshal.dumps(self.to_record())
+
+  @classmethod
+  def from_binary( cls, packed ):
+      return cls.from_record(marshal.loads(packed))
+
+## compact records of decoded reports
+##
+## A record is (RECORD_VERSION, value, ...) with the values in the order of
+## RECORD_FIELDS.  Dimensioned values are stored by their class in one unit
+## (temperatures in C, pressures in MB, speeds in KT, distances in M,
+## precipitation in IN, directions in degrees) along with the unit reported,
+## so the decoded report renders the same.  Times are (y, m, d, H, M, S).
+
+RECORD_VERSION = 2
+
+RECORD_FIELDS = (
+  ("code", None), ("type", None), ("mod", None), ("station_id", None),
+  ("time", "time"), ("cycle", None),
+  ("wind_dir", direction), ("wind_speed", speed), ("wind_gust", speed),
+  ("wind_dir_from", direction), ("wind_dir_to", direction),
+  ("vis", distance), ("vis_dir", direction), ("max_vis", distance), ("max_vis_dir", direction),
+  ("temp", temperature), ("dewpt", temperature), ("press", pressure),
+  ("runway", "runway"), ("weather", "tuples"), ("recent", "tuples"), ("sky", "sky"),
+  ("windshear", "list"),
+  ("wind_speed_peak", speed), ("wind_dir_peak", direction),
+  ("peak_wind_time", "time"), ("wind_shift_time", "time"),
+  ("max_temp_6hr", temperature), ("min_temp_6hr", temperature),
+  ("max_temp_24hr", temperature), ("min_temp_24hr", temperature),
+  ("press_sea_level", pressure),
+  ("precip_1hr", precipitation), ("precip_3hr", precipitation),
+  ("precip_6hr", precipitation), ("precip_24hr", precipitation),
+  ("_trend", None), ("_trend_groups", "list"), ("_remarks", "list"),
+  ("_unparsed_groups", "list"), ("_unparsed_positions", "list"), ("_unparsed_remarks", "list"),
+)
+
+def _encode_runway( runway ):
+  # A single range is one object as low and high, stored once
+  return [(name, low.to_record(), None if high is low else high.to_record())
+          for name, low, high in runway]
+
+def _decode_runway( runway ):
+  decoded = []
+  for name, low, high in runway:
+    low = distance.from_record(low)
+    decoded.append((name, low, low if high is None else distance.from_record(high)))
+  return decoded
+
+def _encode_sky( sky ):
+  return [(cover, height and height.to_record(), cloud) for cover, height, cloud in sky]
+
+def _decode_sky( sky ):
+  return [(cover, height and distance.from_record(height), cloud) for cover, height, cloud in sky]
+
+_record_kinds = {
+  "time": (lambda value: value.timetuple()[:6], lambda value: datetime.datetime(*value)),
+  "list": (list, list),
+  "tuples": (lambda items: [tuple(item) for item in items], lambda items: [tuple(item) for item in items]),
+  "runway": (_encode_runway, _decode_runway),
+  "sky": (_encode_sky, _decode_sky),
+}
+
+def _record_codec( kind ):
+  if kind is None:
+    return None, None
+  if kind in _record_kinds:
+    return _record_kinds[kind]
+  return kind.to_record, kind.from_record
+
+_record_codecs = [(name,) + _record_codec(kind) for name, kind in RECORD_FIELDS]
+_record_names = [name for name, kind in RECORD_FIELDS]
+# Strings, lists of strings and times are set at once, dimensioned values on first use
+_record_eager = [(no + 1, name, _record_codecs[no][2]) for no, (name, kind) in enumerate(RECORD_FIELDS)
+                 if kind is None or kind in ("time", "list", "tuples")]
+_record_lazy = dict((name, (no + 1, _record_codecs[no][2])) for no, (name, kind) in enumerate(RECORD_FIELDS)
+                    if not (kind is None or kind in ("time", "list", "tuples")))
+
+## fixed reference time for batches of reports
+
+class parse_context(object):
+  """
+  The clock a batch of reports is dated against.  A report only names the
+  day of its observation, the month and year are those of the reference
+  time `now` (UTC) or the last month before it, unless given.  Reports
+  parsed with one context read no clock and are dated consistently, which
+  also dates an archive right when `now` is the time it was recorded.
+  """
+
+  def __init__( self, now=None, month=None, year=None, utcdelta=None ):
+    utcnow = datetime.datetime.utcnow()
+    self.now = now or utcnow
+    self.month = month
+    self.year = year
+    self.utcdelta = utcdelta or datetime.datetime.now() - utcnow
+
+  def key( self, month=None, year=None ):
+    """Return what reports parsed with this context are dated by, for caching."""
+    month = month or self.month
+    year = year or self.year
+    # The reference time only matters while month or year are unknown
+    return (month, year, None if month and year else self.now.date())
+
+## memoized parsing
+
+class parse_cache(object):
+  """
+  Parsed reports by their normalized code, the least recently used dropped
+  once `size` are kept.  A cached report is shared by every caller asking
+  for the same code, so it must not be modified.
+  """
+
+  def __init__( self, size=1000 ):
+    self.size = size
+    self.hits = 0
+    self.misses = 0
+    self._reports = OrderedDict()
+    self._lock = threading.Lock()
+
+  def parse( self, metarcode, month=None, year=None, utcdelta=None, context=None, strict=True ):
+    """Return the parsed report, running the parser only for a new code."""
+    if context:
+      key = (" ".join(metarcode.split()), strict, context.key(month, year))
+    else:
+      key = (" ".join(metarcode.split()), strict, month, year, utcdelta)
+      if not (month and year):
+        # Dated against today, the same code means another date after midnight
+        key += (datetime.datetime.utcnow().date(),)
+    with self._lock:
+      report = self._reports.pop(key, None)
+      if report is not None:
+        self._reports[key] = report
+        self.hits += 1
+        return report
+      self.misses += 1
+    report = Metar(metarcode, month, year, utcdelta, context, strict=strict)
+    with self._lock:
+      self._reports[key] = report
+      while len(self._reports) > self.size:
+        self._reports.popitem(last=False)
+    return report
+
+  def clear( self ):
+    with self._lock:
+      self._reports.clear()
+
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+def enable_parse_cache( size=1000 ):
+  """
+  Memoize parse() from now on with a cache of `size` reports, unless it
+  already is; return the cache, for its hit and miss counts.
+  """
+  global _parse_cache
+  if _parse_cache is None:
+    with _parse_cache_lock:
+      if _parse_cache is None:
+        _parse_cache = parse_cache(size)
+  return _parse_cache
+
+def disable_parse_cache():
+  """Parse every report again from now on."""
+  global _parse_cache
+  with _parse_cache_lock:
+    _parse_cache = None
+
+def get_parse_cache():
+  """Return the cache parse() memoizes with, or None."""
+  return _parse_cache
+
+def parse( metarcode, month=None, year=None, utcdelta=None, context=None, strict=True ):
+  """Return the Metar of a report, from the parse cache if it is enabled."""
+  if _parse_cache is None:
+    return Metar(metarcode, month, year, utcdelta, context, strict=strict)
+  return _parse_cache.parse(metarcode, month, year, utcdelta, context, strict)
@@ -4,8 +4,9 @@
 #
 #  Copyright 2004  Tom Pollard
 # 
+import os
 from math import sin, cos, atan2, sqrt
-from datatypes import position, distance, direction
+from metar.Datatypes import position, distance, direction
 
 class station:
   """An object representing a weather station."""
@@ -21,18 +22,26 @@ class station:
     else:
       self.name = self.city
     
-station_file_name = "nsd_cccc.txt"
+station_file_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nsd_cccc.txt")
 station_file_url = "http://www.noaa.gov/nsd_cccc.txt"
 
 stations = {}
 
-fh = open(station_file_name,'r')
-for line in fh:
-  f = line.strip().split(";")
-  stations[f[0]] = station(f[0],f[3],f[4],f[5],f[7],f[8])
-fh.close()
+def load_stations( file_name=None ):
+  """Read the station file into the stations dictionary on first use."""
+  if not stations:
+    loaded = {}
+    fh = open(file_name or station_file_name,'r')
+    for line in fh:
+      f = line.strip().split(";")
+      if len(f) > 8:
+        loaded[f[0]] = station(f[0],f[3],f[4],f[5],f[7],f[8])
+    fh.close()
+    stations.update(loaded)
+  return stations
 
 if __name__ == "__main__":
+  load_stations()
   for id in [ 'KEWR', 'KIAD', 'KIWI', 'EKRK' ]:
     print(id, stations[id].name, stations[id].country)
 
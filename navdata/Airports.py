@@ -0,0 +1,61 @@
+#
+#  Airport header records from the GNS430 airports.txt file
+#
+"""
+airports.txt holds one "A," header line per airport, followed by its "R,"
+runway lines:
+
+    A,LSZH,ZURICH,47.458056,8.548056,1416,...
+    R,16,155,12139,197,1,110.500,155,...
+"""
+
+import heapq
+from collections import namedtuple
+
+from navdata.Geo import distance_nm, bearing, angle_off
+
+AirportRecord = namedtuple("AirportRecord", "icao name lat lon")
+
+def read_airports(airports_file_path):
+	"""Return an AirportRecord for every header line of airports.txt."""
+	airports = []
+	with open(airports_file_path, 'r') as f:
+		for line in f:
+			if not line.startswith("A,"):
+				continue
+			fields = line.rstrip('\r\n').split(',')
+			try:
+				airports.append(AirportRecord(fields[1], fields[2], float(fields[3]), float(fields[4])))
+			except (IndexError, ValueError):
+				continue
+	return airports
+
+def airports_ahead(airports, lat, lon, track, count, max_distance, half_angle):
+	"""
+	Return the ICAO codes of the `count` nearest airports within
+	`max_distance` nm and `half_angle` degrees either side of `track`.
+	"""
+	# Latitude alone rules out most airports before any trigonometry
+	max_dlat = max_distance / 60.0
+	candidates = []
+	for airport in airports:
+		if abs(airport.lat - lat) > max_dlat:
+			continue
+		dist = distance_nm(lat, lon, airport.lat, airport.lon)
+		if dist > max_distance:
+			continue
+		if angle_off(bearing(lat, lon, airport.lat, airport.lon), track) <= half_angle:
+			candidates.append((dist, airport.icao))
+	return [icao for dist, icao in heapq.nsmallest(count, candidates)]
+
+def iter_runways(airports_file_path):
+	"""Yield (icao, id, hdg, length, ils, ilscrs) for every runway line of airports.txt."""
+	icao = None
+	with open(airports_file_path, 'r') as f:
+		for line in f:
+			if line.startswith("A,"):
+				icao = line.split(',', 2)[1]
+			elif line.startswith("R,") and icao:
+				fields = line.rstrip('\r\n').split(',')
+				if len(fields) > 7:
+					yield icao, fields[1], fields[2], fields[3], fields[6], fields[7]
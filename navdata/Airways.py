@@ -0,0 +1,293 @@
+#
+#  Airway graph from earth_awy.dat with an A* route search
+#
+"""
+earth_awy.dat lists one airway segment per line.  The 810 format carries the
+coordinates of both ends:
+
+    ABBOT 47.1 8.2 BELUS 47.5 8.9 1 180 450 UN850-UL613
+
+The 1100 format names the ends by ident, ICAO region and navaid type (11 fix,
+2 NDB, 3 VOR) plus a direction flag (N both ways, F forward, B backward); the
+coordinates are looked up in earth_fix.dat and earth_nav.dat:
+
+    ABBOT LS 11 BELUS LS 11 N 1 180 450 UN850-UL613
+
+The graph keeps its nodes and edges in flat arrays (edges in compressed
+sparse row order) and is cached on disk per AIRAC cycle.
+"""
+
+import heapq
+from array import array
+from collections import namedtuple
+from math import radians, sin, cos, sqrt, floor
+
+from navdata import Cache
+from navdata.Fixes import iter_fixes
+from navdata.Geo import EARTH_RADIUS_NM, distance_nm
+from navdata.Navaids import iter_navaids, ROW_NDB, ROW_VOR
+
+TYPE_FIX = "11"
+DIRECT = "DCT"
+
+# Airway nodes an airport or free position is connected to by DCT: the
+# nearest few, and only those within ENTRY_DISTANCE nm unless none is
+ENTRY_NODES = 6
+ENTRY_DISTANCE = 50.0
+
+RouteLeg = namedtuple("RouteLeg", "ident airway lat lon")
+
+def read_segments(awy_file_path):
+	"""
+	Return the airway segments as (from_key, to_key, airway, direction) and the
+	coordinates known from the file itself (810 format only).
+	"""
+	segments = []
+	coords = {}
+	with open(awy_file_path, 'r') as f:
+		f.readline()
+		f.readline()
+		for line in f:
+			fields = line.split()
+			if len(fields) == 10:
+				try:
+					from_lat, from_lon = float(fields[1]), float(fields[2])
+					to_lat, to_lon = float(fields[4]), float(fields[5])
+				except ValueError:
+					continue
+				from_key = (fields[0], "%.5f" % from_lat, "%.5f" % from_lon)
+				to_key = (fields[3], "%.5f" % to_lat, "%.5f" % to_lon)
+				coords[from_key] = (from_lat, from_lon)
+				coords[to_key] = (to_lat, to_lon)
+				segments.append((from_key, to_key, fields[9], "N"))
+			elif len(fields) == 11:
+				from_key = (fields[0], fields[1], fields[2])
+				to_key = (fields[3], fields[4], fields[5])
+				segments.append((from_key, to_key, fields[10], fields[6]))
+	return segments, coords
+
+def resolve_coords(keys, coords, fix_file_path, nav_file_path):
+	"""Add the coordinates of the (ident, region, type) node keys not yet known."""
+	missing = set(key for key in keys if key not in coords)
+	if not missing:
+		return
+	for ident, region, lat, lon in iter_fixes(fix_file_path):
+		key = (ident, region, TYPE_FIX)
+		if key in missing:
+			coords[key] = (lat, lon)
+	for row, ident, region, lat, lon in iter_navaids(nav_file_path, (ROW_NDB, ROW_VOR)):
+		key = (ident, region, row)
+		if key in missing:
+			coords[key] = (lat, lon)
+
+def build_airway_graph(awy_file_path, fix_file_path, nav_file_path):
+	"""Parse the navdata files and return a new AirwayGraph."""
+	segments, coords = read_segments(awy_file_path)
+	keys = set()
+	for from_key, to_key, airway, direction in segments:
+		keys.add(from_key)
+		keys.add(to_key)
+	resolve_coords(keys, coords, fix_file_path, nav_file_path)
+
+	node_ids = {}
+	idents = []
+	lats = array('d')
+	lons = array('d')
+	for key in sorted(coords):
+		if key in keys:
+			node_ids[key] = len(idents)
+			idents.append(key[0])
+			lats.append(coords[key][0])
+			lons.append(coords[key][1])
+
+	airway_ids = {}
+	airways = []
+	edges = []
+	for from_key, to_key, airway, direction in segments:
+		if from_key not in node_ids or to_key not in node_ids:
+			continue
+		if airway not in airway_ids:
+			airway_ids[airway] = len(airways)
+			airways.append(airway)
+		from_id, to_id = node_ids[from_key], node_ids[to_key]
+		if direction != "B":
+			edges.append((from_id, to_id, airway_ids[airway]))
+		if direction != "F":
+			edges.append((to_id, from_id, airway_ids[airway]))
+	edges.sort()
+
+	offsets = array('i', [0] * (len(idents) + 1))
+	targets = array('i')
+	edge_airways = array('i')
+	lengths = array('f')
+	for from_id, to_id, airway_id in edges:
+		offsets[from_id + 1] += 1
+		targets.append(to_id)
+		edge_airways.append(airway_id)
+		lengths.append(distance_nm(lats[from_id], lons[from_id], lats[to_id], lons[to_id]))
+	for no in range(len(idents)):
+		offsets[no + 1] += offsets[no]
+
+	return AirwayGraph(idents, lats, lons, offsets, targets, edge_airways, lengths, airways)
+
+def load_airway_graph(awy_file_path, fix_file_path, nav_file_path, cycle=None, cache_path=None):
+	"""Return the AirwayGraph of the navdata files, from the cache when valid."""
+	key = Cache.source_key(cycle, awy_file_path, fix_file_path, nav_file_path)
+	if cache_path:
+		data = Cache.load(cache_path, key)
+		if data is not None:
+			return AirwayGraph.from_data(data)
+	graph = build_airway_graph(awy_file_path, fix_file_path, nav_file_path)
+	if cache_path:
+		Cache.save(cache_path, key, graph.to_data())
+	return graph
+
+def route_string(legs):
+	"""Return the legs as "<ident> <airway> <ident> ...", merging runs along one airway."""
+	parts = [str(legs[0].ident)]
+	names = None
+	for leg in legs[1:]:
+		# A segment can belong to several airways, "UN850-UL613"
+		leg_names = set(leg.airway.split("-"))
+		if names and names & leg_names:
+			names &= leg_names
+			parts[-1] = str(leg.ident)
+			continue
+		if names:
+			parts[-2] = sorted(names)[0]
+		names = leg_names
+		parts.extend([leg.airway, str(leg.ident)])
+	if names:
+		parts[-2] = sorted(names)[0]
+	return " ".join(parts)
+
+class AirwayGraph(object):
+	"""Airway nodes and directed segments in compact arrays."""
+
+	def __init__(self, idents, lats, lons, offsets, targets, edge_airways, lengths, airways):
+		self.idents = idents
+		self.lats = lats
+		self.lons = lons
+		self.offsets = offsets
+		self.targets = targets
+		self.edge_airways = edge_airways
+		self.lengths = lengths
+		self.airways = airways
+
+		# Unit vectors give a trig-free, admissible A* heuristic (chord <= arc)
+		self.xs, self.ys, self.zs = array('d'), array('d'), array('d')
+		for lat, lon in zip(lats, lons):
+			lat, lon = radians(lat), radians(lon)
+			self.xs.append(cos(lat) * cos(lon))
+			self.ys.append(cos(lat) * sin(lon))
+			self.zs.append(sin(lat))
+
+		# One degree cells for the nearest node lookups
+		self.cells = {}
+		for no, (lat, lon) in enumerate(zip(lats, lons)):
+			self.cells.setdefault((int(floor(lat)), int(floor(lon))), []).append(no)
+
+	def to_data(self):
+		return (self.idents, self.lats.tostring(), self.lons.tostring(),
+			self.offsets.tostring(), self.targets.tostring(),
+			self.edge_airways.tostring(), self.lengths.tostring(), self.airways)
+
+	@classmethod
+	def from_data(cls, data):
+		idents, lats, lons, offsets, targets, edge_airways, lengths, airways = data
+		arrays = []
+		for typecode, packed in (('d', lats), ('d', lons), ('i', offsets), ('i', targets), ('i', edge_airways), ('f', lengths)):
+			values = array(typecode)
+			values.fromstring(packed)
+			arrays.append(values)
+		return cls(idents, arrays[0], arrays[1], arrays[2], arrays[3], arrays[4], arrays[5], airways)
+
+	def entry_nodes(self, lat, lon):
+		"""Return the nodes a route from or to the position may join the airways at."""
+		nodes = self.nearest_nodes(lat, lon)
+		if not nodes:
+			return nodes
+		nearest = distance_nm(lat, lon, self.lats[nodes[0]], self.lons[nodes[0]])
+		max_distance = max(ENTRY_DISTANCE, nearest)
+		return [no for no in nodes if distance_nm(lat, lon, self.lats[no], self.lons[no]) <= max_distance]
+
+	def nearest_nodes(self, lat, lon, count=ENTRY_NODES, max_rings=5):
+		"""Return the ids of up to `count` nodes nearest to the position."""
+		cell_lat, cell_lon = int(floor(lat)), int(floor(lon))
+		candidates = []
+		for ring in range(max_rings + 1):
+			for dlat in range(-ring, ring + 1):
+				for dlon in range(-ring, ring + 1):
+					if max(abs(dlat), abs(dlon)) != ring:
+						continue
+					candidates.extend(self.cells.get((cell_lat + dlat, cell_lon + dlon), ()))
+			# One more ring after the first hits, a closer node may sit across a cell edge
+			if len(candidates) >= count and ring > 0:
+				break
+		candidates.sort(key=lambda no: distance_nm(lat, lon, self.lats[no], self.lons[no]))
+		return candidates[:count]
+
+	def find_route(self, from_lat, from_lon, to_lat, to_lon, from_nodes=None, to_nodes=None):
+		"""
+		Return the shortest airway route between two positions as a list of
+		RouteLeg, each with the airway it is reached by.  The first and last
+		legs are the two positions themselves (ident None), joined by DCT to
+		the nearest airway nodes.  Returns None if the airways do not connect.
+		"""
+		if from_nodes is None:
+			from_nodes = self.entry_nodes(from_lat, from_lon)
+		if to_nodes is None:
+			to_nodes = self.entry_nodes(to_lat, to_lon)
+		if not from_nodes or not to_nodes:
+			return None
+
+		lats, lons, xs, ys, zs = self.lats, self.lons, self.xs, self.ys, self.zs
+		offsets, targets, lengths = self.offsets, self.targets, self.lengths
+		goal = len(self.idents)
+		goal_lat, goal_lon = radians(to_lat), radians(to_lon)
+		goal_x = cos(goal_lat) * cos(goal_lon)
+		goal_y = cos(goal_lat) * sin(goal_lon)
+		goal_z = sin(goal_lat)
+		exit_costs = dict((no, distance_nm(lats[no], lons[no], to_lat, to_lon)) for no in to_nodes)
+
+		def heuristic(no):
+			return EARTH_RADIUS_NM * sqrt((xs[no] - goal_x) ** 2 + (ys[no] - goal_y) ** 2 + (zs[no] - goal_z) ** 2)
+
+		best = {}
+		heap = []
+		for no in from_nodes:
+			cost = distance_nm(from_lat, from_lon, lats[no], lons[no])
+			best[no] = cost
+			heapq.heappush(heap, (cost + heuristic(no), cost, no, -1, -1))
+
+		came_from = {}
+		while heap:
+			estimate, cost, no, previous, edge = heapq.heappop(heap)
+			if no in came_from:
+				continue
+			came_from[no] = (previous, edge)
+			if no == goal:
+				return self.legs(came_from, from_lat, from_lon, to_lat, to_lon)
+			if no in exit_costs:
+				heapq.heappush(heap, (cost + exit_costs[no], cost + exit_costs[no], goal, no, -1))
+			for edge in xrange(offsets[no], offsets[no + 1]):
+				target = targets[edge]
+				if target in came_from:
+					continue
+				target_cost = cost + lengths[edge]
+				if target_cost < best.get(target, 1e12):
+					best[target] = target_cost
+					heapq.heappush(heap, (target_cost + heuristic(target), target_cost, target, no, edge))
+		return None
+
+	def legs(self, came_from, from_lat, from_lon, to_lat, to_lon):
+		legs = [RouteLeg(None, DIRECT, to_lat, to_lon)]
+		no = came_from[len(self.idents)][0]
+		while no >= 0:
+			previous, edge = came_from[no]
+			airway = self.airways[self.edge_airways[edge]] if edge >= 0 else DIRECT
+			legs.append(RouteLeg(self.idents[no], airway, self.lats[no], self.lons[no]))
+			no = previous
+		legs.append(RouteLeg(None, None, from_lat, from_lon))
+		legs.reverse()
+		return legs
@@ -0,0 +1,56 @@
+#
+#  On-disk cache for indexes built from the navigation data files
+#
+"""
+A cache file holds a key followed by the cached data, both pickled.  The key
+is made of the AIRAC cycle and the name, size and modification time of every
+source file, so a navdata update or a hand-edited file invalidates it.
+"""
+
+import os
+import cPickle
+
+CACHE_VERSION = 1
+
+def airac_cycle(cycle_info_path):
+	"""Return the AIRAC cycle named in cycle_info.txt, or None."""
+	try:
+		with open(cycle_info_path, 'r') as f:
+			for line in f:
+				if line.upper().startswith("AIRAC CYCLE"):
+					return line.split(":", 1)[1].strip()
+	except (IOError, IndexError):
+		pass
+	return None
+
+def source_key(cycle, *paths):
+	"""Return the cache key for data built from the given files."""
+	files = []
+	for path in paths:
+		stat = os.stat(path)
+		files.append((os.path.basename(path), stat.st_size, int(stat.st_mtime)))
+	return (CACHE_VERSION, cycle, tuple(files))
+
+def load(cache_path, key):
+	"""Return the data cached under `key`, or None if missing or stale."""
+	try:
+		with open(cache_path, 'rb') as f:
+			if cPickle.load(f) != key:
+				return None
+			return cPickle.load(f)
+	except Exception:
+		# A cache that cannot be read is rebuilt, never an error
+		return None
+
+def save(cache_path, key, data):
+	"""Store `data` under `key`, replacing the cache file in one step."""
+	cache_dir = os.path.dirname(cache_path)
+	if cache_dir and not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir)
+	tmp_path = cache_path + ".tmp"
+	with open(tmp_path, 'wb') as f:
+		cPickle.dump(key, f, cPickle.HIGHEST_PROTOCOL)
+		cPickle.dump(data, f, cPickle.HIGHEST_PROTOCOL)
+	if os.path.exists(cache_path):
+		os.remove(cache_path)
+	os.rename(tmp_path, cache_path)
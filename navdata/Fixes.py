@@ -0,0 +1,121 @@
+#
+#  Waypoints from the X-Plane earth_fix.dat file and a name index over
+#  fixes and navaids
+#
+"""
+earth_fix.dat lists one fix per line.  The 810 format is "<lat> <lon> <ident>";
+the 1100 format appends the terminal area (airport or ENRT) and the ICAO
+region, so the same ident can be told apart between regions.
+
+Idents repeat worldwide, so the FixIndex keeps every candidate of a name in
+one slice of a packed coordinate array and picks the one nearest to a given
+position.
+"""
+
+from array import array
+from collections import namedtuple
+from math import cos, radians
+
+from navdata import Cache
+from navdata.Navaids import iter_navaids, ROW_NDB, ROW_VOR
+
+KIND_FIX = "F"
+KIND_NDB = "N"
+KIND_VOR = "V"
+
+FixRecord = namedtuple("FixRecord", "ident kind lat lon")
+
+def iter_fixes(fix_file_path):
+	"""Yield (ident, region, lat, lon) for every fix; region is None in 810 files."""
+	with open(fix_file_path, 'r') as f:
+		f.readline()
+		f.readline()
+		for line in f:
+			fields = line.split()
+			if len(fields) < 3:
+				continue
+			region = fields[4] if len(fields) > 4 else None
+			try:
+				yield fields[2], region, float(fields[0]), float(fields[1])
+			except ValueError:
+				continue
+
+def build_fix_index(fix_file_path, nav_file_path):
+	"""Read the fixes, NDBs and VORs and return a new FixIndex."""
+	points = []
+	for ident, region, lat, lon in iter_fixes(fix_file_path):
+		points.append((ident, KIND_FIX, lat, lon))
+	nav_kinds = {ROW_NDB: KIND_NDB, ROW_VOR: KIND_VOR}
+	for row, ident, region, lat, lon in iter_navaids(nav_file_path, (ROW_NDB, ROW_VOR)):
+		points.append((ident, nav_kinds[row], lat, lon))
+	points.sort()
+
+	slots = {}
+	kinds = []
+	coords = array('d')
+	for no, (ident, kind, lat, lon) in enumerate(points):
+		start, count = slots.get(ident, (no, 0))
+		slots[ident] = (start, count + 1)
+		kinds.append(kind)
+		coords.append(lat)
+		coords.append(lon)
+	return FixIndex(slots, "".join(kinds), coords)
+
+def load_fix_index(fix_file_path, nav_file_path, cycle=None, cache_path=None):
+	"""Return the FixIndex of the navdata files, from the cache when valid."""
+	key = Cache.source_key(cycle, fix_file_path, nav_file_path)
+	if cache_path:
+		data = Cache.load(cache_path, key)
+		if data is not None:
+			return FixIndex.from_data(data)
+	index = build_fix_index(fix_file_path, nav_file_path)
+	if cache_path:
+		Cache.save(cache_path, key, index.to_data())
+	return index
+
+class FixIndex(object):
+	"""Fixes and navaids by name; each name owns a slice of one packed array."""
+
+	def __init__(self, slots, kinds, coords):
+		self.slots = slots
+		self.kinds = kinds
+		self.coords = coords
+
+	def to_data(self):
+		return (self.slots, self.kinds, self.coords.tostring())
+
+	@classmethod
+	def from_data(cls, data):
+		slots, kinds, packed = data
+		coords = array('d')
+		coords.fromstring(packed)
+		return cls(slots, kinds, coords)
+
+	def __contains__(self, ident):
+		return ident in self.slots
+
+	def candidates(self, ident):
+		"""Return a FixRecord for every fix or navaid named `ident`."""
+		start, count = self.slots.get(ident, (0, 0))
+		coords = self.coords
+		return [FixRecord(ident, self.kinds[no], coords[2 * no], coords[2 * no + 1])
+			for no in xrange(start, start + count)]
+
+	def nearest(self, ident, lat, lon):
+		"""Return the FixRecord named `ident` nearest to the position, or None."""
+		slot = self.slots.get(ident)
+		if slot is None:
+			return None
+		start, count = slot
+		coords = self.coords
+		if count > 1:
+			# Ranking only, a flat-earth distance is good enough
+			scale = cos(radians(lat))
+			best = None
+			for no in xrange(start, start + count):
+				dlat = coords[2 * no] - lat
+				dlon = (coords[2 * no + 1] - lon + 180.0) % 360.0 - 180.0
+				dist = dlat * dlat + (dlon * scale) ** 2
+				if best is None or dist < best:
+					best, start = dist, no
+		return FixRecord(ident, self.kinds[start], coords[2 * start], coords[2 * start + 1])
@@ -0,0 +1,27 @@
+#
+#  Great-circle helpers shared by the navdata indexes
+#
+"""
+Distances are in nautical miles, courses in degrees true.
+"""
+
+from math import radians, degrees, sin, cos, asin, atan2, sqrt
+
+EARTH_RADIUS_NM = 3440.065
+
+def distance_nm(lat1, lon1, lat2, lon2):
+	"""Return the great-circle distance between two positions (Haversine)."""
+	lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+	a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+	return 2 * EARTH_RADIUS_NM * asin(sqrt(min(1.0, a)))
+
+def bearing(lat1, lon1, lat2, lon2):
+	"""Return the initial true course from the first to the second position."""
+	lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+	y = sin(lon2 - lon1) * cos(lat2)
+	x = cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(lon2 - lon1)
+	return degrees(atan2(y, x)) % 360.0
+
+def angle_off(course, track):
+	"""Return the absolute difference between two courses (0..180)."""
+	return abs((course - track + 180.0) % 360.0 - 180.0)
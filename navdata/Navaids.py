@@ -0,0 +1,108 @@
+#
+#  Navaids and the ILS / localizer index from the X-Plane earth_nav.dat file
+#
+"""
+earth_nav.dat lists one navaid per line, identified by its row code:
+
+    2   NDB                    3   VOR
+    4   ILS localizer          5   stand-alone localizer
+    6   glideslope             12  DME (ILS-DME when the name is "DME-ILS")
+
+In the 810 format the localizer and glideslope rows end with
+"<ident> <airport> <runway> <name>"; the 1100 format adds the ICAO region
+after the airport.  The index maps (airport, runway) to the frequency, course,
+glideslope angle and DME of the runway's ILS.
+"""
+
+from collections import namedtuple
+
+from navdata import Cache
+
+ROW_NDB = "2"
+ROW_VOR = "3"
+ROW_LOC = ("4", "5")
+ROW_GS = "6"
+ROW_DME = "12"
+
+IlsRecord = namedtuple("IlsRecord", "ident freq course gs_angle dme")
+
+def nav_file_version(first_lines):
+	"""Return the data format version (810, 1100, ...) from the file header."""
+	for line in first_lines:
+		fields = line.split()
+		if len(fields) > 1 and fields[0].isdigit() and fields[1] == "Version":
+			return int(fields[0])
+	return 810
+
+def build_ils_index(nav_file_path):
+	"""Stream earth_nav.dat once and return the (airport, runway) ILS index."""
+	index = {}
+	with open(nav_file_path, 'r') as f:
+		version = nav_file_version([f.readline(), f.readline()])
+		# 1100 inserts the region code between airport and runway
+		rwy_field = 10 if version >= 1100 else 9
+		for line in f:
+			fields = line.split()
+			if len(fields) <= rwy_field or fields[0] not in ("4", "5", "6", "12"):
+				continue
+			row = fields[0]
+			if row == ROW_DME and fields[-1] != "DME-ILS":
+				continue
+			key = (fields[8], fields[rwy_field])
+			entry = index.get(key)
+			if entry is None:
+				entry = index[key] = [None, None, None, None, False]
+			try:
+				if row in ROW_LOC:
+					entry[0] = fields[7]
+					entry[1] = "%.3f" % (int(fields[4]) / 100.0)
+					entry[2] = int(round(float(fields[6]))) % 360
+				elif row == ROW_GS:
+					# Angle and course are packed as angle * 100000 + course, e.g. 300155
+					packed = float(fields[6])
+					entry[3] = int(packed / 1000) / 100.0
+				else:
+					entry[4] = True
+			except ValueError:
+				continue
+	# Glideslopes or DMEs without a localizer are not an ILS
+	for key in [key for key, entry in index.items() if entry[1] is None]:
+		del index[key]
+	return index
+
+class IlsIndex(object):
+	"""The ILS index of an earth_nav.dat file, cached on disk per AIRAC cycle."""
+
+	def __init__(self, nav_file_path, cycle=None, cache_path=None):
+		self.index = None
+		key = Cache.source_key(cycle, nav_file_path)
+		if cache_path:
+			self.index = Cache.load(cache_path, key)
+		if self.index is None:
+			self.index = build_ils_index(nav_file_path)
+			if cache_path:
+				Cache.save(cache_path, key, self.index)
+
+	def ils(self, icao, runway):
+		"""Return the IlsRecord of the given runway, or None."""
+		entry = self.index.get((icao.upper(), runway))
+		if entry is None:
+			return None
+		return IlsRecord(*entry)
+
+def iter_navaids(nav_file_path, rows=(ROW_NDB, ROW_VOR)):
+	"""
+	Yield (row, ident, region, lat, lon) for the navaids of the given row
+	codes.  The region is None for files in the 810 format.
+	"""
+	with open(nav_file_path, 'r') as f:
+		version = nav_file_version([f.readline(), f.readline()])
+		for line in f:
+			fields = line.split()
+			if len(fields) < 9 or fields[0] not in rows:
+				continue
+			region = fields[9] if version >= 1100 and len(fields) > 9 else None
+			try:
+				yield fields[0], fields[7], region, float(fields[1]), float(fields[2])
+			except ValueError:
+				continue
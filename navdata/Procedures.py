@@ -0,0 +1,93 @@
+#
+#  SID / STAR / approach procedures from the GNS430 PROC/<ICAO>.txt files
+#
+"""
+Each procedure starts with a header line followed by its legs, and ends at a
+blank line:
+
+    SID,AMIK1Y,16,5
+    CF,D164B,47.375,8.600,...
+    ...
+
+    STAR,NEGRA1A,ALL,4
+    APPTR,I16,16,GIPOL
+    FINAL,I16,16,I,5
+
+Files are parsed only when an airport is first looked at, and kept in a
+small LRU keyed by ICAO and AIRAC cycle.
+"""
+
+import os
+import threading
+from collections import namedtuple, OrderedDict
+
+KIND_SID = "SID"
+KIND_STAR = "STAR"
+KIND_TRANSITION = "APPTR"
+KIND_APPROACH = "FINAL"
+KINDS = (KIND_SID, KIND_STAR, KIND_TRANSITION, KIND_APPROACH)
+
+ALL_RUNWAYS = "ALL"
+
+Procedure = namedtuple("Procedure", "kind name runway legs")
+
+def procedure_file_path(proc_dir, icao):
+	"""Return the path of the airport's procedure file, or None."""
+	for name in (icao.upper() + ".txt", icao.upper() + ".TXT"):
+		path = os.path.join(proc_dir, name)
+		if os.path.isfile(path):
+			return path
+	return None
+
+def read_procedures(proc_file_path):
+	"""Return the Procedures of one PROC file, legs as (leg type, fix) tuples."""
+	procedures = []
+	current = None
+	with open(proc_file_path, 'r') as f:
+		for line in f:
+			fields = line.strip().split(',')
+			if not fields[0]:
+				current = None
+				continue
+			if fields[0] in KINDS and len(fields) > 2:
+				runway = fields[2].upper()
+				if runway.startswith("RW"):
+					runway = runway[2:]
+				current = Procedure(fields[0], fields[1], runway, [])
+				procedures.append(current)
+			elif current is not None:
+				current.legs.append((fields[0], fields[1] if len(fields) > 1 else ""))
+	return procedures
+
+def procedures_for_runway(procedures, runway):
+	"""Return the procedures usable on `runway`; SIDs and STARs for ALL included."""
+	return [procedure for procedure in procedures
+		if procedure.runway == runway or
+			(procedure.runway == ALL_RUNWAYS and procedure.kind in (KIND_SID, KIND_STAR))]
+
+class ProcedureCache(object):
+	"""Parsed procedure files of the most recently shown airports."""
+
+	def __init__(self, size):
+		self.size = size
+		self.procedures = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, proc_dir, icao, cycle=None):
+		"""Return the Procedures of the airport, parsing its file on first use."""
+		key = (icao.upper(), cycle)
+		with self.lock:
+			if key in self.procedures:
+				procedures = self.procedures.pop(key)
+				self.procedures[key] = procedures
+				return procedures
+
+		# Parse outside the lock, another airport may be looked up meanwhile
+		path = procedure_file_path(proc_dir, icao)
+		procedures = read_procedures(path) if path else []
+
+		with self.lock:
+			self.procedures[key] = procedures
+			while len(self.procedures) > self.size:
+				self.procedures.popitem(last=False)
+		return procedures
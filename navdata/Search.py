@@ -0,0 +1,229 @@
+#
+#  Airport search indexes for the ICAO entry field and the command line
+#
+"""
+PrefixIndex answers "airports whose ICAO code or a word of whose name starts
+with ..." for every keystroke.  All keys live in one sorted list, so the
+matches of a prefix are the slice between two bisections: the lookup of a
+trie without a node object per character.  Short prefixes match thousands of
+airports; those are ranked by visiting one degree grid cells around the
+aircraft, nearest first, until enough matches are found.
+
+FuzzyIndex finds airports by name or city despite typos.  Every word is cut
+into trigrams ("ZURICH" -> " ZU", "ZUR", ..., "CH "), and an inverted index
+maps each trigram to the airports using it; candidates are ranked by how many
+of the trigrams of the query they share.
+
+Usage from the command line:
+
+    python -m navdata.Search [--fuzzy] <airports.txt> <text> [<lat> <lon>]
+"""
+
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from math import cos, radians, floor
+
+from navdata.Airports import AirportRecord
+
+# Above this many keys a prefix is ranked by walking the grid outwards from
+# the position instead of measuring every match
+GRID_SEARCH_KEYS = 500
+GRID_MAX_RINGS = 15
+
+# Share of the query trigrams a fuzzy match needs, one typo in a six
+# letter word still leaves half of them
+FUZZY_MIN_SHARED = 0.45
+
+NON_WORD = re.compile(r"[^A-Z0-9]+")
+
+def trigrams(text):
+	"""Return the set of trigrams of the words in `text`."""
+	grams = set()
+	for word in NON_WORD.sub(" ", text.upper()).split():
+		padded = " %s " % word
+		for no in range(len(padded) - 2):
+			grams.add(padded[no:no + 3])
+	return grams
+
+class PrefixIndex(object):
+	"""Sorted ICAO codes and name words of a list of AirportRecords."""
+
+	def __init__(self, airports):
+		self.airports = airports
+		entries = []
+		for no, airport in enumerate(airports):
+			icao = airport.icao.upper()
+			entries.append((icao, no))
+			for word in set(airport.name.upper().split()):
+				if word != icao:
+					entries.append((word, no))
+		entries.sort()
+		self.keys = [key for key, no in entries]
+		self.numbers = array('i', [no for key, no in entries])
+		self.lats = array('d', [airport.lat for airport in airports])
+		self.lons = array('d', [airport.lon for airport in airports])
+		self.words = [tuple(set([airport.icao.upper()] + airport.name.upper().split())) for airport in airports]
+		self.cells = {}
+		for no, airport in enumerate(airports):
+			self.cells.setdefault((int(floor(airport.lat)), int(floor(airport.lon))), []).append(no)
+
+	def to_data(self):
+		"""Return the index as plain tuples and strings that load quickly."""
+		return ([tuple(airport) for airport in self.airports], self.keys, self.numbers.tostring(),
+			self.lats.tostring(), self.lons.tostring(), self.words, self.cells)
+
+	@classmethod
+	def from_data(cls, data):
+		index = cls.__new__(cls)
+		rows, index.keys, numbers, lats, lons, index.words, index.cells = data
+		index.airports = map(AirportRecord._make, rows)
+		index.numbers, index.lats, index.lons = array('i'), array('d'), array('d')
+		index.numbers.fromstring(numbers)
+		index.lats.fromstring(lats)
+		index.lons.fromstring(lons)
+		return index
+
+	def matches(self, prefix):
+		"""Return the numbers of the airports matching `prefix`."""
+		words = prefix.upper().split()
+		if not words:
+			return set()
+		start = bisect_left(self.keys, words[0])
+		end = bisect_left(self.keys, words[0] + "\xff", start)
+		found = set(self.numbers[start:end])
+		# Further words must start a word of the name as well
+		for word in words[1:]:
+			found = set(no for no in found
+				if any(name_word.startswith(word) for name_word in self.airports[no].name.upper().split()))
+		return found
+
+	def complete(self, prefix, lat=None, lon=None, count=5):
+		"""
+		Return up to `count` AirportRecords matching `prefix`: an exact ICAO
+		match first, then the nearest to the position if one is given.
+		"""
+		words = prefix.upper().split()
+		if len(words) == 1 and lat is not None and lon is not None:
+			start = bisect_left(self.keys, words[0])
+			if bisect_left(self.keys, words[0] + "\xff", start) - start > GRID_SEARCH_KEYS:
+				ranked = self.complete_nearby(words[0], lat, lon, count)
+				if ranked is not None:
+					return ranked
+
+		found = self.matches(prefix)
+		if not found:
+			return []
+		icao = prefix.strip().upper()
+		lats, lons, airports = self.lats, self.lons, self.airports
+		if lat is None or lon is None:
+			ranked = heapq.nsmallest(count, found, key=lambda no: (airports[no].icao != icao, airports[no].icao))
+		else:
+			# Ranking only, a flat-earth distance is good enough
+			scale = cos(radians(lat))
+			def rank(no):
+				dlon = ((lons[no] - lon + 180.0) % 360.0 - 180.0) * scale
+				return (airports[no].icao != icao, (lats[no] - lat) ** 2 + dlon * dlon)
+			ranked = heapq.nsmallest(count, found, key=rank)
+		return [airports[no] for no in ranked]
+
+	def complete_nearby(self, word, lat, lon, count):
+		"""
+		Return the `count` matches of `word` nearest to the position, or None
+		if the grid rings around it do not settle them.
+		"""
+		cell_lat, cell_lon = int(floor(lat)), int(floor(lon))
+		scale = cos(radians(lat))
+		# Anything beyond `ring` rings is more than `ring` degrees of latitude
+		# or of longitude away, the latter shrunk by the scale
+		ring_scale = min(1.0, scale) ** 2
+		found = []
+		for ring in range(GRID_MAX_RINGS + 1):
+			for dlat in range(-ring, ring + 1):
+				for dlon in range(-ring, ring + 1):
+					if max(abs(dlat), abs(dlon)) != ring:
+						continue
+					cell = (cell_lat + dlat, (cell_lon + dlon + 180) % 360 - 180)
+					for no in self.cells.get(cell, ()):
+						for name_word in self.words[no]:
+							if name_word.startswith(word):
+								dlon_deg = ((self.lons[no] - lon + 180.0) % 360.0 - 180.0) * scale
+								found.append(((self.lats[no] - lat) ** 2 + dlon_deg ** 2, no))
+								break
+			if len(found) >= count:
+				nearest = heapq.nsmallest(count, found)
+				if nearest[-1][0] <= ring * ring * ring_scale:
+					return [self.airports[no] for dist, no in nearest]
+		return None
+
+class FuzzyIndex(object):
+	"""Trigram index over airport names and, if given, their station cities."""
+
+	def __init__(self, airports, stations=None):
+		self.airports = airports
+		postings = {}
+		sizes = []
+		for no, airport in enumerate(airports):
+			text = airport.name
+			station = stations.get(airport.icao) if stations else None
+			if station:
+				text = " ".join([text] + [field for field in (station.city, station.state, station.country) if field])
+			grams = trigrams(text)
+			sizes.append(len(grams))
+			for gram in grams:
+				postings.setdefault(gram, []).append(no)
+		self.postings = dict((gram, array('i', numbers)) for gram, numbers in postings.items())
+		self.sizes = array('i', sizes)
+
+	def to_data(self):
+		"""Return the index without its airports, which a PrefixIndex already holds."""
+		return (dict((gram, numbers.tostring()) for gram, numbers in self.postings.iteritems()), self.sizes.tostring())
+
+	@classmethod
+	def from_data(cls, data, airports):
+		index = cls.__new__(cls)
+		postings, sizes = data
+		index.airports = airports
+		index.postings = {}
+		for gram, packed in postings.iteritems():
+			numbers = array('i')
+			numbers.fromstring(packed)
+			index.postings[gram] = numbers
+		index.sizes = array('i')
+		index.sizes.fromstring(sizes)
+		return index
+
+	def search(self, text, count=5):
+		"""
+		Return up to `count` AirportRecords whose name or city resembles
+		`text`, the most shared trigrams first and shorter texts before longer.
+		"""
+		grams = trigrams(text)
+		if not grams:
+			return []
+		shared = {}
+		for gram in grams:
+			for no in self.postings.get(gram, ()):
+				shared[no] = shared.get(no, 0) + 1
+		needed = max(1, int(len(grams) * FUZZY_MIN_SHARED + 0.5))
+		sizes = self.sizes
+		ranked = heapq.nlargest(count, [no for no, hits in shared.items() if hits >= needed],
+			key=lambda no: (shared[no], -sizes[no]))
+		return [self.airports[no] for no in ranked]
+
+if __name__ == "__main__":
+	import sys
+	from navdata.Airports import read_airports
+	fuzzy = sys.argv[1] == "--fuzzy"
+	if fuzzy:
+		del sys.argv[1]
+	airports = read_airports(sys.argv[1])
+	if fuzzy:
+		from metar.Station import load_stations
+		found = FuzzyIndex(airports, load_stations()).search(sys.argv[2], 10)
+	else:
+		position = [float(value) for value in sys.argv[3:5]] or [None, None]
+		found = PrefixIndex(airports).complete(sys.argv[2], position[0], position[1], 10)
+	for airport in found:
+		print("%s  %s" % (airport.icao, airport.name))
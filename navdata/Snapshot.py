@@ -0,0 +1,51 @@
+#
+#  Warm start snapshots of indexes built during a session
+#
+"""
+A snapshot is written when X-Plane shuts down and read at the next start.  It
+holds only tuples, lists, dicts, numbers and strings, so it is stored with
+marshal, which loads them several times faster than pickle.  The marshal
+format may change between Python versions, so the version is stored with the
+key and a snapshot of another interpreter is ignored.
+"""
+
+import gc
+import marshal
+import os
+import sys
+
+def header(key):
+	return (tuple(sys.version_info[:2]), key)
+
+def load(snapshot_path, key):
+	"""Return the data stored under `key`, or None if missing or stale."""
+	try:
+		with open(snapshot_path, 'rb') as f:
+			packed = f.read()
+	except IOError:
+		return None
+	# Nothing loaded here is garbage, collecting while it is built only costs time
+	was_enabled = gc.isenabled()
+	gc.disable()
+	try:
+		stored_key, data = marshal.loads(packed)
+	except Exception:
+		return None
+	finally:
+		if was_enabled:
+			gc.enable()
+	if stored_key != header(key):
+		return None
+	return data
+
+def save(snapshot_path, key, data):
+	"""Store `data` under `key`, replacing the snapshot file in one step."""
+	snapshot_dir = os.path.dirname(snapshot_path)
+	if snapshot_dir and not os.path.isdir(snapshot_dir):
+		os.makedirs(snapshot_dir)
+	tmp_path = snapshot_path + ".tmp"
+	with open(tmp_path, 'wb') as f:
+		f.write(marshal.dumps((header(key), data)))
+	if os.path.exists(snapshot_path):
+		os.remove(snapshot_path)
+	os.rename(tmp_path, snapshot_path)
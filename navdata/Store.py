@@ -0,0 +1,210 @@
+#
+#  SQLite store of the navigation data with a spatial index
+#
+"""
+The store imports airports.txt, earth_nav.dat and earth_fix.dat once into a
+local SQLite file.  Airports and points (fixes, NDBs, VORs) get an R*Tree
+index on their coordinates; where SQLite was built without the R*Tree module
+the coordinates fall back to a plain index on latitude.  The file is rebuilt
+when the AIRAC cycle in cycle_info.txt or any source file changes.
+
+Usage from the command line:
+
+    python -m navdata.Store <store.db> <airports.txt> <earth_nav.dat> <earth_fix.dat> <cycle_info.txt> [ICAO]
+"""
+
+import os
+import sqlite3
+import threading
+from math import cos, radians
+
+from navdata import Cache
+from navdata.Airports import AirportRecord, read_airports, iter_runways
+from navdata.Fixes import FixRecord, iter_fixes, KIND_FIX, KIND_NDB, KIND_VOR
+from navdata.Geo import distance_nm
+from navdata.Navaids import IlsRecord, build_ils_index, iter_navaids, ROW_NDB, ROW_VOR
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE airports (id INTEGER PRIMARY KEY, icao TEXT, name TEXT, lat REAL, lon REAL);
+CREATE TABLE runways (icao TEXT, id TEXT, hdg TEXT, length TEXT, ils TEXT, ilscrs TEXT);
+CREATE TABLE ils (icao TEXT, runway TEXT, ident TEXT, freq TEXT, course INTEGER, gs_angle REAL, dme INTEGER);
+CREATE TABLE points (id INTEGER PRIMARY KEY, ident TEXT, kind TEXT, region TEXT, lat REAL, lon REAL);
+"""
+
+INDEXES = """
+CREATE INDEX airports_icao ON airports (icao);
+CREATE INDEX runways_icao ON runways (icao);
+CREATE INDEX ils_icao ON ils (icao, runway);
+CREATE INDEX points_ident ON points (ident);
+"""
+
+# Used when SQLite has no R*Tree module
+PLAIN_INDEXES = """
+CREATE INDEX airports_lat ON airports (lat);
+CREATE INDEX points_lat ON points (lat);
+"""
+
+def has_rtree(connection):
+	"""Return True if the SQLite library was built with the R*Tree module."""
+	try:
+		connection.execute("CREATE VIRTUAL TABLE temp.rtree_probe USING rtree (id, a, b)")
+		connection.execute("DROP TABLE temp.rtree_probe")
+		return True
+	except sqlite3.OperationalError:
+		return False
+
+def build_store(db_path, airports_file_path, nav_file_path, fix_file_path, source_key, rtree=True):
+	"""
+	Import the navdata files into a new SQLite file at `db_path`, with the
+	plain latitude index if `rtree` is False or SQLite has no R*Tree module.
+	"""
+	tmp_path = db_path + ".tmp"
+	if os.path.exists(tmp_path):
+		os.remove(tmp_path)
+	connection = sqlite3.connect(tmp_path)
+	connection.text_factory = str
+	connection.execute("PRAGMA journal_mode = OFF")
+	connection.execute("PRAGMA synchronous = OFF")
+	connection.executescript(SCHEMA)
+	rtree = rtree and has_rtree(connection)
+
+	with connection:
+		connection.executemany("INSERT INTO airports (icao, name, lat, lon) VALUES (?, ?, ?, ?)",
+			read_airports(airports_file_path))
+		connection.executemany("INSERT INTO runways VALUES (?, ?, ?, ?, ?, ?)",
+			iter_runways(airports_file_path))
+		connection.executemany("INSERT INTO ils VALUES (?, ?, ?, ?, ?, ?, ?)",
+			(key + tuple(entry) for key, entry in build_ils_index(nav_file_path).iteritems()))
+		connection.executemany("INSERT INTO points (ident, kind, region, lat, lon) VALUES (?, ?, ?, ?, ?)",
+			((ident, KIND_FIX, region, lat, lon) for ident, region, lat, lon in iter_fixes(fix_file_path)))
+		nav_kinds = {ROW_NDB: KIND_NDB, ROW_VOR: KIND_VOR}
+		connection.executemany("INSERT INTO points (ident, kind, region, lat, lon) VALUES (?, ?, ?, ?, ?)",
+			((ident, nav_kinds[row], region, lat, lon) for row, ident, region, lat, lon in iter_navaids(nav_file_path)))
+		connection.executescript(INDEXES)
+		if rtree:
+			for table in ("airports", "points"):
+				connection.execute("CREATE VIRTUAL TABLE %s_rtree USING rtree (id, min_lat, max_lat, min_lon, max_lon)" % table)
+				connection.execute("INSERT INTO %s_rtree SELECT id, lat, lat, lon, lon FROM %s" % (table, table))
+		else:
+			connection.executescript(PLAIN_INDEXES)
+		connection.execute("INSERT INTO meta VALUES ('source', ?)", (repr(source_key),))
+		connection.execute("INSERT INTO meta VALUES ('rtree', ?)", (str(int(rtree)),))
+	connection.close()
+
+	if os.path.exists(db_path):
+		os.remove(db_path)
+	os.rename(tmp_path, db_path)
+
+def open_store(db_path, airports_file_path, nav_file_path, fix_file_path, cycle_info_path, rtree=True):
+	"""Return a NavStore for the navdata files, building or rebuilding the file as needed."""
+	source_key = Cache.source_key(Cache.airac_cycle(cycle_info_path),
+		airports_file_path, nav_file_path, fix_file_path)
+	store = None
+	if os.path.isfile(db_path):
+		store = NavStore(db_path)
+		if store.meta("source") != repr(source_key):
+			store.close()
+			store = None
+	if store is None:
+		db_dir = os.path.dirname(db_path)
+		if db_dir and not os.path.isdir(db_dir):
+			os.makedirs(db_dir)
+		build_store(db_path, airports_file_path, nav_file_path, fix_file_path, source_key, rtree)
+		store = NavStore(db_path)
+	return store
+
+class NavStore(object):
+	"""Read-only queries against a navdata SQLite file; safe to share between threads."""
+
+	def __init__(self, db_path):
+		self.connection = sqlite3.connect(db_path, check_same_thread=False)
+		self.connection.text_factory = str
+		self.lock = threading.Lock()
+		self.rtree = self.meta("rtree") == "1"
+
+	def close(self):
+		self.connection.close()
+
+	def query(self, sql, args=()):
+		with self.lock:
+			return self.connection.execute(sql, args).fetchall()
+
+	def meta(self, key):
+		try:
+			rows = self.query("SELECT value FROM meta WHERE key = ?", (key,))
+		except sqlite3.DatabaseError:
+			return None
+		return rows[0][0] if rows else None
+
+	def airport(self, icao):
+		"""Return the AirportRecord of `icao`, or None."""
+		rows = self.query("SELECT icao, name, lat, lon FROM airports WHERE icao = ?", (icao.upper(),))
+		return AirportRecord(*rows[0]) if rows else None
+
+	def runways(self, icao):
+		"""Return (id, hdg, length, ils, ilscrs) for the runways of `icao`."""
+		return self.query("SELECT id, hdg, length, ils, ilscrs FROM runways WHERE icao = ?", (icao.upper(),))
+
+	def ils(self, icao, runway):
+		"""Return the IlsRecord of the runway, or None."""
+		rows = self.query("SELECT ident, freq, course, gs_angle, dme FROM ils WHERE icao = ? AND runway = ?",
+			(icao.upper(), runway))
+		if not rows:
+			return None
+		ident, freq, course, gs_angle, dme = rows[0]
+		return IlsRecord(ident, freq, course, gs_angle, bool(dme))
+
+	def within(self, table, lat, lon, radius):
+		"""Return the rows of `table` inside the bounding box of the radius (nm)."""
+		dlat = radius / 60.0
+		dlon = radius / (60.0 * max(0.01, cos(radians(lat))))
+		if abs(lon) + dlon > 180.0:
+			# Boxes across the date line are not split, they span all longitudes
+			dlon = 360.0
+		columns = {"airports": "t.icao, t.name, t.lat, t.lon", "points": "t.ident, t.kind, t.lat, t.lon"}[table]
+		if self.rtree:
+			sql = ("SELECT %s FROM %s_rtree r JOIN %s t ON t.id = r.id "
+				"WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?" % (columns, table, table))
+			args = (lat + dlat, lat - dlat, lon + dlon, lon - dlon)
+		else:
+			sql = ("SELECT %s FROM %s t WHERE t.lat BETWEEN ? AND ? AND t.lon BETWEEN ? AND ?" % (columns, table))
+			args = (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+		return self.query(sql, args)
+
+	def airports_within(self, lat, lon, radius):
+		"""Return the AirportRecords within `radius` nm, nearest first."""
+		found = []
+		for row in self.within("airports", lat, lon, radius):
+			dist = distance_nm(lat, lon, row[2], row[3])
+			if dist <= radius:
+				found.append((dist, AirportRecord(*row)))
+		found.sort()
+		return [airport for dist, airport in found]
+
+	def nearest_airports(self, lat, lon, count, radius=25.0, max_radius=800.0):
+		"""Return up to `count` AirportRecords nearest to the position."""
+		while True:
+			airports = self.airports_within(lat, lon, radius)
+			if len(airports) >= count or radius >= max_radius:
+				return airports[:count]
+			radius *= 2
+
+	def nearest_point(self, ident, lat, lon):
+		"""Return the FixRecord named `ident` nearest to the position, or None."""
+		rows = self.query("SELECT ident, kind, lat, lon FROM points WHERE ident = ?", (ident,))
+		if not rows:
+			return None
+		return FixRecord(*min(rows, key=lambda row: distance_nm(lat, lon, row[2], row[3])))
+
+if __name__ == "__main__":
+	import sys
+	store = open_store(*sys.argv[1:6])
+	if len(sys.argv) > 6:
+		airport = store.airport(sys.argv[6])
+		print(airport)
+		for runway in store.runways(sys.argv[6]):
+			print(runway, store.ils(sys.argv[6], runway[0]))
+		if airport:
+			for nearby in store.airports_within(airport.lat, airport.lon, 30.0):
+				print(nearby)
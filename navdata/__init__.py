@@ -0,0 +1,7 @@
+#
+#  Readers and indexes for the GNS430 / X-Plane navigation data files.
+#
+#  Nothing in this package depends on the X-Plane SDK, so the modules can
+#  be used from background threads of the plugin as well as from the
+#  command line.
+#
@@ -0,0 +1,7 @@
+#
+#  Unit tests of the navdata, weather and metar packages.  They need
+#  neither X-Plane nor a network connection; run them from the top
+#  directory with Python 2.7:
+#
+#      python -m unittest discover
+#
@@ -0,0 +1,63 @@
+#
+#  Tests of the airports.txt reader and the airports ahead of the aircraft
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from navdata.Airports import read_airports, airports_ahead, iter_runways
+
+AIRPORTS_TXT = """\
+A,LSZH,ZURICH,47.458056,8.548056,1416,18000,0,12139,0
+R,16,155,12139,197,1,110.500,155,47.474,8.536,1390,3.00,50,1,0
+R,28,275,8202,197,0,0.000,0,47.457,8.574,1416,3.00,50,1,0
+A,LSZB,BERN BELP,46.914,7.497,1674,18000,0,5676,0
+R,14,138,5676,98,1,110.100,138,46.920,7.490,1674,4.00,50,1,0
+A,EDNY,FRIEDRICHSHAFEN,47.671,9.511,1367,5000,0,7729,0
+A,LFSB,BALE MULHOUSE,47.590,7.529,885,5000,0,12795,0
+A,EDDF,FRANKFURT MAIN,50.033,8.571,364,5000,0,13123,0
+A,BROKEN,NO POSITION
+"""
+
+class AirportsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "airports.txt")
+		with open(self.path, 'w') as f:
+			f.write(AIRPORTS_TXT)
+		self.airports = read_airports(self.path)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_read(self):
+		self.assertEqual([airport.icao for airport in self.airports], ["LSZH", "LSZB", "EDNY", "LFSB", "EDDF"])
+		self.assertEqual(self.airports[0].name, "ZURICH")
+		self.assertEqual(self.airports[0].lat, 47.458056)
+
+	def test_runways(self):
+		self.assertEqual(list(iter_runways(self.path)), [
+			("LSZH", "16", "155", "12139", "110.500", "155"),
+			("LSZH", "28", "275", "8202", "0.000", "0"),
+			("LSZB", "14", "138", "5676", "110.100", "138")])
+
+	def test_ahead(self):
+		# South of Zurich, heading north
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 0.0, 5, 100.0, 45.0), ["LSZH"])
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 0.0, 5, 200.0, 45.0), ["LSZH", "EDDF"])
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 0.0, 5, 100.0, 90.0), ["LSZH", "LFSB", "EDNY"])
+
+	def test_nearest_first(self):
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 0.0, 1, 200.0, 180.0), ["LSZH"])
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 0.0, 3, 200.0, 180.0), ["LSZH", "LFSB", "EDNY"])
+
+	def test_behind(self):
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 180.0, 5, 100.0, 30.0), [])
+		# Across north, 350 and 10 degrees are 20 apart
+		self.assertEqual(airports_ahead(self.airports, 47.3, 8.5, 350.0, 5, 100.0, 30.0), ["LSZH"])
+
+if __name__ == "__main__":
+	unittest.main()
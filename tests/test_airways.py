@@ -0,0 +1,141 @@
+#
+#  Tests of the airway graph and its route search
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from navdata import Airways
+from navdata.Airways import AirwayGraph, RouteLeg, DIRECT, build_airway_graph, load_airway_graph, read_segments, route_string
+
+FIX_1100 = """\
+I
+1100 Version - data cycle 1710, build 20170920
+47.000000000  006.000000000 AAAAA ENRT LS
+47.000000000  008.000000000 BBBBB ENRT LS
+47.000000000  010.000000000 CCCCC ENRT LS
+48.500000000  007.000000000 DDDDD ENRT LS
+45.500000000  008.000000000 EEEEE ENRT LS
+10.000000000  010.000000000 AAAAA ENRT XX
+99
+"""
+
+NAV_1100 = """\
+I
+1100 Version - data cycle 1710, build 20170920
+3  47.80000000  009.00000000   1380 11450 130    2.000 KLO  ENRT LS KLOTEN VOR/DME
+99
+"""
+
+# A straight line A-B-C, a detour over D, a one-way segment from E and a VOR
+AWY_1100 = """\
+I
+1100 Version - data cycle 1710, build 20170920
+AAAAA LS 11 BBBBB LS 11 N 1 180 450 UN1
+BBBBB LS 11 CCCCC LS 11 N 1 180 450 UN1-UL5
+AAAAA LS 11 DDDDD LS 11 N 1 180 450 UL2
+DDDDD LS 11 CCCCC LS 11 N 1 180 450 UL2
+EEEEE LS 11 BBBBB LS 11 F 1 180 450 UZ3
+BBBBB LS 11 KLO LS 3 N 1 180 450 UM4
+UNKWN LS 11 AAAAA LS 11 N 1 180 450 UX9
+99
+"""
+
+AWY_810 = """\
+I
+810 Version - data cycle 1510, build 20151025
+ABBOT 47.100000 8.200000 BELUS 47.500000 8.900000 1 180 450 UN850-UL613
+99
+"""
+
+class AirwaysTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.awy_path = self.write("earth_awy.dat", AWY_1100)
+		self.fix_path = self.write("earth_fix.dat", FIX_1100)
+		self.nav_path = self.write("earth_nav.dat", NAV_1100)
+		self.graph = build_airway_graph(self.awy_path, self.fix_path, self.nav_path)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		path = os.path.join(self.directory, name)
+		with open(path, 'w') as f:
+			f.write(text)
+		return path
+
+	def node(self, ident):
+		return self.graph.idents.index(ident)
+
+	def route(self, from_ident, to_ident):
+		graph = self.graph
+		start, goal = self.node(from_ident), self.node(to_ident)
+		legs = graph.find_route(graph.lats[start], graph.lons[start], graph.lats[goal], graph.lons[goal], [start], [goal])
+		return legs and [(leg.ident, leg.airway) for leg in legs[1:-1]]
+
+	def test_segments(self):
+		segments, coords = read_segments(self.write("earth_awy.dat", AWY_810))
+		abbot, belus = ("ABBOT", "47.10000", "8.20000"), ("BELUS", "47.50000", "8.90000")
+		self.assertEqual(segments, [(abbot, belus, "UN850-UL613", "N")])
+		self.assertEqual(coords, {abbot: (47.1, 8.2), belus: (47.5, 8.9)})
+
+	def test_nodes(self):
+		# The unknown fix is left out, the VOR is found in earth_nav.dat
+		self.assertEqual(sorted(self.graph.idents), ["AAAAA", "BBBBB", "CCCCC", "DDDDD", "EEEEE", "KLO"])
+		self.assertEqual((self.graph.lats[self.node("KLO")], self.graph.lons[self.node("KLO")]), (47.8, 9.0))
+		# Of the two AAAAA only the one in region LS
+		self.assertEqual(self.graph.lats[self.node("AAAAA")], 47.0)
+
+	def test_shortest(self):
+		self.assertEqual(self.route("AAAAA", "CCCCC"), [("AAAAA", DIRECT), ("BBBBB", "UN1"), ("CCCCC", "UN1-UL5")])
+		self.assertEqual(self.route("EEEEE", "DDDDD"), [("EEEEE", DIRECT), ("BBBBB", "UZ3"), ("AAAAA", "UN1"), ("DDDDD", "UL2")])
+
+	def test_one_way(self):
+		self.assertIsNone(self.route("BBBBB", "EEEEE"))
+		self.assertIsNone(self.route("CCCCC", "EEEEE"))
+
+	def test_free_positions(self):
+		# West of A and east of C, only A and C are within the entry distance
+		legs = self.graph.find_route(47.0, 5.9, 47.0, 10.1)
+		self.assertEqual(legs[0], RouteLeg(None, None, 47.0, 5.9))
+		self.assertEqual(legs[-1], RouteLeg(None, DIRECT, 47.0, 10.1))
+		self.assertEqual([(leg.ident, leg.airway) for leg in legs[1:-1]],
+			[("AAAAA", DIRECT), ("BBBBB", "UN1"), ("CCCCC", "UN1-UL5")])
+
+	def test_nearest_nodes(self):
+		self.assertEqual([self.graph.idents[no] for no in self.graph.nearest_nodes(47.1, 8.1, 2)], ["BBBBB", "KLO"])
+		self.assertEqual(self.graph.nearest_nodes(-30.0, 150.0), [])
+
+	def test_route_string(self):
+		legs = [RouteLeg("LSGG", None, 0, 0), RouteLeg("AAAAA", DIRECT, 0, 0), RouteLeg("BBBBB", "UN1", 0, 0),
+			RouteLeg("CCCCC", "UN1-UL5", 0, 0), RouteLeg("KLO", "UM4", 0, 0), RouteLeg("LSZH", DIRECT, 0, 0)]
+		self.assertEqual(route_string(legs), "LSGG DCT AAAAA UN1 CCCCC UM4 KLO DCT LSZH")
+		# A run of segments shared by two airways is named after one of them
+		legs[2] = legs[2]._replace(airway="UL5-UN1")
+		legs[4] = legs[4]._replace(airway="UL5")
+		self.assertEqual(route_string(legs), "LSGG DCT AAAAA UL5 KLO DCT LSZH")
+
+	def test_data(self):
+		graph = AirwayGraph.from_data(self.graph.to_data())
+		self.assertEqual(graph.idents, self.graph.idents)
+		self.assertEqual(list(graph.offsets), list(self.graph.offsets))
+		self.assertEqual(graph.find_route(47.0, 5.9, 47.0, 10.1), self.graph.find_route(47.0, 5.9, 47.0, 10.1))
+
+	def test_cached(self):
+		cache_path = os.path.join(self.directory, "awy.cache")
+		built = load_airway_graph(self.awy_path, self.fix_path, self.nav_path, "1710", cache_path)
+		def rebuild(*paths):
+			self.fail("built again despite a valid cache")
+		Airways.build_airway_graph, build = rebuild, Airways.build_airway_graph
+		try:
+			loaded = load_airway_graph(self.awy_path, self.fix_path, self.nav_path, "1710", cache_path)
+		finally:
+			Airways.build_airway_graph = build
+		self.assertEqual(loaded.to_data(), built.to_data())
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,72 @@
+#
+#  Tests of the concurrent fetches of several stations
+#
+
+import threading
+import time
+import unittest
+
+from weather.Fetch import fetch_many
+
+class SlowFetch(object):
+	"""A fetch taking `delay` seconds that records how many run at once."""
+
+	def __init__(self, delay):
+		self.delay = delay
+		self.running = 0
+		self.most_running = 0
+		self.lock = threading.Lock()
+
+	def __call__(self, icao):
+		with self.lock:
+			self.running += 1
+			self.most_running = max(self.most_running, self.running)
+		try:
+			time.sleep(self.delay)
+			if icao == "FAIL":
+				raise IOError("no route to host")
+			if icao == "NONE":
+				return None
+			return icao.lower()
+		finally:
+			with self.lock:
+				self.running -= 1
+
+class FetchTest(unittest.TestCase):
+
+	def test_side_by_side(self):
+		fetch = SlowFetch(0.2)
+		icaos = ["K%03d" % no for no in range(8)]
+		start = time.time()
+		self.assertEqual(fetch_many(fetch, icaos, 8), dict((icao, icao.lower()) for icao in icaos))
+		self.assertLess(time.time() - start, 0.6)
+		self.assertEqual(fetch.most_running, 8)
+
+	def test_concurrency(self):
+		fetch = SlowFetch(0.05)
+		self.assertEqual(len(fetch_many(fetch, ["K%03d" % no for no in range(12)], 3)), 12)
+		self.assertEqual(fetch.most_running, 3)
+
+	def test_failures(self):
+		errors = {}
+		found = fetch_many(SlowFetch(0.01), ["LSZH", "FAIL", "NONE", "LSGG"], 2, errors=errors)
+		self.assertEqual(found, {"LSZH": "lszh", "LSGG": "lsgg"})
+		self.assertEqual(errors.keys(), ["FAIL"])
+		self.assertIsInstance(errors["FAIL"], IOError)
+		# Without an errors dict a failure is only left out
+		self.assertEqual(fetch_many(SlowFetch(0.01), ["FAIL", "LSZH"], 2), {"LSZH": "lszh"})
+
+	def test_deadline(self):
+		fetch = SlowFetch(0.3)
+		start = time.time()
+		found = fetch_many(fetch, ["K%03d" % no for no in range(4)] + ["SLOW"], 4, deadline=0.5)
+		self.assertLess(time.time() - start, 0.6)
+		# The first round arrived, the fifth station was still being fetched
+		self.assertEqual(sorted(found), ["K000", "K001", "K002", "K003"])
+
+	def test_nothing(self):
+		self.assertEqual(fetch_many(SlowFetch(0), [], 4), {})
+		self.assertEqual(fetch_many(SlowFetch(0), [], 4, deadline=1.0), {})
+
+if __name__ == "__main__":
+	unittest.main()
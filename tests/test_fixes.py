@@ -0,0 +1,105 @@
+#
+#  Tests of the fix and navaid name index
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from navdata import Fixes
+from navdata.Fixes import FixIndex, FixRecord, KIND_FIX, KIND_NDB, KIND_VOR, build_fix_index, iter_fixes, load_fix_index
+
+# ROMEO twice, and once more on the other side of the date line
+FIX_810 = """\
+I
+600 Version - data cycle 1510, build 20151025
+47.100000  008.200000 ABBOT
+46.000000  007.000000 ROMEO
+-33.000000 151.000000 ROMEO
+ 52.000000 179.900000 ROMEO
+47.500000  bad        BROKN
+99
+"""
+
+FIX_1100 = """\
+I
+1100 Version - data cycle 1710, build 20170920
+47.100000000  008.200000000 ABBOT ENRT LS
+99
+"""
+
+NAV_810 = """\
+I
+810 Version - data cycle 1510, build 20151025
+2  47.53430000  008.75250000   1500   390  50    0.000 ROMEO  ROMEO NDB
+3  47.47610000  008.55380000   1380 11450 130    2.000 KLO  KLOTEN VOR/DME
+4  47.44960000  008.56080000   1402 11050  18  155.000 IZH  LSZH 16  ILS-cat-III
+99
+"""
+
+class FixesTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.fix_path = self.write("earth_fix.dat", FIX_810)
+		self.nav_path = self.write("earth_nav.dat", NAV_810)
+		self.index = build_fix_index(self.fix_path, self.nav_path)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		path = os.path.join(self.directory, name)
+		with open(path, 'w') as f:
+			f.write(text)
+		return path
+
+	def test_iter_fixes(self):
+		self.assertEqual(list(iter_fixes(self.fix_path))[:2], [("ABBOT", None, 47.1, 8.2), ("ROMEO", None, 46.0, 7.0)])
+		self.assertEqual(list(iter_fixes(self.write("earth_fix.dat", FIX_1100))), [("ABBOT", "LS", 47.1, 8.2)])
+
+	def test_contains(self):
+		self.assertIn("ABBOT", self.index)
+		self.assertIn("KLO", self.index)
+		# Neither a fix that does not parse nor an ILS
+		self.assertNotIn("BROKN", self.index)
+		self.assertNotIn("IZH", self.index)
+
+	def test_candidates(self):
+		self.assertEqual(sorted(self.index.candidates("ROMEO")), [
+			FixRecord("ROMEO", KIND_FIX, -33.0, 151.0),
+			FixRecord("ROMEO", KIND_FIX, 46.0, 7.0),
+			FixRecord("ROMEO", KIND_FIX, 52.0, 179.9),
+			FixRecord("ROMEO", KIND_NDB, 47.5343, 8.7525)])
+		self.assertEqual(self.index.candidates("KLO"), [FixRecord("KLO", KIND_VOR, 47.4761, 8.5538)])
+		self.assertEqual(self.index.candidates("NONE"), [])
+
+	def test_nearest(self):
+		self.assertEqual(self.index.nearest("ROMEO", 47.4, 8.5), FixRecord("ROMEO", KIND_NDB, 47.5343, 8.7525))
+		self.assertEqual(self.index.nearest("ROMEO", 45.0, 6.0).lat, 46.0)
+		self.assertEqual(self.index.nearest("ROMEO", -34.0, 150.0).lat, -33.0)
+		# Across the date line, 179.9 is near -179.9
+		self.assertEqual(self.index.nearest("ROMEO", 52.0, -179.9).lat, 52.0)
+		self.assertEqual(self.index.nearest("ABBOT", -40.0, -70.0), FixRecord("ABBOT", KIND_FIX, 47.1, 8.2))
+		self.assertIsNone(self.index.nearest("NONE", 47.0, 8.0))
+
+	def test_data(self):
+		index = FixIndex.from_data(self.index.to_data())
+		self.assertEqual(index.candidates("ROMEO"), self.index.candidates("ROMEO"))
+		self.assertEqual(index.nearest("ROMEO", 47.4, 8.5), self.index.nearest("ROMEO", 47.4, 8.5))
+
+	def test_cached(self):
+		cache_path = os.path.join(self.directory, "fix.cache")
+		built = load_fix_index(self.fix_path, self.nav_path, "1510", cache_path)
+		def rebuild(*paths):
+			self.fail("built again despite a valid cache")
+		Fixes.build_fix_index, build = rebuild, Fixes.build_fix_index
+		try:
+			loaded = load_fix_index(self.fix_path, self.nav_path, "1510", cache_path)
+		finally:
+			Fixes.build_fix_index = build
+		self.assertEqual(loaded.to_data(), built.to_data())
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,141 @@
+#
+#  Tests of the METAR history archive
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from weather.History import MetarHistory, BLOCK_HEADER, ingest, parse_time
+
+T0 = parse_time("2026/10/19 12:00")
+
+def report(icao, minutes):
+	return icao, T0 + minutes * 60, "%s 19%02d%02dZ 24008KT 9999 FEW040 15/08 Q1018" % (icao, 12 + minutes // 60, minutes % 60)
+
+class HistoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "history", "metar")
+		self.opened = []
+
+	def tearDown(self):
+		# As the plugin does at shutdown, which also ends the flush timers
+		for history in self.opened:
+			history.flush()
+		shutil.rmtree(self.directory)
+
+	def open(self, **kwargs):
+		history = MetarHistory(self.path, **kwargs)
+		self.opened.append(history)
+		return history
+
+	def fill(self, history, minutes):
+		for minute in minutes:
+			for icao in ("LSZH", "LSGG"):
+				history.append(*report(icao, minute))
+
+	def test_blocks(self):
+		history = self.open(block_reports=4)
+		self.fill(history, range(0, 60, 10))
+		self.assertEqual(len(history.blocks), 3)
+		self.assertEqual(history.pending, [])
+		self.assertEqual(history.blocks[0].stations, frozenset(["LSZH", "LSGG"]))
+		self.assertEqual((history.blocks[0].first, history.blocks[0].last), (T0, T0 + 600))
+
+	def test_reports(self):
+		history = self.open(block_reports=4)
+		self.fill(history, range(0, 70, 10))
+		# Three blocks written, the last two reports still pending
+		self.assertEqual(len(history.pending), 2)
+		found = history.reports("lszh", T0 + 600, T0 + 3600)
+		self.assertEqual(found, [report("LSZH", minute)[1:] for minute in range(10, 70, 10)])
+		self.assertEqual(history.reports("LSZH", T0 + 7200, T0 + 9000), [])
+		self.assertEqual(history.reports("EDDF", T0, T0 + 3600), [])
+
+	def test_timer_ended(self):
+		history = self.open(block_reports=2)
+		history.append(*report("LSZH", 0))
+		timer = history.timer
+		history.append(*report("LSZH", 10))
+		# The block was written, its timer does not wait for block_age
+		timer.join(1.0)
+		self.assertFalse(timer.is_alive())
+		self.assertIsNone(history.timer)
+
+	def test_repeats(self):
+		history = self.open()
+		history.append("LSZH", T0, "LSZH 191200Z 24008KT  9999 FEW040 15/08 Q1018")
+		history.append("lszh", T0, "LSZH 191200Z 24008KT 9999 FEW040 15/08 Q1018\n")
+		self.assertEqual(history.pending, [("LSZH", T0, "LSZH 191200Z 24008KT 9999 FEW040 15/08 Q1018")])
+
+	def test_reopened(self):
+		history = self.open(block_reports=4)
+		self.fill(history, range(0, 70, 10))
+		history.flush()
+		reopened = self.open()
+		self.assertEqual(reopened.blocks, history.blocks)
+		self.assertEqual(reopened.reports("LSGG", T0, T0 + 3600), history.reports("LSGG", T0, T0 + 3600))
+
+	def test_index_lines_lost(self):
+		history = self.open(block_reports=4)
+		self.fill(history, range(0, 60, 10))
+		# Killed after writing the last block but before its index line
+		with open(history.index_path, 'r') as f:
+			lines = f.readlines()
+		with open(history.index_path, 'w') as f:
+			f.writelines(lines[:1])
+		reopened = self.open()
+		self.assertEqual(reopened.blocks, history.blocks)
+		with open(history.index_path, 'r') as f:
+			self.assertEqual(f.readlines(), lines)
+
+	def test_torn_block(self):
+		history = self.open(block_reports=4)
+		self.fill(history, range(0, 40, 10))
+		size = os.path.getsize(history.data_path)
+		# Half a block, the rest was never written
+		with open(history.data_path, 'ab') as f:
+			f.write(BLOCK_HEADER.pack("MTRB", 1000) + "x" * 10)
+		reopened = self.open()
+		self.assertEqual(reopened.blocks, history.blocks)
+		self.assertEqual(os.path.getsize(history.data_path), size)
+		reopened.append(*report("LSZH", 100))
+		reopened.flush()
+		self.assertEqual(self.open().reports("LSZH", T0 + 6000, T0 + 6000), [report("LSZH", 100)[1:]])
+
+	def test_data_lost(self):
+		history = self.open(block_reports=4)
+		self.fill(history, range(0, 60, 10))
+		# The data file lost its last block, the index forgets it too
+		with open(history.data_path, 'r+b') as f:
+			f.truncate(history.blocks[-1].offset + 5)
+		reopened = self.open()
+		self.assertEqual(reopened.blocks, history.blocks[:2])
+		self.assertEqual(os.path.getsize(history.data_path), history.blocks[-1].offset)
+		self.assertEqual(self.open().blocks, history.blocks[:2])
+
+	def test_block_age(self):
+		history = self.open(block_age=0.2)
+		history.append(*report("LSZH", 0))
+		self.assertEqual(history.blocks, [])
+		# Written by the timer, no further report is needed
+		time.sleep(0.5)
+		self.assertEqual(len(history.blocks), 1)
+		self.assertEqual(history.pending, [])
+		self.assertIsNone(history.timer)
+
+	def test_ingest(self):
+		cycle_path = os.path.join(self.directory, "12Z.TXT")
+		with open(cycle_path, 'w') as f:
+			f.write("2026/10/19 12:00\nLSZH 191200Z 24008KT 9999 FEW040 15/08 Q1018\n\n"
+				"2026/10/19 12:20\nLSGG 191220Z 22004KT CAVOK 12/06 Q1020\n")
+		history = self.open()
+		self.assertEqual(ingest(history, cycle_path), 2)
+		self.assertEqual(history.reports("LSGG", T0, T0 + 3600), [(T0 + 1200, "LSGG 191220Z 22004KT CAVOK 12/06 Q1020")])
+
+if __name__ == "__main__":
+	unittest.main()
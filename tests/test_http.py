@@ -0,0 +1,114 @@
+#
+#  Tests of the keep-alive connections and the conditional NOAA requests,
+#  against a local HTTP server
+#
+
+import BaseHTTPServer
+import SocketServer
+import socket
+import threading
+import time
+import unittest
+
+from weather.Http import ConnectionPool
+from weather.Noaa import NoaaStations
+
+STATION_FILE = "2026/10/19 13:50\nLSZH 191350Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG\n"
+
+class StationHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	"""Serves /LSZH.TXT with an ETag, /SLOW after a while and /DROP on a connection it then drops."""
+
+	protocol_version = "HTTP/1.1"
+
+	def setup(self):
+		BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+		self.server.connections += 1
+
+	def do_GET(self):
+		self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+		if self.path == "/SLOW":
+			time.sleep(1.0)
+		if self.path == "/LSZH.TXT" and self.headers.get("If-None-Match") == '"v1"':
+			self.send_response(304)
+			self.send_header("Content-Length", "0")
+			self.end_headers()
+			return
+		if self.path not in ("/LSZH.TXT", "/SLOW", "/DROP"):
+			self.send_error(404)
+			return
+		self.send_response(200)
+		self.send_header("Content-Length", str(len(STATION_FILE)))
+		self.send_header("ETag", '"v1"')
+		self.end_headers()
+		self.wfile.write(STATION_FILE)
+		# Without a "Connection: close", as servers closing idle connections do
+		if self.path == "/DROP":
+			self.close_connection = 1
+
+	def log_message(self, format, *args):
+		pass
+
+class StationServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+	def handle_error(self, request, client_address):
+		# The client timed out on /SLOW and is gone before the answer, as intended
+		pass
+
+class HttpTest(unittest.TestCase):
+
+	def setUp(self):
+		self.server = StationServer(("127.0.0.1", 0), StationHandler)
+		self.server.connections = 0
+		self.server.requests = []
+		thread = threading.Thread(target=self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+		self.base = "http://127.0.0.1:%d" % self.server.server_address[1]
+		self.pool = ConnectionPool(5.0)
+
+	def tearDown(self):
+		self.pool.close()
+		self.server.shutdown()
+		self.server.server_close()
+
+	def test_keep_alive(self):
+		for no in range(3):
+			status, headers, body = self.pool.get(self.base + "/LSZH.TXT")
+			self.assertEqual((status, body), (200, STATION_FILE))
+		self.assertEqual(headers["etag"], '"v1"')
+		self.assertEqual(self.server.connections, 1)
+
+	def test_dropped_connection(self):
+		self.pool.get(self.base + "/DROP")
+		self.assertEqual(len(self.pool.idle[("http", self.base[7:])]), 1)
+		# The idle connection was closed by the server, the request is sent again
+		status, headers, body = self.pool.get(self.base + "/LSZH.TXT")
+		self.assertEqual(status, 200)
+		self.assertEqual(self.server.connections, 2)
+
+	def test_max_idle(self):
+		pool = ConnectionPool(5.0, max_idle=1)
+		connections = [pool.connection("http", "127.0.0.1")[0] for no in range(2)]
+		for connection in connections:
+			pool.release("http", "127.0.0.1", connection)
+		self.assertEqual(pool.idle[("http", "127.0.0.1")], connections[:1])
+		self.assertEqual(pool.connection("http", "127.0.0.1"), (connections[0], True))
+
+	def test_timeout(self):
+		start = time.time()
+		self.assertRaises(socket.timeout, self.pool.get, self.base + "/SLOW", None, 0.2)
+		self.assertLess(time.time() - start, 0.9)
+
+	def test_revalidated(self):
+		stations = NoaaStations(self.pool, (self.base + "/%s.TXT",))
+		metar = stations.fetch("lszh")
+		self.assertEqual(metar.station_id, "LSZH")
+		# Unchanged, the server answers 304 and the report is not parsed again
+		self.assertIs(stations.fetch("LSZH"), metar)
+		self.assertEqual(self.server.requests, [("/LSZH.TXT", None), ("/LSZH.TXT", '"v1"')])
+		self.assertIsNone(stations.fetch("XXXX"))
+		self.assertEqual(stations.policy.stats.outcomes, {"http 200": 1, "http 304": 1, "http 404": 1})
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,324 @@
+#
+#  Tests of the METAR parser extensions: records, budgets, tolerant parsing,
+#  rendering, dating against a parse context and the parse cache
+#
+
+import datetime
+import marshal
+import time
+import unittest
+
+from metar import Metar
+
+# Real reports, one of each unit system and with remarks, RVR and trends
+REPORTS = [
+	"KJFK 191351Z 31012G20KT 10SM FEW040 BKN250 12/11 A2992 RMK AO2 PK WND 32025/1320 SLP132 T01220111",
+	"LSZH 191350Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG",
+	"EGLL 191350Z 27015KT 0800 R27L/0600V1000U FG VV002 08/08 Q1012",
+	"KORD 191351Z 18015G25KT 3/4SM R10L/2400V4000FT -TSRA BR BKN008CB OVC015 18/17 A2978 "
+		"RMK AO2 LTG DSNT NE TS OHD MOV E P0012 60025 T01830172",
+]
+
+def parse(code, **kwargs):
+	return Metar.Metar(code, 10, 2026, **kwargs)
+
+class FixedClock(datetime.datetime):
+	"""A datetime whose clock is set by the test and counts how often it is read."""
+
+	utc = None
+	reads = 0
+
+	@classmethod
+	def utcnow(cls):
+		FixedClock.reads += 1
+		return cls.utc
+
+	@classmethod
+	def now(cls):
+		FixedClock.reads += 1
+		return cls.utc + datetime.timedelta(hours=2)
+
+class FixedClockModule(object):
+	"""Stands in for the datetime module of the parser."""
+
+	timedelta = datetime.timedelta
+	datetime = FixedClock
+
+class ClockTest(unittest.TestCase):
+	"""Runs the parser against a FixedClock set to `utc`."""
+
+	utc = datetime.datetime(2026, 10, 19, 14, 0)
+
+	def setUp(self):
+		FixedClock.utc = self.utc
+		FixedClock.reads = 0
+		Metar.datetime = FixedClockModule
+
+	def tearDown(self):
+		Metar.datetime = datetime
+
+class RecordTest(unittest.TestCase):
+
+	def assertSameReport(self, decoded, metar):
+		self.assertEqual(decoded.string(), metar.string())
+		self.assertEqual(decoded.time, metar.time)
+		self.assertEqual(decoded.station_id, metar.station_id)
+		self.assertEqual(decoded.wind("KT"), metar.wind("KT"))
+		self.assertEqual(decoded.visibility(), metar.visibility())
+		self.assertEqual(decoded.sky_conditions(), metar.sky_conditions())
+		self.assertEqual(decoded.temp.value("C"), metar.temp.value("C"))
+		self.assertAlmostEqual(decoded.press.value("MB"), metar.press.value("MB"), 6)
+		self.assertEqual(decoded.remarks(), metar.remarks())
+
+	def test_round_trip(self):
+		for code in REPORTS:
+			metar = parse(code)
+			self.assertSameReport(Metar.Metar.from_record(metar.to_record()), metar)
+
+	def test_record_is_plain_data(self):
+		for code in REPORTS:
+			record = parse(code).to_record()
+			self.assertEqual(record[0], Metar.RECORD_VERSION)
+			self.assertEqual(len(record), len(Metar.RECORD_FIELDS) + 1)
+			self.assertEqual(marshal.loads(marshal.dumps(record)), record)
+
+	def test_record_of_decoded_report(self):
+		metar = parse(REPORTS[3])
+		decoded = Metar.Metar.from_record(metar.to_record())
+		self.assertEqual(decoded.to_record(), metar.to_record())
+
+	def test_decoded_on_first_use(self):
+		decoded = Metar.Metar.from_record(parse(REPORTS[0]).to_record())
+		self.assertNotIn("temp", decoded.__dict__)
+		self.assertEqual(decoded.temp.value("C"), 12.2)
+		self.assertIn("temp", decoded.__dict__)
+		self.assertRaises(AttributeError, getattr, decoded, "no_such_field")
+
+	def test_runway_range(self):
+		decoded = Metar.Metar.from_record(parse(REPORTS[2]).to_record())
+		name, low, high = decoded.runway[0]
+		self.assertEqual(name, "27L")
+		self.assertEqual(low.value("M"), 600)
+		self.assertEqual(high.value("M"), 1000)
+
+	def test_binary_and_json(self):
+		for code in REPORTS:
+			metar = parse(code)
+			self.assertSameReport(Metar.Metar.from_binary(metar.to_binary()), metar)
+			self.assertSameReport(Metar.Metar.from_json(metar.to_json()), metar)
+
+	def test_other_version(self):
+		record = (Metar.RECORD_VERSION + 1,) + parse(REPORTS[1]).to_record()[1:]
+		self.assertRaises(ValueError, Metar.Metar.from_record, record)
+
+class BudgetTest(unittest.TestCase):
+
+	def test_pathological_remarks(self):
+		# Every "NE" could be one direction or two, the directions of these
+		# remarks used to be matched in exponential time
+		for remark in ("LTG ", "TS "):
+			code = "KJFK 191351Z 31012KT 10SM FEW040 12/11 A2992 RMK " + remark + "NE" * 40 + "Z"
+			start = time.time()
+			metar = parse(code, budget=Metar.default_budget)
+			self.assertLess(time.time() - start, 1.0)
+			self.assertEqual(metar.station_id, "KJFK")
+
+	def test_too_long(self):
+		code = REPORTS[0] + " RMK" + " A" * Metar.default_budget.max_length
+		self.assertRaises(Metar.ParserBudgetError, parse, code)
+
+	def test_too_many_groups(self):
+		budget = Metar.parse_budget(max_groups=10)
+		self.assertRaises(Metar.ParserBudgetError, parse, REPORTS[0], budget=budget)
+		parse(REPORTS[1], budget=budget)
+
+	def test_too_much_work(self):
+		self.assertRaises(Metar.ParserBudgetError, parse, REPORTS[0], budget=Metar.parse_budget(max_work=10))
+
+	def test_budget_error_is_parser_error(self):
+		self.assertTrue(issubclass(Metar.ParserBudgetError, Metar.ParserError))
+
+class UnparsedTest(unittest.TestCase):
+
+	def test_strict(self):
+		self.assertRaises(Metar.ParserError, parse, "KJFK 191351Z 31012KT 10SM FOO FEW040 12/11 A2992 RMK AO2 SLP132")
+
+	def test_positions(self):
+		metar = parse("KJFK 191351Z 31012KT 10SM FOO FEW040 12/11 A2992 RMK AO2 SLP132", strict=False)
+		self.assertEqual(metar.unparsed(), [(26, "FOO")])
+		# The groups around it are still decoded
+		self.assertEqual(metar.sky_conditions(), "a few clouds at 4000 feet")
+		self.assertEqual(metar.temp.value("C"), 12.0)
+		self.assertEqual(metar.press_sea_level.value("MB"), 1013.2)
+
+	def test_several_groups(self):
+		for code in ("LSZH 191350Z 24008KT XYZ 9999 FEW040 ABC 15/08 Q1018 NOSIG",
+				"LSZH  191350Z 24008KT   XYZ 9999 FEW040 15/08 Q1018"):
+			unparsed = parse(code, strict=False).unparsed()
+			self.assertEqual([group for position, group in unparsed], [group for group in ("XYZ", "ABC") if group in code])
+			for position, group in unparsed:
+				self.assertEqual(code[position:position + len(group)], group)
+
+	def test_understood(self):
+		for code in REPORTS:
+			self.assertEqual(parse(code, strict=False).unparsed(), [])
+
+	def test_record(self):
+		metar = parse("LSZH 191350Z 24008KT XYZ 9999 FEW040 ABC 15/08 Q1018 NOSIG", strict=False)
+		self.assertEqual(Metar.Metar.from_record(metar.to_record()).unparsed(), [(21, "XYZ"), (37, "ABC")])
+
+class RenderTest(unittest.TestCase):
+
+	def test_texts(self):
+		# As the parser rendered them before the texts were cached
+		metar = parse(REPORTS[0])
+		self.assertEqual(metar.wind("KT"), "NW at 12 knots, gusting to 20 knots")
+		self.assertEqual(metar.wind("MPS"), "NW at 6 mps, gusting to 10 mps")
+		self.assertEqual(metar.wind("KMH"), "NW at 22 km/h, gusting to 37 km/h")
+		self.assertEqual(metar.wind(units="MPH"), "NW at 14 mph, gusting to 23 mph")
+		self.assertEqual(metar.visibility(), "10 miles")
+		self.assertEqual(metar.visibility("M"), "16093 meters")
+		self.assertEqual(metar.visibility("KM"), "16.1 km")
+		self.assertEqual(metar.sky_conditions(), "a few clouds at 4000 feet; broken clouds at 25000 feet")
+		self.assertEqual(metar.sky_conditions(", "), "a few clouds at 4000 feet, broken clouds at 25000 feet")
+
+	def test_cached(self):
+		metar = parse(REPORTS[3])
+		self.assertIs(metar.string(), metar.string())
+		self.assertIs(metar.wind("MPS"), metar.wind("MPS"))
+		self.assertEqual(metar.string(), parse(REPORTS[3]).string())
+
+	def test_unit_formats(self):
+		self.assertEqual(Metar.temperature("12", "C").string("F"), "53.6 F")
+		self.assertEqual(Metar.pressure("29.92", "IN").string("MB"), "1013.2 mb")
+		self.assertEqual(Metar.distance("M1/4", "SM").string("M"), "less than 402 meters")
+		self.assertEqual(Metar.distance("P6", "SM").string(), "greater than 6 miles")
+		self.assertEqual(Metar.precipitation("0.12", "IN").string("CM"), "0.30cm")
+		self.assertEqual(Metar.speed("12", "KT").string("MPS"), "6 mps")
+
+class ParseContextTest(ClockTest):
+
+	def test_reference(self):
+		context = Metar.parse_context(datetime.datetime(2026, 3, 25, 6, 0))
+		self.assertEqual(Metar.Metar(REPORTS[1], context=context).time, datetime.datetime(2026, 3, 19, 13, 50))
+		# Not the clock, which is in October
+		self.assertEqual(Metar.Metar(REPORTS[1]).time, datetime.datetime(2026, 10, 19, 13, 50))
+
+	def test_rolled_back(self):
+		# A day after the reference day is one of the month before
+		context = Metar.parse_context(datetime.datetime(2026, 3, 10, 6, 0))
+		self.assertEqual(Metar.Metar(REPORTS[1], context=context).time, datetime.datetime(2026, 2, 19, 13, 50))
+		context = Metar.parse_context(datetime.datetime(2026, 1, 10, 6, 0))
+		self.assertEqual(Metar.Metar(REPORTS[1], context=context).time, datetime.datetime(2025, 12, 19, 13, 50))
+
+	def test_overrides(self):
+		reference = datetime.datetime(2026, 1, 10, 6, 0)
+		self.assertEqual(Metar.Metar(REPORTS[1], context=Metar.parse_context(reference, month=7)).time,
+			datetime.datetime(2025, 7, 19, 13, 50))
+		self.assertEqual(Metar.Metar(REPORTS[1], context=Metar.parse_context(reference, year=2024)).time,
+			datetime.datetime(2024, 12, 19, 13, 50))
+		# Month and year given to the parser win over the context's
+		context = Metar.parse_context(reference, month=7, year=2024)
+		self.assertEqual(Metar.Metar(REPORTS[1], 5, 2023, context=context).time, datetime.datetime(2023, 5, 19, 13, 50))
+
+	def test_key(self):
+		reference = datetime.datetime(2026, 3, 25, 6, 0)
+		self.assertEqual(Metar.parse_context(reference).key(), (None, None, reference.date()))
+		self.assertEqual(Metar.parse_context(reference, month=3).key(), (3, None, reference.date()))
+		self.assertEqual(Metar.parse_context(reference, 3, 2026).key(), (3, 2026, None))
+		self.assertEqual(Metar.parse_context(reference).key(3, 2026), (3, 2026, None))
+		# Fully dated contexts share cached reports, whatever their reference time
+		cache = Metar.parse_cache(10)
+		metar = cache.parse(REPORTS[1], context=Metar.parse_context(reference, 3, 2026))
+		self.assertIs(cache.parse(REPORTS[1], context=Metar.parse_context(datetime.datetime(2026, 4, 2, 0, 0), 3, 2026)), metar)
+		self.assertIs(cache.parse(REPORTS[1], 3, 2026, context=Metar.parse_context(datetime.datetime(2026, 5, 1, 0, 0))), metar)
+		self.assertIsNot(cache.parse(REPORTS[1], context=Metar.parse_context(reference)), metar)
+		self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+	def test_clock_read_once(self):
+		context = Metar.parse_context()
+		self.assertEqual(context.now, self.utc)
+		self.assertEqual(context.utcdelta, datetime.timedelta(hours=2))
+		reads = FixedClock.reads
+		for code in REPORTS * 5:
+			Metar.Metar(code, context=context)
+		self.assertEqual(FixedClock.reads, reads)
+		# Without a context every report reads it
+		for code in REPORTS:
+			Metar.Metar(code)
+		self.assertGreaterEqual(FixedClock.reads, reads + len(REPORTS))
+
+class ParseCacheTest(ClockTest):
+
+	def setUp(self):
+		ClockTest.setUp(self)
+		self.cache = Metar.parse_cache(2)
+
+	def tearDown(self):
+		ClockTest.tearDown(self)
+		Metar.disable_parse_cache()
+
+	def test_normalized(self):
+		metar = self.cache.parse(REPORTS[1], 10, 2026)
+		self.assertIs(self.cache.parse("  " + REPORTS[1].replace(" ", "   ") + "\n", 10, 2026), metar)
+		self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+	def test_evicted(self):
+		first = self.cache.parse(REPORTS[0], 10, 2026)
+		self.cache.parse(REPORTS[1], 10, 2026)
+		# Asked for again, the first is kept and the second dropped for a third
+		self.assertIs(self.cache.parse(REPORTS[0], 10, 2026), first)
+		self.cache.parse(REPORTS[2], 10, 2026)
+		self.assertIs(self.cache.parse(REPORTS[0], 10, 2026), first)
+		self.cache.parse(REPORTS[1], 10, 2026)
+		self.assertEqual((self.cache.hits, self.cache.misses), (2, 4))
+
+	def test_strict(self):
+		code = "LSZH 191350Z 24008KT 9999 XYZ FEW040 15/08 Q1018 NOSIG"
+		self.assertEqual(self.cache.parse(code, 10, 2026, strict=False).unparsed(), [(26, "XYZ")])
+		# Not served the tolerant report, and nothing cached for the failure
+		self.assertRaises(Metar.ParserError, self.cache.parse, code, 10, 2026)
+		self.assertRaises(Metar.ParserError, self.cache.parse, code, 10, 2026)
+		self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+
+	def test_dated(self):
+		october = self.cache.parse(REPORTS[1], 10, 2026)
+		september = self.cache.parse(REPORTS[1], 9, 2026)
+		self.assertEqual((october.time.month, september.time.month), (10, 9))
+		self.assertIsNot(self.cache.parse(REPORTS[1], 10, 2025), october)
+		self.assertEqual(self.cache.misses, 3)
+
+	def test_context(self):
+		context = Metar.parse_context(datetime.datetime(2026, 9, 30, 12, 0))
+		metar = self.cache.parse(REPORTS[1], context=context)
+		self.assertEqual(metar.time, datetime.datetime(2026, 9, 19, 13, 50))
+		# Another context of the same day dates the report alike
+		self.assertIs(self.cache.parse(REPORTS[1], context=Metar.parse_context(datetime.datetime(2026, 9, 30, 23, 0))), metar)
+		self.assertIsNot(self.cache.parse(REPORTS[1], context=Metar.parse_context(datetime.datetime(2026, 10, 1, 0, 10))), metar)
+		self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+	def test_undated_by_day(self):
+		today = self.cache.parse(REPORTS[1])
+		self.assertEqual(today.time, datetime.datetime(2026, 10, 19, 13, 50))
+		FixedClock.utc = datetime.datetime(2026, 10, 19, 23, 59)
+		self.assertIs(self.cache.parse(REPORTS[1]), today)
+		# After midnight the same text is a report of another date
+		FixedClock.utc = datetime.datetime(2026, 11, 2, 0, 1)
+		later = self.cache.parse(REPORTS[1])
+		self.assertEqual(later.time, datetime.datetime(2026, 10, 19, 13, 50))
+		self.assertIsNot(later, today)
+
+	def test_module_parse(self):
+		Metar.disable_parse_cache()
+		self.assertIsNone(Metar.get_parse_cache())
+		self.assertIsNot(Metar.parse(REPORTS[1], 10, 2026), Metar.parse(REPORTS[1], 10, 2026))
+		cache = Metar.enable_parse_cache(10)
+		# Enabled once, later calls return the same cache
+		self.assertIs(Metar.enable_parse_cache(20), cache)
+		self.assertIs(Metar.get_parse_cache(), cache)
+		self.assertEqual(cache.size, 10)
+		self.assertIs(Metar.parse(REPORTS[1], 10, 2026), Metar.parse(REPORTS[1], 10, 2026))
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,105 @@
+#
+#  Tests of the earth_nav.dat readers and the ILS index
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from navdata import Cache, Navaids
+from navdata.Navaids import IlsIndex, IlsRecord, build_ils_index, iter_navaids, nav_file_version
+
+NAV_810 = """\
+I
+810 Version - data cycle 1510, build 20151025
+2  47.53430000  008.75250000   1500   390  50    0.000 ZH  ZURICH NDB
+3  47.47610000  008.55380000   1380 11450 130    2.000 KLO KLOTEN VOR/DME
+4  47.44960000  008.56080000   1402 11050  18  155.000 IZH  LSZH 16  ILS-cat-III
+6  47.47100000  008.53500000   1402 11050  10 300155.000 IZH  LSZH 16  GS
+12 47.47100000  008.53500000   1402 11050  18    0.000 IZH  LSZH 16  DME-ILS
+5  47.46000000  008.58000000   1402 10815  18  275.490 IKL  LSZH 28  LOC
+12 47.48000000  008.59000000   1402 11290  18    0.000 KLO  LSZH 28  DME
+6  46.91000000  007.49000000   1674 11010  10 400138.000 IBE  LSZB 14  GS
+99
+"""
+
+NAV_1100 = """\
+I
+1100 Version - data cycle 1710, build 20170920
+2  47.53430000  008.75250000   1500   390  50    0.000 ZH  ENRT LS ZURICH NDB
+4  47.44960000  008.56080000   1402 11050  18  155.000 IZH  LSZH LS 16  ILS-cat-III
+6  47.47100000  008.53500000   1402 11050  10 300155.000 IZH  LSZH LS 16  GS
+99
+"""
+
+class NavaidsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		path = os.path.join(self.directory, name)
+		with open(path, 'w') as f:
+			f.write(text)
+		return path
+
+	def test_version(self):
+		self.assertEqual(nav_file_version(NAV_810.splitlines()[:2]), 810)
+		self.assertEqual(nav_file_version(NAV_1100.splitlines()[:2]), 1100)
+		self.assertEqual(nav_file_version(["I", ""]), 810)
+
+	def test_ils_810(self):
+		index = IlsIndex(self.write("earth_nav.dat", NAV_810))
+		self.assertEqual(index.ils("lszh", "16"), IlsRecord("IZH", "110.500", 155, 3.0, True))
+		# A localizer with a plain DME, not part of the ILS
+		self.assertEqual(index.ils("LSZH", "28"), IlsRecord("IKL", "108.150", 275, None, False))
+		self.assertIsNone(index.ils("LSZH", "34"))
+
+	def test_ils_1100(self):
+		# The region code moves the runway one field to the right
+		index = IlsIndex(self.write("earth_nav.dat", NAV_1100))
+		self.assertEqual(index.ils("LSZH", "16"), IlsRecord("IZH", "110.500", 155, 3.0, False))
+		self.assertIsNone(index.ils("LSZH", "LS"))
+
+	def test_glideslope_alone(self):
+		self.assertNotIn(("LSZB", "14"), build_ils_index(self.write("earth_nav.dat", NAV_810)))
+
+	def test_cached(self):
+		nav_path = self.write("earth_nav.dat", NAV_810)
+		cache_path = os.path.join(self.directory, "cache", "ils.cache")
+		built = IlsIndex(nav_path, "1510", cache_path)
+		self.assertTrue(os.path.exists(cache_path))
+		def rebuild(path):
+			self.fail("built again despite a valid cache")
+		Navaids.build_ils_index, build = rebuild, Navaids.build_ils_index
+		try:
+			self.assertEqual(IlsIndex(nav_path, "1510", cache_path).index, built.index)
+		finally:
+			Navaids.build_ils_index = build
+
+	def test_stale_cache(self):
+		nav_path = self.write("earth_nav.dat", NAV_810)
+		cache_path = os.path.join(self.directory, "ils.cache")
+		IlsIndex(nav_path, "1510", cache_path)
+		# The file edited, the index is built from it again
+		self.write("earth_nav.dat", NAV_1100)
+		self.assertIsNone(IlsIndex(nav_path, "1510", cache_path).ils("LSZH", "28"))
+		# Another cycle with the same file as well
+		self.write("earth_nav.dat", NAV_810)
+		IlsIndex(nav_path, "1510", cache_path)
+		self.assertIsNotNone(IlsIndex(nav_path, "1511", cache_path).ils("LSZH", "28"))
+		self.assertEqual(Cache.load(cache_path, Cache.source_key("1511", nav_path)), build_ils_index(nav_path))
+
+	def test_navaids(self):
+		self.assertEqual(list(iter_navaids(self.write("earth_nav.dat", NAV_810))), [
+			("2", "ZH", None, 47.5343, 8.7525),
+			("3", "KLO", None, 47.4761, 8.5538)])
+		self.assertEqual(list(iter_navaids(self.write("earth_nav.dat", NAV_1100))), [
+			("2", "ZH", "LS", 47.5343, 8.7525)])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,107 @@
+#
+#  Tests of the deadlines, retries and hedged requests of the weather fetches
+#
+
+import socket
+import threading
+import time
+import unittest
+
+from weather.Http import HttpStatusError
+from weather.Policy import FetchPolicy, FetchStats
+
+class ScriptedPool(object):
+	"""Answers each URL after a delay with the next of its scripted answers, or raises it."""
+
+	def __init__(self, script):
+		self.script = script
+		self.asked = []
+		self.lock = threading.Lock()
+
+	def get(self, url, headers=None, timeout=None):
+		with self.lock:
+			self.asked.append(url)
+			answers = self.script[url]
+			delay, answer = answers.pop(0) if len(answers) > 1 else answers[0]
+		time.sleep(delay)
+		if isinstance(answer, Exception):
+			raise answer
+		return answer, {}, "body of %s" % url
+
+class PolicyTest(unittest.TestCase):
+
+	def test_answer(self):
+		policy = FetchPolicy(1.0)
+		self.assertEqual(policy.get(ScriptedPool({"a": [(0, 200)]}), ["a"]), (200, {}, "body of a"))
+		self.assertEqual(policy.stats.outcomes, {"http 200": 1})
+
+	def test_deadline(self):
+		# A single server is held to the deadline as well
+		policy = FetchPolicy(0.3, retries=2)
+		start = time.time()
+		self.assertRaises(socket.timeout, policy.get, ScriptedPool({"a": [(2.0, 200)]}), ["a"])
+		self.assertLess(time.time() - start, 0.6)
+		self.assertEqual(policy.stats.outcomes, {"timeout": 1})
+
+	def test_hedged(self):
+		pool = ScriptedPool({"a": [(1.0, 200)], "b": [(0.05, 200)]})
+		policy = FetchPolicy(2.0, hedge_after=0.1)
+		start = time.time()
+		self.assertEqual(policy.get(pool, ["a", "b"]), (200, {}, "body of b"))
+		self.assertLess(time.time() - start, 0.5)
+		self.assertEqual(policy.stats.outcomes, {"hedged": 1, "mirror answered": 1, "http 200": 1})
+
+	def test_not_hedged(self):
+		pool = ScriptedPool({"a": [(0.05, 200)], "b": [(0, 200)]})
+		policy = FetchPolicy(2.0, hedge_after=0.5)
+		self.assertEqual(policy.get(pool, ["a", "b"]), (200, {}, "body of a"))
+		self.assertEqual(pool.asked, ["a"])
+
+	def test_failed_over(self):
+		# The primary failing, the mirror is asked without waiting to hedge
+		pool = ScriptedPool({"a": [(0, socket.error("connection refused"))], "b": [(0, 200)]})
+		policy = FetchPolicy(2.0, hedge_after=1.0)
+		start = time.time()
+		self.assertEqual(policy.get(pool, ["a", "b"]), (200, {}, "body of b"))
+		self.assertLess(time.time() - start, 0.5)
+
+	def test_retried(self):
+		pool = ScriptedPool({"a": [(0, 503), (0, socket.error("connection reset")), (0, 200)]})
+		policy = FetchPolicy(2.0, retries=2, backoff=0.01)
+		self.assertEqual(policy.get(pool, ["a"])[0], 200)
+		self.assertEqual(policy.stats.outcomes, {"http 503": 1, "network error": 1, "http 200": 1})
+
+	def test_gave_up(self):
+		policy = FetchPolicy(2.0, retries=1, backoff=0.01)
+		self.assertRaises(socket.error, policy.get, ScriptedPool({"a": [(0, socket.error("connection refused"))]}), ["a"])
+		try:
+			policy.get(ScriptedPool({"a": [(0, 503)]}), ["a"])
+		except HttpStatusError as error:
+			self.assertEqual(error.status, 503)
+		else:
+			self.fail("HttpStatusError not raised")
+
+	def test_final_status(self):
+		pool = ScriptedPool({"a": [(0, 404)]})
+		policy = FetchPolicy(2.0, retries=2, backoff=0.01)
+		self.assertEqual(policy.get(pool, ["a"])[0], 404)
+		self.assertEqual(pool.asked, ["a"])
+
+	def test_not_network_error(self):
+		# A bug is neither retried nor counted as a network error
+		pool = ScriptedPool({"a": [(0, ValueError("bug"))]})
+		policy = FetchPolicy(2.0, retries=2, backoff=0.01)
+		self.assertRaises(ValueError, policy.get, pool, ["a"])
+		self.assertEqual(pool.asked, ["a"])
+		self.assertEqual(policy.stats.outcomes, {})
+
+	def test_summary(self):
+		stats = FetchStats()
+		self.assertEqual(stats.summary(), "none")
+		for latency in (0.1, 0.2, 0.3, 0.4):
+			stats.record("http 200", latency)
+		stats.record("timeout")
+		self.assertEqual(stats.summary(), "http 200 4, timeout 1; latency p50 0.30s p95 0.40s max 0.40s")
+
+if __name__ == "__main__":
+	unittest.main()
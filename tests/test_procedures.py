@@ -0,0 +1,121 @@
+#
+#  Tests of the GNS430 procedure files and their cache
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from navdata import Procedures
+from navdata.Procedures import (ALL_RUNWAYS, KIND_APPROACH, KIND_SID, KIND_STAR, KIND_TRANSITION, ProcedureCache,
+	procedure_file_path, procedures_for_runway, read_procedures)
+
+# The legs of a procedure end at the blank line, not at the next header
+LSZH = """\
+SID,AMIK1Y,RW16,5
+CF,D164B,47.375,8.600
+TF,AMIKI,47.300,8.700
+
+CF,ORPHN,47.000,8.000
+STAR,NEGRA1A,ALL,4
+TF,NEGRA,47.600,8.900
+IF,GIPOL,47.500,8.600
+
+SID,VEBIT2W,rw28,3
+CF,D278K
+APPTR,I16,16,GIPOL
+IF,GIPOL
+FINAL,I16,16,I,5
+CF,FI16
+FINAL,R34,ALL,R,5
+TF,CI34
+"""
+
+class ProcDirTest(unittest.TestCase):
+	"""Runs with LSZH.txt in a temporary PROC directory."""
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = self.write("LSZH.txt", LSZH)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		path = os.path.join(self.directory, name)
+		with open(path, 'w') as f:
+			f.write(text)
+		return path
+
+class ProceduresTest(ProcDirTest):
+
+	def test_file_path(self):
+		self.assertEqual(procedure_file_path(self.directory, "lszh"), self.path)
+		self.assertIsNone(procedure_file_path(self.directory, "LSGG"))
+
+	def test_read(self):
+		procedures = read_procedures(self.path)
+		self.assertEqual([(procedure.kind, procedure.name, procedure.runway) for procedure in procedures], [
+			(KIND_SID, "AMIK1Y", "16"),
+			(KIND_STAR, "NEGRA1A", ALL_RUNWAYS),
+			(KIND_SID, "VEBIT2W", "28"),
+			(KIND_TRANSITION, "I16", "16"),
+			(KIND_APPROACH, "I16", "16"),
+			(KIND_APPROACH, "R34", ALL_RUNWAYS),
+		])
+		self.assertEqual(procedures[0].legs, [("CF", "D164B"), ("TF", "AMIKI")])
+		# A leg after the blank line belongs to no procedure
+		self.assertEqual(procedures[1].legs, [("TF", "NEGRA"), ("IF", "GIPOL")])
+		self.assertEqual(procedures[3].legs, [("IF", "GIPOL")])
+
+	def test_for_runway(self):
+		procedures = read_procedures(self.path)
+		self.assertEqual([(procedure.kind, procedure.name) for procedure in procedures_for_runway(procedures, "16")],
+			[(KIND_SID, "AMIK1Y"), (KIND_STAR, "NEGRA1A"), (KIND_TRANSITION, "I16"), (KIND_APPROACH, "I16")])
+		# Only SIDs and STARs are taken for ALL runways
+		self.assertEqual([procedure.name for procedure in procedures_for_runway(procedures, "34")], ["NEGRA1A"])
+
+class ProcedureCacheTest(ProcDirTest):
+
+	def setUp(self):
+		ProcDirTest.setUp(self)
+		self.write("LSGG.txt", "STAR,BELUS1A,ALL,1\nIF,BELUS\n")
+		self.write("LFSB.txt", "SID,BASUL5N,RW15,1\nCF,BASUL\n")
+		self.cache = ProcedureCache(2)
+
+	def test_cached(self):
+		procedures = self.cache.get(self.directory, "lszh", "1510")
+		self.assertEqual(len(procedures), 6)
+		self.assertIs(self.cache.get(self.directory, "LSZH", "1510"), procedures)
+
+	def test_missing(self):
+		self.assertEqual(self.cache.get(self.directory, "EDNY", "1510"), [])
+		self.assertEqual(self.cache.get(os.path.join(self.directory, "none"), "LSZH", "1510"), [])
+
+	def test_evicted(self):
+		zurich = self.cache.get(self.directory, "LSZH", "1510")
+		geneva = self.cache.get(self.directory, "LSGG", "1510")
+		# Looked at again, Zurich is kept and Geneva dropped for Basel
+		self.assertIs(self.cache.get(self.directory, "LSZH", "1510"), zurich)
+		self.cache.get(self.directory, "LFSB", "1510")
+		self.assertEqual(list(self.cache.procedures), [("LSZH", "1510"), ("LFSB", "1510")])
+		self.assertIsNot(self.cache.get(self.directory, "LSGG", "1510"), geneva)
+
+	def test_cycle(self):
+		old = self.cache.get(self.directory, "LSGG", "1510")
+		self.write("LSGG.txt", "STAR,BELUS2A,ALL,1\nIF,BELUS\n")
+		self.assertIs(self.cache.get(self.directory, "LSGG", "1510"), old)
+		# A new AIRAC cycle reads the file again
+		self.assertEqual([procedure.name for procedure in self.cache.get(self.directory, "LSGG", "1511")], ["BELUS2A"])
+
+	def test_parsed_once(self):
+		self.cache.get(self.directory, "LSZH", "1510")
+		original, Procedures.read_procedures = Procedures.read_procedures, lambda path: self.fail(path)
+		try:
+			self.cache.get(self.directory, "LSZH", "1510")
+		finally:
+			Procedures.read_procedures = original
+
+if __name__ == "__main__":
+	unittest.main()
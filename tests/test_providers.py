@@ -0,0 +1,117 @@
+#
+#  Tests of the offline weather providers
+#
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from metar import Metar
+from weather import Providers
+from weather.Providers import ArchiveProvider, DirectoryProvider, parse_report
+
+# Two NOAA cycle files, the reports of the day before in 23Z
+CYCLE_22Z = """\
+2026/09/30 22:20
+LSZH 302220Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG
+2026/09/30 22:50
+LSZH 302250Z 24009KT 9999 FEW040 14/08 Q1018 NOSIG
+2026/09/30 22:50
+LSGG 302250Z 22004KT CAVOK 12/06 Q1020 NOSIG
+"""
+
+CYCLE_23Z = """\
+2026/09/30 23:20
+LSZH 302320Z 25010KT 9999 SCT040 13/08 Q1019 NOSIG
+2026/09/30 23:20
+KJFK 302320Z 31012KT 10SM FEW040 12/11 A2992 RMK AO2 SLP132
+2026/09/29 23:50
+EGLL 292350Z 27015KT 0800 R27L/0600V1000U FG VV002 08/08 Q1012
+2026/09/30 23:50
+XXXX 302350Z %s
+""" % " ".join(["RMK"] + ["A"] * 600)
+
+class ProvidersTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		with open(os.path.join(self.directory, name), 'w') as f:
+			f.write(text)
+
+	def test_parse_report(self):
+		metar = parse_report("2026/09/30 22:20\nLSZH 302220Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG\n")
+		# Dated by the date line, not by today
+		self.assertEqual(metar.time, datetime.datetime(2026, 9, 30, 22, 20))
+		self.assertIsNone(parse_report("2026/09/30 22:20\n\n"))
+
+	def test_unknown_groups(self):
+		metar = parse_report("2026/09/30 22:20\nLSZH 302220Z 24008KT 9999 XYZ FEW040 15/08 Q1018 NOSIG\n")
+		self.assertEqual(metar.unparsed(), [(26, "XYZ")])
+		self.assertEqual(metar.temp.value("C"), 15.0)
+
+	def test_directory(self):
+		self.write("LSZH.TXT", CYCLE_22Z.split("2026/09/30 22:50")[0])
+		provider = DirectoryProvider(self.directory)
+		self.assertEqual(provider.fetch("lszh").time, datetime.datetime(2026, 9, 30, 22, 20))
+		self.assertIsNone(provider.fetch("LSGG"))
+		self.assertEqual(provider.fetch_many(["LSZH", "LSGG"]).keys(), ["LSZH"])
+
+	def test_archive_newest(self):
+		self.write("22Z.TXT", CYCLE_22Z)
+		self.write("23Z.TXT", CYCLE_23Z)
+		provider = ArchiveProvider(self.directory)
+		self.assertEqual(provider.fetch("LSZH").code, "LSZH 302320Z 25010KT 9999 SCT040 13/08 Q1019 NOSIG")
+		self.assertEqual(provider.fetch("LSGG").time, datetime.datetime(2026, 9, 30, 22, 50))
+		self.assertIsNone(provider.fetch("LFSB"))
+
+	def test_archive_replay(self):
+		self.write("22Z.TXT", CYCLE_22Z)
+		self.write("23Z.TXT", CYCLE_23Z)
+		provider = ArchiveProvider(self.directory, "2026/09/30 23:00")
+		errors = {}
+		weather = provider.fetch_many(["LSZH", "LSGG", "KJFK", "EGLL", "XXXX"], errors=errors)
+		self.assertEqual(sorted(weather), ["EGLL", "LSGG", "LSZH"])
+		self.assertEqual(weather["LSZH"].time, datetime.datetime(2026, 9, 30, 22, 50))
+		# The day before the replay time, by the date line
+		self.assertEqual(weather["EGLL"].time, datetime.datetime(2026, 9, 29, 23, 50))
+		self.assertEqual(errors, {})
+		provider = ArchiveProvider(self.directory, "2026/10/01 00:00")
+		weather = provider.fetch_many(["KJFK", "XXXX"], errors=errors)
+		self.assertEqual(weather.keys(), ["KJFK"])
+		# Too long to parse, reported and the rest of the batch still served
+		self.assertIsInstance(errors["XXXX"], Metar.ParserBudgetError)
+
+class ParseCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		Metar.disable_parse_cache()
+
+	def tearDown(self):
+		Providers.use_parse_cache(0)
+		Metar.disable_parse_cache()
+
+	def test_off(self):
+		text = "2026/09/30 22:20\nLSZH 302220Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG\n"
+		self.assertIsNot(parse_report(text), parse_report(text))
+		self.assertIsNone(Providers.parse_cache())
+
+	def test_created_with_first_report(self):
+		Providers.use_parse_cache(5)
+		self.assertIsNone(Providers.parse_cache())
+		text = "2026/09/30 22:20\nLSZH 302220Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG\n"
+		metar = parse_report(text)
+		cache = Providers.parse_cache()
+		self.assertIs(cache, Metar.get_parse_cache())
+		self.assertEqual(cache.size, 5)
+		self.assertIs(parse_report(text), metar)
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,119 @@
+#
+#  Tests of the airport search indexes
+#
+
+import marshal
+import unittest
+from math import cos, radians
+
+from metar.Station import station
+from navdata.Airports import AirportRecord
+from navdata.Search import FuzzyIndex, PrefixIndex, trigrams
+
+AIRPORTS = [
+	AirportRecord("LSZH", "ZURICH", 47.458, 8.548),
+	AirportRecord("LSZB", "BERN BELP", 46.914, 7.497),
+	AirportRecord("LSGG", "GENEVA COINTRIN", 46.238, 6.109),
+	AirportRecord("LSZR", "ST GALLEN ALTENRHEIN", 47.485, 9.561),
+	AirportRecord("EDNY", "FRIEDRICHSHAFEN", 47.671, 9.511),
+	AirportRecord("KBOS", "GENERAL EDWARD LAWRENCE LOGAN INTL", 42.364, -71.005),
+	AirportRecord("GENE", "GENERAL FIELD", 10.0, 10.0),
+]
+
+def icaos(airports):
+	return [airport.icao for airport in airports]
+
+class PrefixIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.index = PrefixIndex(AIRPORTS)
+
+	def test_icao(self):
+		self.assertEqual(icaos(self.index.complete("LSZ")), ["LSZB", "LSZH", "LSZR"])
+		self.assertEqual(icaos(self.index.complete("lszh")), ["LSZH"])
+		self.assertEqual(self.index.complete("XXXX"), [])
+		self.assertEqual(self.index.complete("  "), [])
+
+	def test_name_words(self):
+		self.assertEqual(icaos(self.index.complete("BEL")), ["LSZB"])
+		self.assertEqual(icaos(self.index.complete("ALT")), ["LSZR"])
+		# Every further word must start a word of the name
+		self.assertEqual(icaos(self.index.complete("GEN LOG")), ["KBOS"])
+		self.assertEqual(icaos(self.index.complete("ST GALLEN")), ["LSZR"])
+
+	def test_exact_icao_first(self):
+		self.assertEqual(icaos(self.index.complete("GENE")), ["GENE", "KBOS", "LSGG"])
+		self.assertEqual(icaos(self.index.complete("GENE", 47.0, 8.0)), ["GENE", "LSGG", "KBOS"])
+
+	def test_nearest_first(self):
+		self.assertEqual(icaos(self.index.complete("LS", 47.4, 9.4, 2)), ["LSZR", "LSZH"])
+		self.assertEqual(icaos(self.index.complete("LS", 46.2, 6.1, 2)), ["LSGG", "LSZB"])
+
+	def test_grid(self):
+		# Enough matches to walk the grid, which must rank as measuring them all
+		airports = [AirportRecord("X%03d" % no, "FIELD %d" % no, 40.0 + no % 20 * 0.7, -5.0 + no // 20 * 1.3)
+			for no in range(600)]
+		index = PrefixIndex(airports)
+		def measured(lat, lon):
+			scale = cos(radians(lat))
+			return sorted(airports, key=lambda airport: (airport.lat - lat) ** 2 +
+				(((airport.lon - lon + 180.0) % 360.0 - 180.0) * scale) ** 2)[:5]
+		for lat, lon in ((47.0, 8.0), (40.2, -4.9), (53.1, 30.5), (45.55, 12.35)):
+			self.assertEqual(index.complete_nearby("FIELD", lat, lon, 5), measured(lat, lon))
+			self.assertEqual(index.complete("FIELD", lat, lon, 5), measured(lat, lon))
+		# Far away the grid gives up, and every match is measured
+		self.assertIsNone(index.complete_nearby("FIELD", -30.0, 150.0, 5))
+		self.assertEqual(index.complete("FIELD", -30.0, 150.0, 5), measured(-30.0, 150.0))
+
+	def test_grid_high_latitude(self):
+		# North, a degree of longitude is short: three cells east is nearer
+		# than the ring of matches one cell north
+		north = [AirportRecord("N%03d" % no, "FIELD", 66.7, 9.6 + no * 0.4) for no in range(5)]
+		east = AirportRecord("EAST", "FIELD", 65.5, 13.0)
+		index = PrefixIndex(north + [east] + [AirportRecord("Y%03d" % no, "FIELD", -50.0, no * 0.5) for no in range(600)])
+		self.assertEqual(index.complete("FIELD", 65.5, 10.5, 1), [east])
+		self.assertEqual(index.complete("FIELD", 65.5, 10.5, 3)[0], east)
+
+	def test_data(self):
+		data = marshal.loads(marshal.dumps(self.index.to_data()))
+		index = PrefixIndex.from_data(data)
+		self.assertEqual(index.airports, AIRPORTS)
+		self.assertEqual(index.complete("GEN LOG"), self.index.complete("GEN LOG"))
+		self.assertEqual(index.complete("LS", 47.4, 9.4, 2), self.index.complete("LS", 47.4, 9.4, 2))
+
+class FuzzyIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		stations = {"KBOS": station("KBOS", "Boston", "MA", "United States"), "EDNY": station("EDNY", None, None, "Germany")}
+		self.index = FuzzyIndex(AIRPORTS, stations)
+
+	def test_trigrams(self):
+		self.assertEqual(trigrams("Bern"), set([" BE", "BER", "ERN", "RN "]))
+		self.assertEqual(trigrams("St-Gallen!"), trigrams("ST GALLEN"))
+		self.assertEqual(trigrams(" - "), set())
+
+	def test_typos(self):
+		self.assertEqual(icaos(self.index.search("ZURICK")), ["LSZH"])
+		self.assertEqual(icaos(self.index.search("geneve"))[0], "LSGG")
+		self.assertEqual(icaos(self.index.search("FRIEDRICHSHAVEN")), ["EDNY"])
+		self.assertEqual(self.index.search("OSLO"), [])
+		self.assertEqual(self.index.search(""), [])
+
+	def test_cities(self):
+		self.assertEqual(icaos(self.index.search("BOSTN")), ["KBOS"])
+		self.assertEqual(icaos(self.index.search("germany")), ["EDNY"])
+
+	def test_ranking(self):
+		# Two share every trigram of GENERAL, the shorter text first, GENEVA
+		# shares three of seven
+		self.assertEqual(icaos(self.index.search("GENERAL")), ["GENE", "KBOS", "LSGG"])
+		self.assertEqual(icaos(self.index.search("GENERAL", 1)), ["GENE"])
+
+	def test_data(self):
+		data = marshal.loads(marshal.dumps(self.index.to_data()))
+		index = FuzzyIndex.from_data(data, AIRPORTS)
+		for text in ("ZURICK", "BOSTN", "GENERAL"):
+			self.assertEqual(index.search(text), self.index.search(text))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,77 @@
+#
+#  Tests of the warm start snapshots
+#
+
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from metar import Metar
+from navdata import Snapshot
+from navdata.Airports import AirportRecord
+from navdata.Search import FuzzyIndex, PrefixIndex
+
+AIRPORTS = [
+	AirportRecord("LSZH", "ZURICH", 47.458, 8.548),
+	AirportRecord("LSGG", "GENEVA COINTRIN", 46.238, 6.109),
+]
+
+class SnapshotTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "snapshots", "test.snapshot")
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_round_trip(self):
+		data = ([1, 2.5, "three"], {"four": (5, None)}, True)
+		Snapshot.save(self.path, ("test", 1), data)
+		self.assertEqual(Snapshot.load(self.path, ("test", 1)), data)
+		self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+	def test_replaced(self):
+		Snapshot.save(self.path, ("test", 1), "old")
+		Snapshot.save(self.path, ("test", 1), "new")
+		self.assertEqual(Snapshot.load(self.path, ("test", 1)), "new")
+
+	def test_stale_key(self):
+		Snapshot.save(self.path, ("test", 1), "data")
+		self.assertIsNone(Snapshot.load(self.path, ("test", 2)))
+
+	def test_other_interpreter(self):
+		Snapshot.save(self.path, ("test", 1), "data")
+		other = ((sys.version_info[0], sys.version_info[1] + 1), ("test", 1))
+		with open(self.path, 'wb') as f:
+			f.write(marshal.dumps((other, "data")))
+		self.assertIsNone(Snapshot.load(self.path, ("test", 1)))
+
+	def test_missing_or_damaged(self):
+		self.assertIsNone(Snapshot.load(self.path, ("test", 1)))
+		Snapshot.save(self.path, ("test", 1), range(1000))
+		with open(self.path, 'r+b') as f:
+			f.truncate(100)
+		self.assertIsNone(Snapshot.load(self.path, ("test", 1)))
+
+	def test_metar_records(self):
+		# As the plugin keeps the last reports across a restart
+		metar = Metar.Metar("LSZH 191350Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG", 10, 2026)
+		Snapshot.save(self.path, ("metar", 1), [("LSZH", 1792418400.0, metar.to_record())])
+		[(icao, fetched, record)] = Snapshot.load(self.path, ("metar", 1))
+		self.assertEqual((icao, fetched), ("LSZH", 1792418400.0))
+		self.assertEqual(Metar.Metar.from_record(record).string(), metar.string())
+
+	def test_search_indexes(self):
+		prefix_index, fuzzy_index = PrefixIndex(AIRPORTS), FuzzyIndex(AIRPORTS)
+		Snapshot.save(self.path, ("search", 1), (prefix_index.to_data(), fuzzy_index.to_data()))
+		prefix_data, fuzzy_data = Snapshot.load(self.path, ("search", 1))
+		loaded = PrefixIndex.from_data(prefix_data)
+		self.assertEqual(loaded.complete("GEN"), prefix_index.complete("GEN"))
+		self.assertEqual(FuzzyIndex.from_data(fuzzy_data, loaded.airports).search("ZURICK"), [AIRPORTS[0]])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,170 @@
+#
+#  Tests of the SQLite navdata store
+#
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from navdata import Store
+from navdata.Airports import AirportRecord
+from navdata.Fixes import FixRecord, KIND_FIX, KIND_NDB, KIND_VOR
+from navdata.Navaids import IlsRecord
+from navdata.Store import has_rtree, open_store
+
+AIRPORTS_TXT = """\
+A,LSZH,ZURICH,47.458056,8.548056,1416,18000,0,12139,0
+R,16,155,12139,197,1,110.500,155,47.474,8.536,1390,3.00,50,1,0
+R,28,275,8202,197,0,0.000,0,47.457,8.574,1416,3.00,50,1,0
+A,LSZB,BERN BELP,46.914,7.497,1674,18000,0,5676,0
+R,14,138,5676,98,1,110.100,138,46.920,7.490,1674,4.00,50,1,0
+A,EDNY,FRIEDRICHSHAFEN,47.671,9.511,1367,5000,0,7729,0
+A,LFSB,BALE MULHOUSE,47.590,7.529,885,5000,0,12795,0
+A,UHMA,ANADYR,64.735,177.741,194,5000,0,11483,0
+"""
+
+NAV_810 = """\
+I
+810 Version - data cycle 1510, build 20151025
+2  47.53430000  008.75250000   1500   390  50    0.000 ZH  ZURICH NDB
+3  47.47610000  008.55380000   1380 11450 130    2.000 KLO KLOTEN VOR/DME
+4  47.44960000  008.56080000   1402 11050  18  155.000 IZH  LSZH 16  ILS-cat-III
+6  47.47100000  008.53500000   1402 11050  10 300155.000 IZH  LSZH 16  GS
+12 47.47100000  008.53500000   1402 11050  18    0.000 IZH  LSZH 16  DME-ILS
+99
+"""
+
+# ROMEO twice, and once more on the other side of the date line
+FIX_810 = """\
+I
+600 Version - data cycle 1510, build 20151025
+47.100000  008.200000 ABBOT
+46.000000  007.000000 ROMEO
+-33.000000 151.000000 ROMEO
+ 52.000000 179.900000 ROMEO
+99
+"""
+
+CYCLE_INFO = "AIRAC cycle    : %s\nVersion        : 1\n"
+
+class StoreFilesTest(unittest.TestCase):
+	"""Opens a store of the files above, with the R*Tree index."""
+
+	rtree = True
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.paths = [self.write("airports.txt", AIRPORTS_TXT), self.write("earth_nav.dat", NAV_810),
+			self.write("earth_fix.dat", FIX_810), self.write("cycle_info.txt", CYCLE_INFO % "1510")]
+		self.db_path = os.path.join(self.directory, "cache", "navdata.db")
+		if self.rtree and not has_rtree(sqlite3.connect(":memory:")):
+			self.skipTest("SQLite has no R*Tree module")
+		self.store = self.open()
+
+	def tearDown(self):
+		self.store.close()
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		path = os.path.join(self.directory, name)
+		with open(path, 'w') as f:
+			f.write(text)
+		return path
+
+	def open(self):
+		return open_store(self.db_path, *self.paths, rtree=self.rtree)
+
+class StoreTest(StoreFilesTest):
+
+	def test_index(self):
+		self.assertEqual(self.store.rtree, self.rtree)
+
+	def test_airport(self):
+		self.assertEqual(self.store.airport("lszh"), AirportRecord("LSZH", "ZURICH", 47.458056, 8.548056))
+		self.assertIsNone(self.store.airport("XXXX"))
+
+	def test_runways(self):
+		self.assertEqual(self.store.runways("LSZH"), [("16", "155", "12139", "110.500", "155"),
+			("28", "275", "8202", "0.000", "0")])
+		self.assertEqual(self.store.runways("EDNY"), [])
+
+	def test_ils(self):
+		self.assertEqual(self.store.ils("lszh", "16"), IlsRecord("IZH", "110.500", 155, 3.0, True))
+		self.assertIsNone(self.store.ils("LSZH", "28"))
+
+	def test_airports_within(self):
+		icaos = [airport.icao for airport in self.store.airports_within(47.3, 8.5, 50.0)]
+		self.assertEqual(icaos, ["LSZH", "LFSB", "EDNY", "LSZB"])
+		# Friedrichshafen is inside the box of the radius, but not the circle
+		self.assertEqual([airport.icao for airport in self.store.airports_within(47.3, 8.5, 45.0)], ["LSZH", "LFSB"])
+		self.assertEqual(self.store.airports_within(0.0, 0.0, 100.0), [])
+
+	def test_date_line(self):
+		self.assertEqual([airport.icao for airport in self.store.airports_within(64.7, -179.9, 100.0)], ["UHMA"])
+
+	def test_nearest_airports(self):
+		self.assertEqual([airport.icao for airport in self.store.nearest_airports(47.3, 8.5, 2)], ["LSZH", "LFSB"])
+		self.assertEqual([airport.icao for airport in self.store.nearest_airports(0.0, 0.0, 2)], [])
+
+	def test_nearest_point(self):
+		self.assertEqual(self.store.nearest_point("ROMEO", 47.0, 8.0), FixRecord("ROMEO", KIND_FIX, 46.0, 7.0))
+		self.assertEqual(self.store.nearest_point("ROMEO", 52.0, -179.9), FixRecord("ROMEO", KIND_FIX, 52.0, 179.9))
+		self.assertEqual(self.store.nearest_point("ZH", 47.0, 8.0).kind, KIND_NDB)
+		self.assertEqual(self.store.nearest_point("KLO", 47.0, 8.0).kind, KIND_VOR)
+		self.assertIsNone(self.store.nearest_point("IZH", 47.0, 8.0))
+
+class PlainStoreTest(StoreTest):
+	"""The same queries against the latitude index."""
+
+	rtree = False
+
+class RebuildTest(StoreFilesTest):
+
+	def reopen(self):
+		self.store.close()
+		self.store = self.open()
+
+	def assertRebuilt(self, rebuilt):
+		original = Store.build_store
+		builds = []
+		def build(*args):
+			builds.append(args)
+			original(*args)
+		Store.build_store = build
+		try:
+			self.reopen()
+		finally:
+			Store.build_store = original
+		self.assertEqual(len(builds), int(rebuilt))
+
+	def test_unchanged(self):
+		self.assertRebuilt(False)
+		self.assertEqual(self.store.airport("LSZB").name, "BERN BELP")
+
+	def test_size(self):
+		with open(self.paths[0], 'a') as f:
+			f.write("A,LSGG,GENEVA,46.238,6.109,1411,18000,0,12795,0\n")
+		self.assertRebuilt(True)
+		self.assertEqual(self.store.airport("LSGG").name, "GENEVA")
+
+	def test_mtime(self):
+		stat = os.stat(self.paths[2])
+		os.utime(self.paths[2], (stat.st_atime, stat.st_mtime - 60))
+		self.assertRebuilt(True)
+
+	def test_cycle(self):
+		self.write("cycle_info.txt", CYCLE_INFO % "1511")
+		self.assertRebuilt(True)
+		self.assertRebuilt(False)
+
+	def test_not_a_store(self):
+		self.store.close()
+		with open(self.db_path, 'w') as f:
+			f.write("garbage")
+		self.assertRebuilt(True)
+		self.assertIsNotNone(self.store.airport("LSZH"))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,38 @@
+#
+#  Tests of the weather rows of the airport window
+#
+
+import unittest
+
+from metar import Metar
+from weather.Providers import parse_report
+from weather.Summary import metar_lines
+
+class SummaryTest(unittest.TestCase):
+
+	def test_complete(self):
+		metar = Metar.Metar("LSZH 191350Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG", 10, 2026)
+		self.assertEqual(metar_lines(metar), [
+			"Qnh: 1018.0 mb / 30.06 inches",
+			"Temp. / Dewpt.: 15.0 C / 8.0 C ",
+			"Wind: 240 degrees / WSW at 8 knots",
+			"Visiblilty: greater than 10000 meters",
+			"Weather: a few clouds at 4000 feet"])
+
+	def test_temperature_and_pressure_unparsed(self):
+		metar = parse_report("2026/10/19 13:50\nLSZH 191350Z 24008KT 9999 FEW040 1X/0X Q10X8 NOSIG\n")
+		self.assertEqual(metar.unparsed(), [(33, "1X/0X"), (39, "Q10X8")])
+		lines = metar_lines(metar)
+		self.assertEqual(lines[0], "Qnh: n/a / n/a")
+		self.assertEqual(lines[1], "Temp. / Dewpt.: n/a / n/a ")
+		self.assertEqual(lines[2], "Wind: 240 degrees / WSW at 8 knots")
+
+	def test_wind_and_pressure_missing(self):
+		metar = parse_report("2026/10/19 13:50\nLSZH 191350Z 9999 FEW040 15/08 QXXXX\n")
+		lines = metar_lines(metar)
+		self.assertEqual(lines[0], "Qnh: n/a / n/a")
+		self.assertEqual(lines[1], "Temp. / Dewpt.: 15.0 C / 8.0 C ")
+		self.assertEqual(lines[2], "Wind: n/a / missing")
+
+if __name__ == "__main__":
+	unittest.main()
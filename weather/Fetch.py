@@ -0,0 +1,78 @@
+#
+#  Reports of several stations at once
+#
+"""
+fetch_many() runs the fetches of a list of stations on one thread per
+station, up to `concurrency` threads, so a batch no larger than that takes
+about as long as its slowest station, not as long as all of them in a row;
+a larger one takes a round per `concurrency` stations.  With a deadline it
+returns whatever has arrived by then; fetches still running finish in the
+background and are dropped.
+"""
+
+import threading
+import time
+from collections import deque
+
+class BatchFetch(object):
+	"""One fetch_many() call: the stations left, the results and the threads."""
+
+	def __init__(self, fetch, icaos, concurrency, errors=None):
+		self.fetch = fetch
+		self.pending = deque(icaos)
+		self.results = {}
+		self.errors = errors
+		self.running = min(concurrency, len(self.pending))
+		self.finished = threading.Condition()
+		self.stop_at = None
+
+	def run(self, deadline=None):
+		"""Return {icao: result} of the fetches done within `deadline` seconds."""
+		if deadline is not None:
+			self.stop_at = time.time() + deadline
+		for no in range(self.running):
+			thread = threading.Thread(target=self.work)
+			thread.daemon = True
+			thread.start()
+		with self.finished:
+			while self.running:
+				if self.stop_at is None:
+					self.finished.wait()
+					continue
+				remaining = self.stop_at - time.time()
+				if remaining <= 0:
+					break
+				self.finished.wait(remaining)
+			return dict(self.results)
+
+	def work(self):
+		try:
+			while self.stop_at is None or time.time() < self.stop_at:
+				try:
+					icao = self.pending.popleft()
+				except IndexError:
+					return
+				try:
+					result = self.fetch(icao)
+				except Exception as error:
+					# One failing station does not hold up the others
+					if self.errors is not None:
+						with self.finished:
+							self.errors[icao] = error
+					continue
+				if result is not None:
+					with self.finished:
+						self.results[icao] = result
+		finally:
+			with self.finished:
+				self.running -= 1
+				self.finished.notify_all()
+
+def fetch_many(fetch, icaos, concurrency=4, deadline=None, errors=None):
+	"""
+	Call `fetch(icao)` for every station on at most `concurrency` threads and
+	return {icao: result} of those that returned something other than None
+	within `deadline` seconds.  Exceptions go to the `errors` dict if one is
+	given.
+	"""
+	return BatchFetch(fetch, icaos, concurrency, errors).run(deadline)
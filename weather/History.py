@@ -0,0 +1,220 @@
+#
+#  Append-only archive of every METAR seen, for replaying the weather
+#
+"""
+Reports are collected in memory and written in blocks of BLOCK_REPORTS,
+or sooner once the oldest has waited BLOCK_AGE seconds, so a crash loses
+no more than that, sorted by station and observation time and compressed
+with zlib, to <path>.dat.  Every block gets one line in <path>.idx:
+
+    offset  size  first time  last time  STATION,STATION,...
+
+That sparse index is all that is kept in memory, so "LSZH between T1 and T2"
+only decompresses the blocks whose time range overlaps and which hold LSZH,
+however many millions of reports the archive holds.  Both files are only
+ever appended to; blocks written after the last index line (the plugin was
+killed) are indexed again when the archive is opened.
+
+Usage from the command line:
+
+    python -m weather.History <path> ingest <cycle or station files...>
+    python -m weather.History <path> query <ICAO> <from> <to>
+
+with times as "YYYY/MM/DD HH:MM" UTC.
+"""
+
+import calendar
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+BLOCK_REPORTS = 256
+BLOCK_AGE = 300.0
+BLOCK_MAGIC = "MTRB"
+BLOCK_HEADER = struct.Struct(">4sI")
+
+BlockIndex = namedtuple("BlockIndex", "offset size first last stations")
+
+def epoch(observed):
+	"""Return the seconds since 1970 of a naive UTC datetime."""
+	return calendar.timegm(observed.timetuple())
+
+def parse_time(text):
+	"""Return the epoch of a "YYYY/MM/DD HH:MM" UTC time."""
+	return calendar.timegm(time.strptime(text.strip(), "%Y/%m/%d %H:%M"))
+
+class MetarHistory(object):
+	"""An archive of raw reports by station and observation time."""
+
+	def __init__(self, path, block_reports=BLOCK_REPORTS, block_age=BLOCK_AGE):
+		self.data_path = path + ".dat"
+		self.index_path = path + ".idx"
+		self.block_reports = block_reports
+		self.block_age = block_age
+		self.blocks = []
+		self.pending = []
+		self.pending_since = None
+		self.timer = None
+		self.cancelled = []
+		self.last = {}
+		self.lock = threading.Lock()
+		self.open_index()
+
+	def open_index(self):
+		directory = os.path.dirname(self.data_path)
+		if directory and not os.path.isdir(directory):
+			os.makedirs(directory)
+		if os.path.exists(self.index_path):
+			with open(self.index_path, 'r') as f:
+				for line in f:
+					fields = line.rstrip('\n').split('\t')
+					if len(fields) == 5:
+						self.blocks.append(BlockIndex(int(fields[0]), int(fields[1]), int(fields[2]), int(fields[3]),
+							frozenset(fields[4].split(','))))
+		data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+		indexed = self.blocks[-1].offset + self.blocks[-1].size if self.blocks else 0
+		if indexed > data_size:
+			# The data file lost blocks the index knows of, the index is rewritten
+			self.blocks = [block for block in self.blocks if block.offset + block.size <= data_size]
+			with open(self.index_path, 'w') as f:
+				for block in self.blocks:
+					f.write(self.index_line(block))
+			indexed = self.blocks[-1].offset + self.blocks[-1].size if self.blocks else 0
+		if indexed < data_size:
+			self.recover(indexed, data_size)
+
+	def recover(self, offset, data_size):
+		"""Index the blocks written after the last index line, drop a torn last block."""
+		with open(self.data_path, 'rb') as f:
+			while offset + BLOCK_HEADER.size <= data_size:
+				f.seek(offset)
+				magic, length = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+				if magic != BLOCK_MAGIC or offset + BLOCK_HEADER.size + length > data_size:
+					break
+				reports = self.decode(f.read(length))
+				self.add_block(offset, BLOCK_HEADER.size + length, reports)
+				offset += BLOCK_HEADER.size + length
+		if offset < data_size:
+			with open(self.data_path, 'r+b') as f:
+				f.truncate(offset)
+
+	def index_line(self, block):
+		return "%d\t%d\t%d\t%d\t%s\n" % (block.offset, block.size, block.first, block.last, ",".join(sorted(block.stations)))
+
+	def add_block(self, offset, size, reports):
+		block = BlockIndex(offset, size, min(report[1] for report in reports), max(report[1] for report in reports),
+			frozenset(report[0] for report in reports))
+		with open(self.index_path, 'a') as f:
+			f.write(self.index_line(block))
+		self.blocks.append(block)
+
+	@staticmethod
+	def encode(reports):
+		return zlib.compress("".join("%s\t%d\t%s\n" % report for report in sorted(reports)))
+
+	@staticmethod
+	def decode(packed):
+		reports = []
+		for line in zlib.decompress(packed).splitlines():
+			icao, observed, code = line.split('\t', 2)
+			reports.append((icao, int(observed), code))
+		return reports
+
+	def append(self, icao, observed, code):
+		"""Add a report observed at `observed` (epoch seconds); repeats are skipped."""
+		report = (icao.upper(), int(observed), " ".join(code.split()))
+		with self.lock:
+			# NOAA serves the same report for up to an hour
+			if self.last.get(report[0]) == report[1:]:
+				return
+			self.last[report[0]] = report[1:]
+			if not self.pending:
+				self.pending_since = time.time()
+				# Written after block_age even if no further report comes in
+				self.timer = threading.Timer(self.block_age, self.flush_due)
+				self.timer.daemon = True
+				self.timer.start()
+			self.pending.append(report)
+			if len(self.pending) >= self.block_reports or time.time() - self.pending_since >= self.block_age:
+				self.write_block()
+
+	def flush_due(self):
+		"""Write the pending reports if the oldest has waited `block_age` seconds."""
+		with self.lock:
+			if self.pending and time.time() - self.pending_since >= self.block_age:
+				self.write_block()
+
+	def append_metar(self, icao, metar):
+		if metar.time:
+			self.append(icao, epoch(metar.time), metar.code)
+
+	def write_block(self):
+		reports, self.pending = self.pending, []
+		# No thread is left waiting once nothing is pending; a cancelled timer
+		# still polls for a moment, flush() waits for it
+		if self.timer:
+			self.timer.cancel()
+			self.cancelled = [timer for timer in self.cancelled if timer.is_alive()] + [self.timer]
+			self.timer = None
+		packed = self.encode(reports)
+		with open(self.data_path, 'ab') as f:
+			f.seek(0, os.SEEK_END)
+			offset = f.tell()
+			f.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(packed)))
+			f.write(packed)
+		self.add_block(offset, BLOCK_HEADER.size + len(packed), reports)
+
+	def flush(self):
+		"""Write the pending reports and wait for the flush timers to end."""
+		with self.lock:
+			if self.pending:
+				self.write_block()
+			cancelled, self.cancelled = self.cancelled, []
+		# Outside the lock, which a timer firing just now waits for
+		for timer in cancelled:
+			timer.join()
+
+	def reports(self, icao, start, end):
+		"""Return [(observed, code), ...] of `icao` from `start` to `end` (epoch seconds) in time order."""
+		icao = icao.upper()
+		with self.lock:
+			blocks = [block for block in self.blocks
+				if block.last >= start and block.first <= end and icao in block.stations]
+			found = [report for report in self.pending if report[0] == icao and start <= report[1] <= end]
+		if blocks:
+			with open(self.data_path, 'rb') as f:
+				for block in blocks:
+					f.seek(block.offset + BLOCK_HEADER.size)
+					for report in self.decode(f.read(block.size - BLOCK_HEADER.size)):
+						if report[0] == icao and start <= report[1] <= end:
+							found.append(report)
+		return sorted(set((observed, code) for station, observed, code in found))
+
+def ingest(history, file_path):
+	"""Append every report of a NOAA cycle or station file, return their number."""
+	from weather.Providers import DATE_LINE_RE
+	count = 0
+	observed = None
+	with open(file_path, 'r') as f:
+		for line in f:
+			if DATE_LINE_RE.match(line):
+				observed = parse_time(line)
+			elif observed is not None and line.strip():
+				history.append(line.split(None, 1)[0], observed, line)
+				observed = None
+				count += 1
+	return count
+
+if __name__ == "__main__":
+	import sys
+	history = MetarHistory(sys.argv[1])
+	if sys.argv[2] == "ingest":
+		for file_path in sys.argv[3:]:
+			print("%s: %d reports" % (file_path, ingest(history, file_path)))
+		history.flush()
+	elif sys.argv[2] == "query":
+		for observed, code in history.reports(sys.argv[3], parse_time(sys.argv[4]), parse_time(sys.argv[5])):
+			print("%s  %s" % (time.strftime("%Y/%m/%d %H:%M", time.gmtime(observed)), code))
@@ -0,0 +1,87 @@
+#
+#  Keep-alive HTTP connections for the weather downloads
+#
+"""
+A ConnectionPool keeps finished connections open per host, so a second
+request to the same server skips the TCP (and TLS) handshake.  Servers drop
+idle connections whenever they like; a request that fails on a reused
+connection is sent once more on a new one.
+"""
+
+import httplib
+import socket
+import threading
+import urlparse
+
+class HttpStatusError(httplib.HTTPException):
+	"""The server kept answering with an error status."""
+
+	def __init__(self, status):
+		httplib.HTTPException.__init__(self, "HTTP %d" % status)
+		self.status = status
+
+# Errors a request can fail with, for callers that only report them
+HTTP_ERRORS = (httplib.HTTPException, socket.error)
+
+class ConnectionPool(object):
+	"""Idle keep-alive connections per host, shared by all threads."""
+
+	def __init__(self, timeout, max_idle=4):
+		self.timeout = timeout
+		self.max_idle = max_idle
+		self.idle = {}
+		self.lock = threading.Lock()
+
+	def connection(self, scheme, host):
+		"""Return (connection, reused), an idle connection if there is one."""
+		with self.lock:
+			idle = self.idle.get((scheme, host))
+			if idle:
+				return idle.pop(), True
+		if scheme == "https":
+			return httplib.HTTPSConnection(host, timeout=self.timeout), False
+		return httplib.HTTPConnection(host, timeout=self.timeout), False
+
+	def release(self, scheme, host, connection):
+		with self.lock:
+			idle = self.idle.setdefault((scheme, host), [])
+			if len(idle) < self.max_idle:
+				idle.append(connection)
+				return
+		connection.close()
+
+	def close(self):
+		with self.lock:
+			idle, self.idle = self.idle, {}
+		for connections in idle.values():
+			for connection in connections:
+				connection.close()
+
+	def get(self, url, headers=None, timeout=None):
+		"""
+		Return (status, headers, body) of a GET of `url`; the header names of
+		the response are lower case.  `timeout` overrides the pool's for the
+		connect and every read of this request.
+		"""
+		parts = urlparse.urlsplit(url)
+		path = parts.path + ("?" + parts.query if parts.query else "")
+		while True:
+			connection, reused = self.connection(parts.scheme, parts.netloc)
+			connection.timeout = timeout or self.timeout
+			if connection.sock:
+				connection.sock.settimeout(connection.timeout)
+			try:
+				connection.request("GET", path, headers=headers or {})
+				response = connection.getresponse()
+				body = response.read()
+			except HTTP_ERRORS:
+				connection.close()
+				# The server may have closed the idle connection in the meantime
+				if reused:
+					continue
+				raise
+			if response.will_close:
+				connection.close()
+			else:
+				self.release(parts.scheme, parts.netloc, connection)
+			return response.status, dict(response.getheaders()), body
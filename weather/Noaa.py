@@ -0,0 +1,68 @@
+#
+#  METAR reports of single stations from the NOAA server
+#
+"""
+NOAA publishes the latest report of every station as a small text file:
+
+    2026/10/19 13:50
+    LSZH 191350Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG
+
+A station asked for again is revalidated with If-None-Match and
+If-Modified-Since; while the file is unchanged the server answers 304 with
+no body, and the report parsed the first time is returned again.
+"""
+
+import threading
+
+from weather.Fetch import fetch_many
+from weather.Policy import FetchPolicy
+from weather.Providers import WeatherProvider, parse_report
+
+NOAA_STATION_URL = "http://tgftp.nws.noaa.gov/data/observations/metar/stations/%s.TXT"
+
+class NoaaStations(WeatherProvider):
+	"""Station reports from NOAA, downloaded again only when they changed."""
+
+	def __init__(self, pool, urls=(NOAA_STATION_URL,), policy=None):
+		self.pool = pool
+		self.urls = urls
+		self.policy = policy or FetchPolicy(pool.timeout)
+		self.validated = {}
+		self.lock = threading.Lock()
+
+	def fetch(self, icao):
+		"""Return the Metar of `icao`, or None if NOAA has no report for it."""
+		icao = icao.upper()
+		with self.lock:
+			known = self.validated.get(icao)
+		headers = {}
+		if known:
+			etag, modified, metar = known
+			if etag:
+				headers["If-None-Match"] = etag
+			if modified:
+				headers["If-Modified-Since"] = modified
+
+		status, response_headers, body = self.policy.get(self.pool, [url % icao for url in self.urls], headers)
+		if status == 304 and known:
+			return known[2]
+		if status != 200:
+			return None
+
+		try:
+			metar = parse_report(body)
+		except Exception:
+			self.policy.stats.record("parse error")
+			raise
+		if metar and metar.unparsed():
+			self.policy.stats.record("partly parsed")
+		etag = response_headers.get("etag")
+		modified = response_headers.get("last-modified")
+		if metar and (etag or modified):
+			with self.lock:
+				self.validated[icao] = (etag, modified, metar)
+		return metar
+
+	def fetch_many(self, icaos, concurrency=4, deadline=None, errors=None):
+		# One request per station, so they are sent side by side
+		return fetch_many(self.fetch, icaos, concurrency, deadline, errors)
@@ -0,0 +1,135 @@
+#
+#  Deadlines, retries and hedged requests for the weather downloads
+#
+"""
+A FetchPolicy bounds the time one report may take.  Within its deadline a
+failed or overloaded request is retried after a jittered, doubling pause,
+and if the primary server has not answered after `hedge_after` seconds the
+same request goes to a mirror as well; the first answer wins.  Every attempt
+is counted in FetchStats, which also keeps the recent latencies, so slow or
+failing servers show up in the log rather than as a frozen window.
+"""
+
+import Queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+from weather.Http import HttpStatusError, HTTP_ERRORS
+
+# Answers worth asking again for, anything else is final
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class FetchStats(object):
+	"""Outcome counts and recent latencies of the fetches of a provider."""
+
+	def __init__(self, keep=500):
+		self.outcomes = {}
+		self.latencies = deque(maxlen=keep)
+		self.lock = threading.Lock()
+
+	def record(self, outcome, latency=None):
+		with self.lock:
+			self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+			if latency is not None:
+				self.latencies.append(latency)
+
+	def summary(self):
+		"""Return the outcomes and the median, 95th percentile and worst latency."""
+		with self.lock:
+			outcomes = sorted(self.outcomes.items())
+			latencies = sorted(self.latencies)
+		text = ", ".join("%s %d" % outcome for outcome in outcomes) or "none"
+		if latencies:
+			text += "; latency p50 %.2fs p95 %.2fs max %.2fs" % (
+				latencies[len(latencies) // 2],
+				latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+				latencies[-1])
+		return text
+
+class FetchPolicy(object):
+	"""How long, how often and where a report is asked for."""
+
+	def __init__(self, deadline, retries=2, backoff=0.5, hedge_after=None, stats=None):
+		self.deadline = deadline
+		self.retries = retries
+		self.backoff = backoff
+		self.hedge_after = hedge_after
+		self.stats = stats or FetchStats()
+
+	def get(self, pool, urls, headers=None):
+		"""
+		Return (status, headers, body) of the first of `urls` to answer, the
+		others being mirrors.  Raises socket.timeout once the deadline passes
+		and the last error if every attempt failed.
+		"""
+		start = time.time()
+		end = start + self.deadline
+		error = None
+		for attempt in range(self.retries + 1):
+			if attempt:
+				# Jittered, so stations that failed together do not retry together
+				pause = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+				if time.time() + pause >= end:
+					break
+				time.sleep(pause)
+			try:
+				status, response_headers, body = self.first_answer(pool, urls, headers, end)
+			except socket.timeout as error:
+				self.stats.record("timeout")
+				continue
+			except HTTP_ERRORS as error:
+				self.stats.record("network error")
+				continue
+			if status in RETRY_STATUS:
+				self.stats.record("http %d" % status)
+				error = HttpStatusError(status)
+				continue
+			self.stats.record("http %d" % status, time.time() - start)
+			return status, response_headers, body
+		raise error
+
+	def first_answer(self, pool, urls, headers, end):
+		# Even a single server is asked from a thread: the socket timeout bounds
+		# each read alone, a body trickling in would run past the deadline
+		answers = Queue.Queue()
+		def ask(no):
+			try:
+				answers.put((no, pool.get(urls[no], headers, max(end - time.time(), 0.1)), None))
+			except Exception as error:
+				answers.put((no, None, error))
+		def start(no):
+			thread = threading.Thread(target=ask, args=(no,))
+			thread.daemon = True
+			thread.start()
+
+		start(0)
+		asked = 1
+		failed = 0
+		hedge_at = time.time() + self.hedge_after if self.hedge_after is not None else end
+		while True:
+			wait_until = end if asked == len(urls) else min(end, hedge_at)
+			try:
+				no, answer, error = answers.get(True, max(wait_until - time.time(), 0.001))
+			except Queue.Empty:
+				if time.time() >= end:
+					raise socket.timeout("no answer in time")
+				# Slow: the next mirror gets the same request, the first answer wins
+				self.stats.record("hedged")
+				start(asked)
+				asked += 1
+				hedge_at = time.time() + self.hedge_after
+				continue
+			if error is None:
+				if no:
+					self.stats.record("mirror answered")
+				return answer
+			failed += 1
+			if failed == len(urls):
+				raise error
+			if asked == failed:
+				# Nothing is pending any more, the next mirror is asked at once
+				start(asked)
+				asked += 1
@@ -0,0 +1,176 @@
+#
+#  Sources of METAR reports: the NOAA server, a directory or an archive
+#
+"""
+Every provider answers fetch(icao) with a Metar or None, and
+fetch_many(icaos, ...) with {icao: Metar}.  The NOAA provider lives in
+weather.Noaa; the local ones here serve a training room without internet
+access or replay recorded weather:
+
+- DirectoryProvider reads <ICAO>.TXT files in the NOAA station file format,
+  e.g. a copy of .../observations/metar/stations/.
+- ArchiveProvider reads NOAA cycle files (00Z.TXT ... 23Z.TXT), which hold
+  the reports of every station, and indexes where each report starts, so a
+  batch of stations costs one pass over each file it touches.
+
+Station and cycle files hold a date line before every report:
+
+    2026/10/19 13:50
+    LSZH 191350Z 24008KT 9999 FEW040 15/08 Q1018 NOSIG
+"""
+
+import datetime
+import os
+import re
+import sys
+import threading
+
+DATE_LINE_RE = re.compile(r"^(\d{4})/(\d\d)/(\d\d) (\d\d):(\d\d)\s*$")
+
+# Size of the Metar parse cache created with the first report, 0 for none
+parse_cache_size = 0
+
+def use_parse_cache(size):
+	"""Memoize the parsing of reports from the first one on, without loading the parser now."""
+	global parse_cache_size
+	parse_cache_size = size
+
+def parse_cache():
+	"""Return the Metar parse cache, or None if no report was parsed with one."""
+	# Not loading the parser just to find out
+	Metar = sys.modules.get("metar.Metar")
+	return Metar and Metar.get_parse_cache()
+
+def parse_report(text, context=None):
+	"""
+	Return the Metar of a station file or archive entry, or None if it holds
+	no report.  A batch passes one Metar.parse_context for all its reports.
+	Groups the parser does not know are left in Metar.unparsed(), the rest
+	of the report is still of use.
+	"""
+	month = year = None
+	lines = []
+	for line in text.splitlines():
+		date = DATE_LINE_RE.match(line)
+		if date:
+			# The report itself only names the day, archives need the month
+			year, month = int(date.group(1)), int(date.group(2))
+		elif line.strip():
+			lines.append(line.strip())
+	if not lines:
+		return None
+	# The parser is only loaded once the first report arrives
+	from metar import Metar
+	if parse_cache_size:
+		Metar.enable_parse_cache(parse_cache_size)
+	return Metar.parse(" ".join(lines), month, year, context=context, strict=False)
+
+class WeatherProvider(object):
+	"""Base class, fetch_many() of a provider without a faster batch path."""
+
+	def fetch(self, icao):
+		raise NotImplementedError
+
+	def fetch_many(self, icaos, concurrency=4, deadline=None, errors=None):
+		"""Return {icao: Metar}; failures go to the `errors` dict if one is given."""
+		weather = {}
+		for icao in icaos:
+			try:
+				metar = self.fetch(icao)
+			except Exception as error:
+				if errors is not None:
+					errors[icao] = error
+				continue
+			if metar:
+				weather[icao] = metar
+		return weather
+
+class DirectoryProvider(WeatherProvider):
+	"""Reports from a directory of <ICAO>.TXT station files."""
+
+	def __init__(self, directory):
+		self.directory = directory
+
+	def fetch(self, icao):
+		try:
+			with open(os.path.join(self.directory, icao.upper() + ".TXT"), 'r') as f:
+				return parse_report(f.read())
+		except IOError:
+			return None
+
+class ArchiveProvider(WeatherProvider):
+	"""
+	Reports from a directory of NOAA cycle files.  With a `replay_time`
+	("YYYY/MM/DD HH:MM", UTC) the last report issued by then is served,
+	otherwise the newest of each station.
+	"""
+
+	def __init__(self, directory, replay_time=None):
+		self.directory = directory
+		self.replay_time = replay_time
+		self.files = None
+		self.reports = None
+		self.lock = threading.Lock()
+
+	def index(self):
+		"""Return {icao: [(time, file no, offset), ...]} sorted by time, built on first use."""
+		with self.lock:
+			if self.reports is None:
+				self.files = sorted(name for name in os.listdir(self.directory) if name.upper().endswith(".TXT"))
+				reports = {}
+				for file_no, name in enumerate(self.files):
+					with open(os.path.join(self.directory, name), 'rb') as f:
+						offset = 0
+						date = None
+						for line in f:
+							if DATE_LINE_RE.match(line):
+								date = (line.strip(), offset)
+							elif date and line.strip():
+								reports.setdefault(line.split(None, 1)[0], []).append((date[0], file_no, date[1]))
+								date = None
+							offset += len(line)
+				for entries in reports.values():
+					entries.sort()
+				self.reports = reports
+		return self.reports
+
+	def entry(self, icao):
+		entries = self.index().get(icao.upper())
+		if not entries:
+			return None
+		if self.replay_time is None:
+			return entries[-1]
+		issued = [entry for entry in entries if entry[0] <= self.replay_time]
+		return issued[-1] if issued else None
+
+	def fetch(self, icao):
+		return self.fetch_many([icao]).get(icao)
+
+	def fetch_many(self, icaos, concurrency=4, deadline=None, errors=None):
+		# Grouped by file, each file is opened once for the whole batch
+		by_file = {}
+		for icao in icaos:
+			entry = self.entry(icao)
+			if entry:
+				by_file.setdefault(entry[1], []).append((entry[2], icao))
+		weather = {}
+		if not by_file:
+			return weather
+		# One reference time for the batch, the replay time if there is one
+		from metar import Metar
+		now = datetime.datetime.strptime(self.replay_time, "%Y/%m/%d %H:%M") if self.replay_time else None
+		context = Metar.parse_context(now)
+		for file_no, wanted in sorted(by_file.items()):
+			with open(os.path.join(self.directory, self.files[file_no]), 'rb') as f:
+				for offset, icao in sorted(wanted):
+					f.seek(offset)
+					text = f.readline() + f.readline()
+					try:
+						metar = parse_report(text, context)
+					except Exception as error:
+						if errors is not None:
+							errors[icao] = error
+						continue
+					if metar:
+						weather[icao] = metar
+		return weather
@@ -0,0 +1,28 @@
+#
+#  The weather rows of the airport window
+#
+"""
+Reports are parsed leniently, so any group may be missing from a Metar: a
+value the parser did not find is shown as "n/a" instead of failing the
+window on the sim thread.
+"""
+
+MISSING = "n/a"
+
+def value_string(value, units=None):
+	"""Return the text of a dimensioned value in `units`, or MISSING."""
+	if value is None:
+		return MISSING
+	if units is None:
+		return str(value)
+	return value.string(units)
+
+def metar_lines(metar):
+	"""Return the pressure, temperature, wind, visibility and sky rows of a Metar."""
+	return [
+		"Qnh: {} / {}".format(value_string(metar.press, "mb"), value_string(metar.press, "in")),
+		"Temp. / Dewpt.: {} / {} ".format(value_string(metar.temp, "C"), value_string(metar.dewpt, "C")),
+		"Wind: " + value_string(metar.wind_dir) + " / " + metar.wind(),
+		"Visiblilty: " + metar.visibility(),
+		"Weather: " + metar.sky_conditions(),
+	]